@@ -1,13 +1,19 @@
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, Input, Output, State, ClientsideFunction
 import dash_bootstrap_components as dbc
+from flask import Response, stream_with_context, abort
 import os
 
 # NO importes Database aquí globalmente si usa Supabase
 # from utils.database import Database  # ❌ QUITAR ESTO
 
-from pages import fondos, acciones, graficas_fondos, graficas_acciones
+from pages import fondos, acciones, graficas_fondos, graficas_acciones, historico, riesgo, movimientos
 from utils.styles import NAVBAR_STYLE, PRIMARY_COLOR
+from utils.refresher import refresher
+from utils.quote_stream import broadcaster
+from utils.holdings_io import HOLDING_FIELDS, export_columns, stream_csv, stream_json
+from utils.metrics import registry, instrument_dash
+from utils import tracing
 
 app = dash.Dash(
     __name__,
@@ -19,10 +25,59 @@ app = dash.Dash(
 
 server = app.server  # ← CRÍTICO: Esto DEBE estar aquí
 
+# Duración de cada callback en el servidor, publicada en /metrics
+instrument_dash(app)
+
+# Trazas por petición de callback (Chrome trace) en TRACE_DIR, si está configurado
+tracing.instrument_dash(app)
+
+# Refresco de cotizaciones en segundo plano (en Vercel no hay procesos persistentes)
+if os.environ.get("QUOTE_REFRESHER", "0" if os.environ.get("VERCEL") else "1") == "1":
+    refresher.start()
+
+# Exportación en streaming de posiciones: /export/fondos.csv, /export/acciones.json...
+@server.route('/export/<tabla>.<formato>')
+def export_holdings(tabla, formato):
+    if tabla not in HOLDING_FIELDS or formato not in ('csv', 'json'):
+        abort(404)
+    # Importación diferida: el cliente de Supabase solo se crea al exportar
+    from utils.database import Database
+    columns = export_columns(tabla)
+    rows = Database().iter_rows(tabla, columns=columns)
+    stream = stream_csv(rows, columns) if formato == 'csv' else stream_json(rows, columns)
+    return Response(
+        stream_with_context(stream),
+        mimetype='text/csv' if formato == 'csv' else 'application/json',
+        headers={'Content-Disposition': f'attachment; filename={tabla}.{formato}'}
+    )
+
+# Canal SSE de cotizaciones: el navegador recibe los cambios del refresco en segundo plano.
+# Sin refresco en marcha no se publicará nada: 204 hace que EventSource no reconecte
+# y el navegador sigue con su intervalo, sin ocupar un worker por pestaña.
+@server.route('/stream/quotes')
+def stream_quotes():
+    if not refresher.is_running():
+        return Response(status=204)
+    return Response(
+        stream_with_context(broadcaster.stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# Métricas en formato Prometheus: callbacks, llamadas a Supabase/Yahoo y cachés
+@server.route('/metrics')
+def metrics():
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Layout (sin cambios)
 app.layout = html.Div([
     dcc.Location(id='url', refresh=False),
     
+    # Versión de las cotizaciones recibida por SSE (assets/quote_stream.js); las tablas
+    # y gráficas solo se recalculan cuando cambia. El intervalo no llama al servidor.
+    dcc.Store(id='quote-version', data=0),
+    dcc.Interval(id='quote-stream-poll', interval=1000, n_intervals=0),
+    
     dbc.Navbar(
         dbc.Container([
             html.Div([
@@ -50,6 +105,18 @@ app.layout = html.Div([
                     [html.I(className="fas fa-chart-area me-2"), "Gráficas Acciones"],
                     href="/graficas-acciones", id="nav-graf-acciones", className="nav-link-custom"
                 )),
+                dbc.NavItem(dbc.NavLink(
+                    [html.I(className="fas fa-chart-line me-2"), "Histórico"],
+                    href="/historico", id="nav-historico", className="nav-link-custom"
+                )),
+                dbc.NavItem(dbc.NavLink(
+                    [html.I(className="fas fa-shield-alt me-2"), "Riesgo"],
+                    href="/riesgo", id="nav-riesgo", className="nav-link-custom"
+                )),
+                dbc.NavItem(dbc.NavLink(
+                    [html.I(className="fas fa-exchange-alt me-2"), "Movimientos"],
+                    href="/movimientos", id="nav-movimientos", className="nav-link-custom"
+                )),
             ], navbar=True, className="ms-auto"),
         ], fluid=True),
         color="dark", dark=True, className="mb-4 navbar-custom",
@@ -67,6 +134,13 @@ app.layout = html.Div([
     "fontFamily": "'Inter', 'Segoe UI', sans-serif"
 })
 
+app.clientside_callback(
+    ClientsideFunction(namespace='quoteStream', function_name='version'),
+    Output('quote-version', 'data'),
+    Input('quote-stream-poll', 'n_intervals'),
+    State('quote-version', 'data')
+)
+
 @app.callback(
     Output('page-content', 'children'),
     Input('url', 'pathname')
@@ -78,6 +152,12 @@ def display_page(pathname):
         return graficas_fondos.layout()
     elif pathname == '/graficas-acciones':
         return graficas_acciones.layout()
+    elif pathname == '/historico':
+        return historico.layout()
+    elif pathname == '/riesgo':
+        return riesgo.layout()
+    elif pathname == '/movimientos':
+        return movimientos.layout()
     else:
         return fondos.layout()
 
@@ -0,0 +1,62 @@
+/* Canal de cotizaciones en vivo (Server-Sent Events)
+ *
+ * Escucha /stream/quotes y guarda la última versión recibida. El callback
+ * clientside "quoteStream.version" la copia al store "quote-version" solo
+ * cuando cambia, y eso dispara el recálculo de tablas y gráficas.
+ * Sin canal (el servidor responde 204 si no hay refresco publicando, p. ej.
+ * en Vercel con QUOTE_REFRESHER=0, y EventSource no reconecta) o si el saludo
+ * indica que no está en vivo, se vuelve a refrescar cada FALLBACK_INTERVAL ms.
+ */
+(function () {
+    var FALLBACK_INTERVAL = 60000;
+
+    var state = {
+        version: 0,
+        serverVersion: null,
+        live: false,
+        lastFallback: Date.now()
+    };
+
+    function connect() {
+        if (!window.EventSource) {
+            return;
+        }
+        var source = new window.EventSource('/stream/quotes');
+
+        source.addEventListener('hello', function (event) {
+            var data = JSON.parse(event.data);
+            state.live = data.live === true;
+            // Al reconectar, si hubo cambios mientras tanto se recalcula una vez
+            if (state.serverVersion !== null && data.version !== state.serverVersion) {
+                state.version += 1;
+            }
+            state.serverVersion = data.version;
+        });
+        source.addEventListener('quotes', function (event) {
+            state.serverVersion = JSON.parse(event.data).version;
+            state.version += 1;
+        });
+        source.onerror = function () {
+            // El navegador reintenta solo; mientras tanto se usa el refresco periódico
+            state.live = false;
+        };
+    }
+
+    connect();
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        quoteStream: {
+            version: function (n_intervals, current) {
+                var now = Date.now();
+                if (!state.live && now - state.lastFallback >= FALLBACK_INTERVAL) {
+                    state.lastFallback = now;
+                    state.version += 1;
+                }
+                if (state.version === current) {
+                    return window.dash_clientside.no_update;
+                }
+                return state.version;
+            }
+        }
+    });
+})();
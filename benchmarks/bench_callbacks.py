@@ -0,0 +1,328 @@
+"""Benchmark de los callbacks de tablas y gráficas frente al tamaño de la cartera
+
+Siembra N fondos y N acciones en una base SQLite temporal, sustituye el
+proveedor de mercado por uno sintético con latencia configurable y llama
+directamente a los callbacks de las páginas. Para cada tamaño y escenario
+mide la latencia (p50/p90/p99) en frío y en caliente, las llamadas al
+proveedor y a la base de datos y los bytes de la respuesta, y lo guarda en
+JSON para comparar entre commits:
+
+    python benchmarks/bench_callbacks.py --sizes 10 100 1000 --output bench.json
+    python benchmarks/bench_callbacks.py --compare bench.json
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import closing
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Todo el estado del benchmark vive en un directorio temporal: nunca toca Supabase
+BENCH_DIR = tempfile.mkdtemp(prefix="moneymoney-bench-")
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_DB_PATH"] = os.path.join(BENCH_DIR, "bench.db")
+os.environ["HISTORY_DB_PATH"] = os.path.join(BENCH_DIR, "history.db")
+os.environ["QUOTE_REFRESHER"] = "0"
+
+import numpy as np
+import pandas as pd
+import plotly
+import dash
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from dash.exceptions import PreventUpdate
+from utils import history_store
+from utils.database import Database, holdings_cache
+from utils.fx import fx_cache
+from utils.market_data import quote_cache
+from utils.providers import MarketDataProvider, set_provider
+from utils.sqlite_client import SQLiteQuery, get_sqlite_client
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+SECTORS = ['Technology', 'Healthcare', 'Financial Services', 'Energy', 'Consumer Cyclical', 'Industrials']
+
+class SyntheticProvider(MarketDataProvider):
+    """Proveedor de mercado sintético y determinista con latencia por petición
+
+    Cada ticker sigue un paseo aleatorio fijo (semilla = crc32 del ticker);
+    cada petición, individual o en bloque, espera ``latency`` segundos.
+    """
+
+    name = 'synthetic'
+
+    def __init__(self, latency=0.05, years=3):
+        self.latency = latency
+        self.epoch = pd.Timestamp(datetime.now().date()) - pd.DateOffset(years=years)
+        self.calls = Counter()
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _frame(self, ticker):
+        with self._lock:
+            if ticker not in self._frames:
+                rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+                index = pd.bdate_range(self.epoch, datetime.now().date())
+                close = 50 + 150 * rng.random() * np.exp(np.cumsum(rng.normal(0, 0.012, len(index))))
+                self._frames[ticker] = pd.DataFrame({
+                    'Open': close, 'High': close * 1.01, 'Low': close * 0.99,
+                    'Close': close, 'Volume': 1e6
+                }, index=index)
+            return self._frames[ticker]
+
+    def _slice(self, ticker, start):
+        frame = self._frame(str(ticker).upper())
+        frame = frame[frame.index >= pd.Timestamp(start)]
+        return frame.copy() if not frame.empty else None
+
+    def history(self, ticker, start, timeout=None):
+        self.calls['history'] += 1
+        time.sleep(self.latency)
+        return self._slice(ticker, start)
+
+    def bulk_history(self, tickers, start):
+        self.calls['bulk_history'] += 1
+        self.calls['bulk_history_tickers'] += len(tickers)
+        time.sleep(self.latency)
+        bars = {ticker: self._slice(ticker, start) for ticker in tickers}
+        return {ticker: frame for ticker, frame in bars.items() if frame is not None}
+
+    async def history_async(self, ticker, start):
+        self.calls['history_async'] += 1
+        await asyncio.sleep(self.latency)
+        return self._slice(ticker, start)
+
+    def sector(self, ticker):
+        self.calls['sector'] += 1
+        time.sleep(self.latency)
+        return SECTORS[zlib.crc32(str(ticker).upper().encode()) % len(SECTORS)]
+
+# ============== INSTRUMENTACIÓN ==============
+
+db_calls = Counter()
+_run_query = SQLiteQuery._run
+
+def _counted_run(self, latency=0.0):
+    db_calls[self.action] += 1
+    if latency:
+        time.sleep(latency)
+    return _run_query(self)
+
+def instrument_database(latency):
+    """Cuenta las consultas a la base y simula la latencia de red de Supabase"""
+    SQLiteQuery._run = lambda self: _counted_run(self, latency)
+
+def reset_state():
+    """Arranque en frío: cachés vacías e histórico local nuevo"""
+    quote_cache.clear()
+    holdings_cache.clear()
+    fx_cache.clear()
+    # Series del histórico e informe de riesgo (las páginas ya las importa load_pages)
+    sys.modules['pages.historico'].value_history_cache.clear()
+    sys.modules['pages.riesgo'].risk_cache.clear()
+    path = os.path.join(BENCH_DIR, f"history-{time.monotonic_ns()}.db")
+    history_store._store = history_store.HistoryStore(path)
+
+def seed(size, universe):
+    """Sustituye el contenido de la base por ``size`` fondos y ``size`` acciones"""
+    client = get_sqlite_client()
+    with client.lock, closing(client.connect()) as conn, conn:
+        for table in ('fondos', 'acciones', 'movimientos', 'posiciones'):
+            conn.execute(f"DELETE FROM {table}")
+    today = datetime.now().date()
+    rng = np.random.default_rng(size)
+    fondos, acciones = [], []
+    for i in range(size):
+        ticker = f"T{i % universe:04d}"
+        fecha = (today - timedelta(days=int(rng.integers(1, 900)))).strftime('%Y-%m-%d')
+        fondos.append({'nombre': f"Fondo {i}", 'ticker': ticker, 'tipo': 'RV' if i % 3 else 'RF',
+                       'valor_compra': round(float(rng.uniform(20, 200)), 2),
+                       'cantidad': round(float(rng.uniform(1, 50)), 3), 'fecha_compra': fecha})
+        acciones.append({'nombre': f"Acción {i}", 'ticker': ticker,
+                         'sector': SECTORS[i % len(SECTORS)],
+                         'precio_compra': round(float(rng.uniform(20, 200)), 2),
+                         'num_acciones': int(rng.integers(1, 100)), 'fecha_compra': fecha})
+    # Las escrituras por lotes llevan las compras al libro y materializan las posiciones
+    db = Database()
+    db.insert_many('fondos', fondos)
+    db.insert_many('acciones', acciones)
+
+# ============== ESCENARIOS ==============
+
+def load_pages():
+    dash.Dash(__name__, suppress_callback_exceptions=True)
+    return {name: importlib.import_module(f"pages.{name}")
+            for name in ('acciones', 'fondos', 'graficas_acciones', 'graficas_fondos', 'historico', 'riesgo',
+                         'movimientos')}
+
+def table_scenario(callback, sort_by=None, filter_query=''):
+    """Refresco de la tabla; en caliente envía los datos anteriores como el navegador"""
+    def run(version, current_data):
+        return callback(None, version, None, None, 0, sort_by or [], filter_query, None, None,
+                        current_data)
+    return run
+
+def graphs_scenario(callback):
+    def run(version, current_data):
+        return callback(version)
+    return run
+
+def scenarios(pages):
+    acciones, fondos = pages['acciones'], pages['fondos']
+    return {
+        'acciones_table': table_scenario(acciones.update_acciones_table),
+        'acciones_table_metric_sort': table_scenario(
+            acciones.update_acciones_table, [{'column_id': 'Ganancia/Pérdida', 'direction': 'desc'}]),
+        'acciones_table_metric_filter': table_scenario(
+            acciones.update_acciones_table, filter_query='{Ganancia/Pérdida} > 0'),
+        'fondos_table': table_scenario(fondos.update_fondos_table),
+        'fondos_table_metric_sort': table_scenario(
+            fondos.update_fondos_table, [{'column_id': 'Cambio YTD', 'direction': 'desc'}]),
+        'acciones_graphs': graphs_scenario(pages['graficas_acciones'].update_acciones_graphs),
+        'fondos_graphs': graphs_scenario(pages['graficas_fondos'].update_fondos_graphs),
+        'historico_graphs': graphs_scenario(pages['historico'].update_historico_graphs),
+        'riesgo': graphs_scenario(pages['riesgo'].update_riesgo),
+        'movimientos': graphs_scenario(lambda version: pages['movimientos'].update_ledger_tables(version, None))
+    }
+
+def payload_bytes(output):
+    return len(json.dumps(output, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8'))
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    values = np.array(samples) * 1000
+    return {
+        'n': len(samples),
+        'mean_ms': round(float(values.mean()), 2),
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p90_ms': round(float(np.percentile(values, 90)), 2),
+        'p99_ms': round(float(np.percentile(values, 99)), 2),
+        'max_ms': round(float(values.max()), 2)
+    }
+
+def measure(run, provider, cold_runs, warm_runs):
+    """Ejecuta un escenario: ``cold_runs`` con el estado vacío y ``warm_runs`` seguidas"""
+    result = {}
+    version = 0
+    current_data = None
+    for phase, runs in (('cold', cold_runs), ('warm', warm_runs)):
+        samples, sizes, prevented = [], [], 0
+        provider.calls.clear()
+        db_calls.clear()
+        for _ in range(runs):
+            if phase == 'cold':
+                reset_state()
+                current_data = None
+            version += 1
+            context_value.set(AttributeDict(
+                triggered_inputs=[{'prop_id': 'quote-version.data', 'value': version}]))
+            start = time.perf_counter()
+            try:
+                output = run(version, current_data)
+            except PreventUpdate:
+                samples.append(time.perf_counter() - start)
+                prevented += 1
+                continue
+            samples.append(time.perf_counter() - start)
+            sizes.append(payload_bytes(output))
+            # Las tablas devuelven filas completas (o un Patch) en la primera salida
+            if isinstance(output, (list, tuple)) and isinstance(output[0], list):
+                current_data = output[0]
+        result[phase] = {
+            **percentiles(samples),
+            'prevented': prevented,
+            'payload_bytes': int(np.median(sizes)) if sizes else 0,
+            'provider_calls_per_run': {k: round(v / max(runs, 1), 2) for k, v in provider.calls.items()},
+            'db_calls_per_run': {k: round(v / max(runs, 1), 2) for k, v in db_calls.items()}
+        }
+    return result
+
+# ============== INFORME ==============
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(previous, current):
+    """Imprime la variación de p50 en caliente respecto a un informe anterior"""
+    before = {(r['size'], r['scenario']): r for r in previous['results']}
+    print(f"\nComparación con {previous['meta'].get('commit')} (p50 en caliente)", file=sys.stderr)
+    for row in current['results']:
+        old = before.get((row['size'], row['scenario']))
+        if not old or not old['warm'].get('p50_ms') or not row['warm'].get('p50_ms'):
+            continue
+        change = (row['warm']['p50_ms'] / old['warm']['p50_ms'] - 1) * 100
+        print(f"  N={row['size']:<6} {row['scenario']:<30} {old['warm']['p50_ms']:>9.1f} -> "
+              f"{row['warm']['p50_ms']:>9.1f} ms ({change:+.1f}%)", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Posiciones de cada tipo a sembrar")
+    parser.add_argument('--universe', type=int, default=200,
+                        help="Tickers distintos (las posiciones los repiten)")
+    parser.add_argument('--latency-ms', type=float, default=50,
+                        help="Latencia de cada petición al proveedor de mercado")
+    parser.add_argument('--db-latency-ms', type=float, default=0,
+                        help="Latencia simulada de cada consulta a la base de datos")
+    parser.add_argument('--cold-runs', type=int, default=3)
+    parser.add_argument('--warm-runs', type=int, default=20)
+    parser.add_argument('--scenarios', nargs='+', help="Subconjunto de escenarios")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help="Informe JSON anterior con el que comparar")
+    args = parser.parse_args()
+
+    provider = SyntheticProvider(latency=args.latency_ms / 1000)
+    set_provider(provider)
+    instrument_database(args.db_latency_ms / 1000)
+    available = scenarios(load_pages())
+    selected = args.scenarios or list(available)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'args': vars(args)
+        },
+        'results': []
+    }
+    try:
+        for size in args.sizes:
+            seed(size, args.universe)
+            for name in selected:
+                result = measure(available[name], provider, args.cold_runs, args.warm_runs)
+                report['results'].append({'size': size, 'scenario': name, **result})
+                print(f"N={size:<6} {name:<30} frío p50 {result['cold'].get('p50_ms', 0):>9.1f} ms | "
+                      f"caliente p50 {result['warm'].get('p50_ms', 0):>9.1f} ms "
+                      f"p99 {result['warm'].get('p99_ms', 0):>9.1f} ms | "
+                      f"{result['warm']['payload_bytes']:>9} B", file=sys.stderr)
+    finally:
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+if __name__ == '__main__':
+    main()
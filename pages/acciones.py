@@ -1,13 +1,53 @@
-from dash import html, dcc, Input, Output, State, callback, dash_table, callback_context
+from dash import html, dcc, Input, Output, State, callback, dash_table, callback_context, no_update
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 from utils.database import Database
+from utils.async_database import AsyncDatabase
 from utils.market_data import MarketData
+from utils import aio
+from utils.refresher import refresher
+from utils.holdings_io import parse_upload, validate_rows
+from utils.table_patch import patch_rows, is_patch
+from utils.table_query import parse_filter_query
+from utils.ticker_metadata import get_ticker_metadata
+from utils.portfolio import portfolio_totals
+from utils.holdings_table import load_positions_page
 from utils.styles import *
 from datetime import datetime
+import math
+import pandas as pd
 
 db = Database()
+adb = AsyncDatabase()
 market = MarketData()
 
+PAGE_SIZE = 20
+
+TABLE_COLUMNS = [
+    {'name': 'Nombre', 'id': 'Nombre'},
+    {'name': 'Ticker', 'id': 'Ticker'},
+    {'name': 'Sector', 'id': 'Sector'},
+    {'name': 'Precio Compra', 'id': 'Precio Compra', 'type': 'numeric', 'format': MONEY_FORMAT},
+    {'name': 'Num. Acciones', 'id': 'Num. Acciones', 'type': 'numeric'},
+    {'name': 'Valor Actual', 'id': 'Valor Actual', 'type': 'numeric', 'format': MONEY_FORMAT},
+    {'name': 'Cambio Diario', 'id': 'Cambio Diario', 'type': 'numeric', 'format': SIGNED_PERCENT_FORMAT},
+    {'name': f'Cambio Diario ({CURRENCY_SYMBOL.strip()})', 'id': 'Cambio Diario (€)', 'type': 'numeric', 'format': SIGNED_MONEY_FORMAT},
+    {'name': 'Cambio YTD', 'id': 'Cambio YTD', 'type': 'numeric', 'format': SIGNED_PERCENT_FORMAT},
+    {'name': 'Ganancia/Pérdida', 'id': 'Ganancia/Pérdida', 'type': 'numeric', 'format': SIGNED_MONEY_FORMAT},
+    {'name': 'Ganancia/Pérdida (%)', 'id': 'Ganancia/Pérdida (%)', 'type': 'numeric', 'format': SIGNED_PERCENT_FORMAT},
+    {'name': 'Fecha Compra', 'id': 'Fecha Compra', 'type': 'datetime'}
+]
+
+# Campos de la posición de cada columna de la tabla (orden y filtros)
+POSITION_COLUMNS = {
+    'Nombre': 'nombre',
+    'Ticker': 'ticker',
+    'Sector': 'sector',
+    'Precio Compra': 'coste_medio',
+    'Num. Acciones': 'cantidad',
+    'Fecha Compra': 'fecha_compra'
+}
+
 def layout():
     return html.Div([
         html.Div([
@@ -29,11 +69,48 @@ def layout():
             dbc.Button([
                 html.I(className="fas fa-sync-alt me-2"),
                 "Actualizar Datos"
-            ], id="btn-refresh-acciones", color="success",
-               style=BUTTON_SUCCESS)
+            ], id="btn-refresh-acciones", color="success", className="me-2",
+               style=BUTTON_SUCCESS),
+            
+            dcc.Upload(
+                dbc.Button([
+                    html.I(className="fas fa-file-import me-2"),
+                    "Importar CSV/JSON"
+                ], color="secondary", className="me-2"),
+                id="upload-acciones", accept=".csv,.json", multiple=False,
+                style={"display": "inline-block"}
+            ),
+            
+            dbc.Button([
+                html.I(className="fas fa-file-export me-2"),
+                "Exportar CSV"
+            ], href="/export/acciones.csv", external_link=True, color="secondary")
         ], style={"marginBottom": "25px"}),
         
-        html.Div(id="acciones-table-container"),
+        html.Div(id="import-acciones-result"),
+        
+        html.Div(id="acciones-empty"),
+        html.Div(
+            dash_table.DataTable(
+                id='acciones-datatable',
+                data=[],
+                columns=TABLE_COLUMNS,
+                style_table=TABLE_STYLE,
+                style_header=TABLE_HEADER_STYLE,
+                style_cell=TABLE_CELL_STYLE,
+                page_action='custom',
+                page_current=0,
+                page_size=PAGE_SIZE,
+                page_count=1,
+                sort_action='custom',
+                sort_mode='single',
+                sort_by=[],
+                filter_action='custom',
+                filter_query='',
+                style_filter=TABLE_FILTER_STYLE
+            ),
+            id="acciones-table-container"
+        ),
         
         dbc.Modal([
             dbc.ModalHeader(dbc.ModalTitle(id="modal-acciones-title")),
@@ -46,7 +123,7 @@ def layout():
                     ], width=6),
                     dbc.Col([
                         dbc.Label("Ticker", style={"fontWeight": "600"}),
-                        dbc.Input(id="input-accion-ticker", type="text",
+                        dbc.Input(id="input-accion-ticker", type="text", debounce=True,
                                  placeholder="Ej: AAPL", style=INPUT_STYLE)
                     ], width=6),
                 ], className="mb-3"),
@@ -58,7 +135,7 @@ def layout():
                                  placeholder="Ej: Tecnología", style=INPUT_STYLE)
                     ], width=4),
                     dbc.Col([
-                        dbc.Label("Precio de Compra (€)", style={"fontWeight": "600"}),
+                        dbc.Label(f"Precio de Compra ({CURRENCY_SYMBOL.strip()})", style={"fontWeight": "600"}),
                         dbc.Input(id="input-accion-precio", type="number",
                                  placeholder="150.50", style=INPUT_STYLE)
                     ], width=4),
@@ -78,7 +155,8 @@ def layout():
                     ], width=6),
                 ]),
                 
-                html.Div(id="input-accion-id", style={"display": "none"})
+                html.Div(id="input-accion-id", style={"display": "none"}),
+                html.Div(id="modal-acciones-error", className="mt-3")
             ]),
             dbc.ModalFooter([
                 dbc.Button("Cancelar", id="btn-cancel-accion", 
@@ -91,7 +169,10 @@ def layout():
         
         dbc.Modal([
             dbc.ModalHeader(dbc.ModalTitle("Confirmar Eliminación")),
-            dbc.ModalBody("¿Estás seguro de que deseas eliminar esta acción?"),
+            dbc.ModalBody([
+                html.P("¿Estás seguro de que deseas eliminar esta acción?"),
+                html.Div(id="modal-delete-accion-error")
+            ]),
             dbc.ModalFooter([
                 dbc.Button("Cancelar", id="btn-cancel-delete-accion", 
                           color="secondary", className="me-2"),
@@ -101,62 +182,74 @@ def layout():
         ], id="modal-delete-accion", is_open=False,
            style={"color": "#000"}),
         
-        html.Div(id="accion-to-delete", style={"display": "none"}),
-        dcc.Interval(id='interval-acciones', interval=60000, n_intervals=0)
+        html.Div(id="accion-to-delete", style={"display": "none"})
     ])
 
 @callback(
-    Output("acciones-table-container", "children"),
+    [Output("acciones-datatable", "data"),
+     Output("acciones-datatable", "page_count"),
+     Output("acciones-datatable", "style_data_conditional"),
+     Output("acciones-table-container", "style"),
+     Output("acciones-empty", "children")],
     [Input("btn-refresh-acciones", "n_clicks"),
-     Input("interval-acciones", "n_intervals"),
+     Input("quote-version", "data"),
      Input("btn-save-accion", "n_clicks"),
-     Input("btn-confirm-delete-accion", "n_clicks")]
+     Input("btn-confirm-delete-accion", "n_clicks"),
+     Input("acciones-datatable", "page_current"),
+     Input("acciones-datatable", "sort_by"),
+     Input("acciones-datatable", "filter_query"),
+     Input("import-acciones-result", "children")],
+    [State("acciones-datatable", "page_size"),
+     State("acciones-datatable", "data")]
 )
-def update_acciones_table(refresh_clicks, intervals, save_clicks, delete_clicks):
-    acciones = db.get_acciones()
+def update_acciones_table(refresh_clicks, quote_version, save_clicks, delete_clicks,
+                          page_current, sort_by, filter_query, import_result, page_size, current_data):
+    ctx = callback_context
+    if ctx.triggered and ctx.triggered[0]['prop_id'].split('.')[0] == "btn-refresh-acciones":
+        # Refresco fuera de ciclo: actualiza la caché compartida antes de leerla
+        refresher.refresh()
+    
+    # Supabase y Yahoo Finance se consultan en paralelo con un único plazo por callback
+    page_size = page_size or PAGE_SIZE
+    sort_column = sort_by[0]['column_id'] if sort_by else None
+    descending = bool(sort_by) and sort_by[0]['direction'] == 'desc'
+    filters = parse_filter_query(filter_query)
+    result = aio.run(load_positions_page(adb, 'acciones', POSITION_COLUMNS, page_current, sort_column,
+                                         descending, page_size, filters, aio.Budget()))
+    if result is None:
+        raise PreventUpdate
+    total_acciones, cartera_total, cartera = result
     
-    if not acciones:
-        return html.Div([
+    if not total_acciones and not filters:
+        return [], 1, [], {"display": "none"}, html.Div([
             html.I(className="fas fa-inbox fa-3x mb-3", 
                   style={"color": "#555"}),
             html.P("No hay acciones registradas. ¡Añade tu primera acción!",
                   style={"color": "#aaa", "fontSize": "1.1rem"})
         ], style={"textAlign": "center", "padding": "60px 20px"})
     
-    table_data = []
-    total_invertido = 0
-    total_valor_actual = 0
+    page_count = max(math.ceil(total_acciones / page_size), 1)
+    totales = portfolio_totals(cartera_total)
     
-    for accion in acciones:
-        current_price = market.get_current_price(accion['ticker'])
-        daily_change_pct, daily_change_abs = market.get_daily_change(accion['ticker'])
-        ytd_change = market.get_ytd_change(accion['ticker'], accion['fecha_compra'])
-        
-        valor_actual = current_price * accion['num_acciones'] if current_price else 0
-        invertido = accion['precio_compra'] * accion['num_acciones']
-        ganancia_perdida = valor_actual - invertido
-        ganancia_perdida_pct = (ganancia_perdida / invertido * 100) if invertido > 0 else 0
-        
-        total_invertido += invertido
-        total_valor_actual += valor_actual
-        
+    # Los números viajan sin formatear: el formato y los colores se aplican en el navegador
+    table_data = []
+    for accion in cartera.to_dict('records'):
         table_data.append({
             'id': accion['id'],
             'Nombre': accion['nombre'],
             'Ticker': accion['ticker'],
-            'Sector': accion.get('sector', 'N/A'),
-            'Precio Compra': f"€{accion['precio_compra']:.2f}",
-            'Num. Acciones': accion['num_acciones'],
-            'Valor Actual': f"€{current_price:.2f}" if current_price else "N/A",
-            'Cambio Diario': f"{daily_change_pct:+.2f}% (€{daily_change_abs:+.2f})",
-            'Cambio YTD': f"{ytd_change:+.2f}%",
-            'Ganancia/Pérdida': f"€{ganancia_perdida:+,.2f} ({ganancia_perdida_pct:+.2f}%)",
+            'Sector': accion.get('sector') or 'N/A',
+            'Precio Compra': accion['coste_medio'],
+            'Num. Acciones': accion['cantidad'],
+            'Valor Actual': accion['precio_actual'] if pd.notna(accion['precio_actual']) else None,
+            'Cambio Diario': round(accion['daily_change_pct'], 4),
+            'Cambio Diario (€)': round(accion['daily_change_abs'], 4),
+            'Cambio YTD': round(accion['ytd_change'], 4),
+            'Ganancia/Pérdida': round(accion['ganancia'], 2),
+            'Ganancia/Pérdida (%)': round(accion['ganancia_pct'], 4),
             'Fecha Compra': accion['fecha_compra']
         })
     
-    total_ganancia = total_valor_actual - total_invertido
-    total_ganancia_pct = (total_ganancia / total_invertido * 100) if total_invertido > 0 else 0
-    
     table_data.append({
         'id': 'total',
         'Nombre': 'TOTAL',
@@ -164,48 +257,30 @@ def update_acciones_table(refresh_clicks, intervals, save_clicks, delete_clicks)
         'Sector': '',
         'Precio Compra': '',
         'Num. Acciones': '',
-        'Valor Actual': f"€{total_valor_actual:,.2f}",
+        'Valor Actual': round(totales['valor_actual'], 2),
         'Cambio Diario': '',
+        'Cambio Diario (€)': '',
         'Cambio YTD': '',
-        'Ganancia/Pérdida': f"€{total_ganancia:+,.2f} ({total_ganancia_pct:+.2f}%)",
-        'Fecha Compra': f"Total Invertido: €{total_invertido:,.2f}"
+        'Ganancia/Pérdida': round(totales['ganancia'], 2),
+        'Ganancia/Pérdida (%)': round(totales['ganancia_pct'], 4),
+        'Fecha Compra': f"Total Invertido: {CURRENCY_SYMBOL}{totales['invertido']:,.2f}"
     })
     
-    return dash_table.DataTable(
-        data=table_data,
-        columns=[
-            {'name': 'Nombre', 'id': 'Nombre'},
-            {'name': 'Ticker', 'id': 'Ticker'},
-            {'name': 'Sector', 'id': 'Sector'},
-            {'name': 'Precio Compra', 'id': 'Precio Compra'},
-            {'name': 'Num. Acciones', 'id': 'Num. Acciones'},
-            {'name': 'Valor Actual', 'id': 'Valor Actual'},
-            {'name': 'Cambio Diario', 'id': 'Cambio Diario'},
-            {'name': 'Cambio YTD', 'id': 'Cambio YTD'},
-            {'name': 'Ganancia/Pérdida', 'id': 'Ganancia/Pérdida'},
-            {'name': 'Fecha Compra', 'id': 'Fecha Compra'}
-        ],
-        style_table=TABLE_STYLE,
-        style_header=TABLE_HEADER_STYLE,
-        style_cell=TABLE_CELL_STYLE,
-        style_data_conditional=[
-            {
-                'if': {'row_index': len(table_data) - 1},
-                'backgroundColor': CARD_BG_LIGHTER,
-                'fontWeight': '700',
-                'borderTop': f'2px solid {PRIMARY_COLOR}'
-            },
-            {
-                'if': {'filter_query': '{Ganancia/Pérdida} contains "+"'},
-                'color': SUCCESS_COLOR
-            },
-            {
-                'if': {'filter_query': '{Ganancia/Pérdida} contains "-"'},
-                'color': DANGER_COLOR
-            }
-        ],
-        page_size=20
-    )
+    style_data_conditional = [
+        {
+            'if': {'row_index': len(table_data) - 1},
+            'backgroundColor': CARD_BG_LIGHTER,
+            'fontWeight': '700',
+            'borderTop': f'2px solid {PRIMARY_COLOR}'
+        },
+        *PROFIT_LOSS_STYLE
+    ]
+    
+    data = patch_rows(current_data, table_data)
+    if is_patch(data):
+        # Mismas filas en el navegador: solo viajan las celdas que cambian
+        return data, page_count, no_update, no_update, no_update
+    return table_data, page_count, style_data_conditional, {}, None
 
 @callback(
     [Output("modal-acciones", "is_open"),
@@ -216,7 +291,8 @@ def update_acciones_table(refresh_clicks, intervals, save_clicks, delete_clicks)
      Output("input-accion-precio", "value"),
      Output("input-accion-num", "value"),
      Output("input-accion-fecha", "value"),
-     Output("input-accion-id", "children")],
+     Output("input-accion-id", "children"),
+     Output("modal-acciones-error", "children")],
     [Input("btn-add-accion", "n_clicks"),
      Input("btn-cancel-accion", "n_clicks"),
      Input("btn-save-accion", "n_clicks")],
@@ -233,30 +309,57 @@ def toggle_modal_acciones(add_clicks, cancel_clicks, save_clicks,
                           nombre, ticker, sector, precio, num, fecha, accion_id, is_open):
     ctx = callback_context
     if not ctx.triggered:
-        return False, "", "", "", "", "", "", datetime.now().strftime('%Y-%m-%d'), ""
+        return False, "", "", "", "", "", "", datetime.now().strftime('%Y-%m-%d'), "", None
     
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
     
     if button_id == "btn-add-accion":
-        return True, "Añadir Nueva Acción", "", "", "", "", "", datetime.now().strftime('%Y-%m-%d'), ""
+        return True, "Añadir Nueva Acción", "", "", "", "", "", datetime.now().strftime('%Y-%m-%d'), "", None
     
     if button_id == "btn-save-accion":
         if all([nombre, ticker, precio, num, fecha]):
+            if not sector:
+                # Sin sector: el de la caché de metadatos, si ya se conoce
+                sector = get_ticker_metadata().cached([ticker]).get(ticker.upper(), {}).get('sector')
             sector_val = sector if sector else "N/A"
-            if accion_id:
-                db.update_accion(int(accion_id), nombre, ticker, sector_val, float(precio), int(num), fecha)
-            else:
-                db.add_accion(nombre, ticker, sector_val, float(precio), int(num), fecha)
-            return False, "", "", "", "", "", "", datetime.now().strftime('%Y-%m-%d'), ""
+            try:
+                if accion_id:
+                    db.update_accion(int(accion_id), nombre, ticker, sector_val, float(precio), int(num), fecha)
+                else:
+                    db.add_accion(nombre, ticker, sector_val, float(precio), int(num), fecha)
+            except ValueError as e:
+                # El modal sigue abierto con los datos para corregirlos
+                return (True, no_update, no_update, no_update, no_update, no_update, no_update, no_update,
+                        no_update, dbc.Alert(str(e), color="danger"))
+            return False, "", "", "", "", "", "", datetime.now().strftime('%Y-%m-%d'), "", None
     
     if button_id == "btn-cancel-accion":
-        return False, "", "", "", "", "", "", datetime.now().strftime('%Y-%m-%d'), ""
+        return False, "", "", "", "", "", "", datetime.now().strftime('%Y-%m-%d'), "", None
     
-    return is_open, "Añadir Nueva Acción", "", "", "", "", "", datetime.now().strftime('%Y-%m-%d'), ""
+    return is_open, "Añadir Nueva Acción", "", "", "", "", "", datetime.now().strftime('%Y-%m-%d'), "", None
+
+@callback(
+    [Output("input-accion-nombre", "value", allow_duplicate=True),
+     Output("input-accion-sector", "value", allow_duplicate=True)],
+    Input("input-accion-ticker", "value"),
+    [State("input-accion-nombre", "value"),
+     State("input-accion-sector", "value")],
+    prevent_initial_call=True
+)
+def autofill_accion(ticker, nombre, sector):
+    """Rellena nombre y sector vacíos con los metadatos del ticker"""
+    if not ticker or (nombre and sector and sector != "N/A"):
+        raise PreventUpdate
+    metadata = market.get_metadata(ticker)
+    if not metadata:
+        raise PreventUpdate
+    return (no_update if nombre or not metadata['name'] else metadata['name'],
+            no_update if (sector and sector != "N/A") or not metadata['sector'] else metadata['sector'])
 
 @callback(
     [Output("modal-delete-accion", "is_open"),
-     Output("accion-to-delete", "children")],
+     Output("accion-to-delete", "children"),
+     Output("modal-delete-accion-error", "children")],
     [Input("btn-confirm-delete-accion", "n_clicks"),
      Input("btn-cancel-delete-accion", "n_clicks")],
     [State("accion-to-delete", "children"),
@@ -265,15 +368,51 @@ def toggle_modal_acciones(add_clicks, cancel_clicks, save_clicks,
 def toggle_delete_modal(confirm_clicks, cancel_clicks, accion_id, is_open):
     ctx = callback_context
     if not ctx.triggered:
-        return False, ""
+        return False, "", None
     
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
     
     if button_id == "btn-confirm-delete-accion" and accion_id:
-        db.delete_accion(int(accion_id))
-        return False, ""
+        try:
+            db.delete_accion(int(accion_id))
+        except ValueError as e:
+            return True, accion_id, dbc.Alert(str(e), color="danger")
+        return False, "", None
     
     if button_id == "btn-cancel-delete-accion":
-        return False, ""
+        return False, "", None
+    
+    return is_open, accion_id, None
+
+@callback(
+    Output("import-acciones-result", "children"),
+    Input("upload-acciones", "contents"),
+    State("upload-acciones", "filename"),
+    prevent_initial_call=True
+)
+def import_acciones(contents, filename):
+    if not contents:
+        return None
+    try:
+        records = parse_upload(contents, filename)
+    except Exception as e:
+        return dbc.Alert(f"No se pudo leer {filename}: {e}", color="danger", dismissable=True)
+    
+    rows, errors = validate_rows('acciones', records)
+    # Las filas con id actualizan posiciones existentes; el resto se insertan en lotes
+    nuevas = [row for row in rows if 'id' not in row]
+    existentes = [row for row in rows if 'id' in row]
+    guardadas = len(db.insert_many('acciones', nuevas)) if nuevas else 0
+    if existentes:
+        # Las que dejarían ventas sin cubrir en el libro se rechazan
+        actualizadas, rechazadas = db.upsert_lots('acciones', existentes)
+        guardadas += len(actualizadas)
+        errors = errors + rechazadas
     
-    return is_open, accion_id
+    color = "success" if not errors and guardadas == len(rows) else "warning"
+    return dbc.Alert([
+        html.P(f"{guardadas} de {len(records)} filas importadas desde {filename}.",
+               className="mb-0"),
+        *[html.Small(error, className="d-block") for error in errors[:20]],
+        html.Small(f"... y {len(errors) - 20} errores más", className="d-block") if len(errors) > 20 else None
+    ], color=color, dismissable=True)
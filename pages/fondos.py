@@ -1,13 +1,53 @@
-from dash import html, dcc, Input, Output, State, callback, dash_table
+from dash import html, dcc, Input, Output, State, callback, dash_table, callback_context, no_update
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 from utils.database import Database
+from utils.async_database import AsyncDatabase
 from utils.market_data import MarketData
+from utils import aio
+from utils.refresher import refresher
+from utils.holdings_io import parse_upload, validate_rows
+from utils.table_patch import patch_rows, is_patch
+from utils.table_query import parse_filter_query
+from utils.portfolio import portfolio_totals
+from utils.holdings_table import load_positions_page
 from utils.styles import *
 from datetime import datetime
+import math
+import pandas as pd
 
 db = Database()
+adb = AsyncDatabase()
 market = MarketData()
 
+PAGE_SIZE = 20
+
+TABLE_COLUMNS = [
+    {'name': 'Nombre', 'id': 'Nombre'},
+    {'name': 'Ticker', 'id': 'Ticker'},
+    {'name': 'Tipo', 'id': 'Tipo'},
+    {'name': 'Valor Compra', 'id': 'Valor Compra', 'type': 'numeric', 'format': MONEY_FORMAT},
+    {'name': 'Cantidad', 'id': 'Cantidad', 'type': 'numeric', 'format': NUMBER_FORMAT},
+    {'name': 'Valor Actual', 'id': 'Valor Actual', 'type': 'numeric', 'format': MONEY_FORMAT},
+    {'name': 'Cambio Diario', 'id': 'Cambio Diario', 'type': 'numeric', 'format': SIGNED_PERCENT_FORMAT},
+    {'name': f'Cambio Diario ({CURRENCY_SYMBOL.strip()})', 'id': 'Cambio Diario (€)', 'type': 'numeric', 'format': SIGNED_MONEY_FORMAT},
+    {'name': 'Cambio YTD', 'id': 'Cambio YTD', 'type': 'numeric', 'format': SIGNED_PERCENT_FORMAT},
+    {'name': 'Ganancia/Pérdida', 'id': 'Ganancia/Pérdida', 'type': 'numeric', 'format': SIGNED_MONEY_FORMAT},
+    {'name': 'Ganancia/Pérdida (%)', 'id': 'Ganancia/Pérdida (%)', 'type': 'numeric', 'format': SIGNED_PERCENT_FORMAT},
+    {'name': 'Fecha Compra', 'id': 'Fecha Compra', 'type': 'datetime'},
+    {'name': 'Acciones', 'id': 'Acciones', 'presentation': 'markdown'}
+]
+
+# Campos de la posición de cada columna de la tabla (orden y filtros)
+POSITION_COLUMNS = {
+    'Nombre': 'nombre',
+    'Ticker': 'ticker',
+    'Tipo': 'tipo',
+    'Valor Compra': 'coste_medio',
+    'Cantidad': 'cantidad',
+    'Fecha Compra': 'fecha_compra'
+}
+
 def layout():
     return html.Div([
         # Header
@@ -31,12 +71,49 @@ def layout():
             dbc.Button([
                 html.I(className="fas fa-sync-alt me-2"),
                 "Actualizar Datos"
-            ], id="btn-refresh-fondos", color="success",
-               style=BUTTON_SUCCESS)
+            ], id="btn-refresh-fondos", color="success", className="me-2",
+               style=BUTTON_SUCCESS),
+            
+            dcc.Upload(
+                dbc.Button([
+                    html.I(className="fas fa-file-import me-2"),
+                    "Importar CSV/JSON"
+                ], color="secondary", className="me-2"),
+                id="upload-fondos", accept=".csv,.json", multiple=False,
+                style={"display": "inline-block"}
+            ),
+            
+            dbc.Button([
+                html.I(className="fas fa-file-export me-2"),
+                "Exportar CSV"
+            ], href="/export/fondos.csv", external_link=True, color="secondary")
         ], style={"marginBottom": "25px"}),
         
-        # Tabla
-        html.Div(id="fondos-table-container"),
+        html.Div(id="import-fondos-result"),
+        
+        # Tabla (paginación y orden en el servidor)
+        html.Div(id="fondos-empty"),
+        html.Div(
+            dash_table.DataTable(
+                id='fondos-datatable',
+                data=[],
+                columns=TABLE_COLUMNS,
+                style_table=TABLE_STYLE,
+                style_header=TABLE_HEADER_STYLE,
+                style_cell=TABLE_CELL_STYLE,
+                page_action='custom',
+                page_current=0,
+                page_size=PAGE_SIZE,
+                page_count=1,
+                sort_action='custom',
+                sort_mode='single',
+                sort_by=[],
+                filter_action='custom',
+                filter_query='',
+                style_filter=TABLE_FILTER_STYLE
+            ),
+            id="fondos-table-container"
+        ),
         
         # Modal añadir/editar
         dbc.Modal([
@@ -68,7 +145,7 @@ def layout():
                         )
                     ], width=4),
                     dbc.Col([
-                        dbc.Label("Valor de Compra (€)", style={"fontWeight": "600"}),
+                        dbc.Label(f"Valor de Compra ({CURRENCY_SYMBOL.strip()})", style={"fontWeight": "600"}),
                         dbc.Input(id="input-fondo-valor", type="number",
                                  placeholder="100.50", style=INPUT_STYLE)
                     ], width=4),
@@ -88,7 +165,8 @@ def layout():
                     ], width=6),
                 ]),
                 
-                html.Div(id="input-fondo-id", style={"display": "none"})
+                html.Div(id="input-fondo-id", style={"display": "none"}),
+                html.Div(id="modal-fondos-error", className="mt-3")
             ]),
             dbc.ModalFooter([
                 dbc.Button("Cancelar", id="btn-cancel-fondo", 
@@ -102,7 +180,10 @@ def layout():
         # Modal eliminar
         dbc.Modal([
             dbc.ModalHeader(dbc.ModalTitle("Confirmar Eliminación")),
-            dbc.ModalBody("¿Estás seguro de que deseas eliminar este fondo?"),
+            dbc.ModalBody([
+                html.P("¿Estás seguro de que deseas eliminar este fondo?"),
+                html.Div(id="modal-delete-fondo-error")
+            ]),
             dbc.ModalFooter([
                 dbc.Button("Cancelar", id="btn-cancel-delete-fondo", 
                           color="secondary", className="me-2"),
@@ -112,65 +193,76 @@ def layout():
         ], id="modal-delete-fondo", is_open=False,
            style={"color": "#000"}),
         
-        html.Div(id="fondo-to-delete", style={"display": "none"}),
-        dcc.Interval(id='interval-fondos', interval=60000, n_intervals=0)
+        html.Div(id="fondo-to-delete", style={"display": "none"})
     ])
 
 @callback(
-    Output("fondos-table-container", "children"),
+    [Output("fondos-datatable", "data"),
+     Output("fondos-datatable", "page_count"),
+     Output("fondos-datatable", "style_data_conditional"),
+     Output("fondos-table-container", "style"),
+     Output("fondos-empty", "children")],
     [Input("btn-refresh-fondos", "n_clicks"),
-     Input("interval-fondos", "n_intervals"),
+     Input("quote-version", "data"),
      Input("btn-save-fondo", "n_clicks"),
-     Input("btn-confirm-delete-fondo", "n_clicks")]
+     Input("btn-confirm-delete-fondo", "n_clicks"),
+     Input("fondos-datatable", "page_current"),
+     Input("fondos-datatable", "sort_by"),
+     Input("fondos-datatable", "filter_query"),
+     Input("import-fondos-result", "children")],
+    [State("fondos-datatable", "page_size"),
+     State("fondos-datatable", "data")]
 )
-def update_fondos_table(refresh_clicks, intervals, save_clicks, delete_clicks):
-    fondos = db.get_fondos()
+def update_fondos_table(refresh_clicks, quote_version, save_clicks, delete_clicks,
+                        page_current, sort_by, filter_query, import_result, page_size, current_data):
+    ctx = callback_context
+    if ctx.triggered and ctx.triggered[0]['prop_id'].split('.')[0] == "btn-refresh-fondos":
+        # Refresco fuera de ciclo: actualiza la caché compartida antes de leerla
+        refresher.refresh()
+    
+    # Supabase y Yahoo Finance se consultan en paralelo con un único plazo por callback
+    page_size = page_size or PAGE_SIZE
+    sort_column = sort_by[0]['column_id'] if sort_by else None
+    descending = bool(sort_by) and sort_by[0]['direction'] == 'desc'
+    filters = parse_filter_query(filter_query)
+    result = aio.run(load_positions_page(adb, 'fondos', POSITION_COLUMNS, page_current, sort_column,
+                                         descending, page_size, filters, aio.Budget()))
+    if result is None:
+        raise PreventUpdate
+    total_fondos, cartera_total, cartera = result
     
-    if not fondos:
-        return html.Div([
+    if not total_fondos and not filters:
+        return [], 1, [], {"display": "none"}, html.Div([
             html.I(className="fas fa-inbox fa-3x mb-3", 
                   style={"color": "#555"}),
             html.P("No hay fondos registrados. ¡Añade tu primer fondo!",
                   style={"color": "#aaa", "fontSize": "1.1rem"})
         ], style={"textAlign": "center", "padding": "60px 20px"})
     
-    # Calcular datos con Yahoo Finance
-    table_data = []
-    total_invertido = 0
-    total_valor_actual = 0
+    page_count = max(math.ceil(total_fondos / page_size), 1)
+    totales = portfolio_totals(cartera_total)
     
-    for fondo in fondos:
-        current_price = market.get_current_price(fondo['ticker'])
-        daily_change_pct, daily_change_abs = market.get_daily_change(fondo['ticker'])
-        ytd_change = market.get_ytd_change(fondo['ticker'], fondo['fecha_compra'])
-        
-        valor_actual = current_price * fondo['cantidad'] if current_price else 0
-        invertido = fondo['valor_compra'] * fondo['cantidad']
-        ganancia_perdida = valor_actual - invertido
-        ganancia_perdida_pct = (ganancia_perdida / invertido * 100) if invertido > 0 else 0
-        
-        total_invertido += invertido
-        total_valor_actual += valor_actual
-        
+    # Los números viajan sin formatear: el formato y los colores se aplican en el navegador
+    table_data = []
+    for fondo in cartera.to_dict('records'):
         table_data.append({
             'id': fondo['id'],
             'Nombre': fondo['nombre'],
             'Ticker': fondo['ticker'],
             'Tipo': fondo['tipo'],
-            'Valor Compra': f"€{fondo['valor_compra']:.2f}",
-            'Cantidad': f"{fondo['cantidad']:.2f}",
-            'Valor Actual': f"€{current_price:.2f}" if current_price else "N/A",
-            'Cambio Diario': f"{daily_change_pct:+.2f}% (€{daily_change_abs:+.2f})",
-            'Cambio YTD': f"{ytd_change:+.2f}%",
-            'Ganancia/Pérdida': f"€{ganancia_perdida:+,.2f} ({ganancia_perdida_pct:+.2f}%)",
+            'Valor Compra': fondo['coste_medio'],
+            'Cantidad': fondo['cantidad'],
+            'Valor Actual': fondo['precio_actual'] if pd.notna(fondo['precio_actual']) else None,
+            'Cambio Diario': round(fondo['daily_change_pct'], 4),
+            'Cambio Diario (€)': round(fondo['daily_change_abs'], 4),
+            'Cambio YTD': round(fondo['ytd_change'], 4),
+            'Ganancia/Pérdida': round(fondo['ganancia'], 2),
+            'Ganancia/Pérdida (%)': round(fondo['ganancia_pct'], 4),
             'Fecha Compra': fondo['fecha_compra'],
             'Acciones': fondo['id']
         })
     
     # Fila de totales
-    total_ganancia = total_valor_actual - total_invertido
-    total_ganancia_pct = (total_ganancia / total_invertido * 100) if total_invertido > 0 else 0
-    
     table_data.append({
         'id': 'total',
         'Nombre': 'TOTAL',
@@ -178,51 +270,31 @@ def update_fondos_table(refresh_clicks, intervals, save_clicks, delete_clicks):
         'Tipo': '',
         'Valor Compra': '',
         'Cantidad': '',
-        'Valor Actual': f"€{total_valor_actual:,.2f}",
+        'Valor Actual': round(totales['valor_actual'], 2),
         'Cambio Diario': '',
+        'Cambio Diario (€)': '',
         'Cambio YTD': '',
-        'Ganancia/Pérdida': f"€{total_ganancia:+,.2f} ({total_ganancia_pct:+.2f}%)",
-        'Fecha Compra': f"Total Invertido: €{total_invertido:,.2f}",
+        'Ganancia/Pérdida': round(totales['ganancia'], 2),
+        'Ganancia/Pérdida (%)': round(totales['ganancia_pct'], 4),
+        'Fecha Compra': f"Total Invertido: {CURRENCY_SYMBOL}{totales['invertido']:,.2f}",
         'Acciones': ''
     })
     
-    return dash_table.DataTable(
-        data=table_data,
-        columns=[
-            {'name': 'Nombre', 'id': 'Nombre'},
-            {'name': 'Ticker', 'id': 'Ticker'},
-            {'name': 'Tipo', 'id': 'Tipo'},
-            {'name': 'Valor Compra', 'id': 'Valor Compra'},
-            {'name': 'Cantidad', 'id': 'Cantidad'},
-            {'name': 'Valor Actual', 'id': 'Valor Actual'},
-            {'name': 'Cambio Diario', 'id': 'Cambio Diario'},
-            {'name': 'Cambio YTD', 'id': 'Cambio YTD'},
-            {'name': 'Ganancia/Pérdida', 'id': 'Ganancia/Pérdida'},
-            {'name': 'Fecha Compra', 'id': 'Fecha Compra'},
-            {'name': 'Acciones', 'id': 'Acciones', 'presentation': 'markdown'}
-        ],
-        style_table=TABLE_STYLE,
-        style_header=TABLE_HEADER_STYLE,
-        style_cell=TABLE_CELL_STYLE,
-        style_data_conditional=[
-            {
-                'if': {'row_index': len(table_data) - 1},
-                'backgroundColor': CARD_BG_LIGHTER,
-                'fontWeight': '700',
-                'borderTop': f'2px solid {PRIMARY_COLOR}'
-            },
-            {
-                'if': {'filter_query': '{Ganancia/Pérdida} contains "+"'},
-                'color': SUCCESS_COLOR
-            },
-            {
-                'if': {'filter_query': '{Ganancia/Pérdida} contains "-"'},
-                'color': DANGER_COLOR
-            }
-        ],
-        page_size=20,
-        id='fondos-datatable'
-    )
+    style_data_conditional = [
+        {
+            'if': {'row_index': len(table_data) - 1},
+            'backgroundColor': CARD_BG_LIGHTER,
+            'fontWeight': '700',
+            'borderTop': f'2px solid {PRIMARY_COLOR}'
+        },
+        *PROFIT_LOSS_STYLE
+    ]
+    
+    data = patch_rows(current_data, table_data)
+    if is_patch(data):
+        # Mismas filas en el navegador: solo viajan las celdas que cambian
+        return data, page_count, no_update, no_update, no_update
+    return table_data, page_count, style_data_conditional, {}, None
 
 @callback(
     [Output("modal-fondos", "is_open"),
@@ -233,7 +305,8 @@ def update_fondos_table(refresh_clicks, intervals, save_clicks, delete_clicks):
      Output("input-fondo-valor", "value"),
      Output("input-fondo-cantidad", "value"),
      Output("input-fondo-fecha", "value"),
-     Output("input-fondo-id", "children")],
+     Output("input-fondo-id", "children"),
+     Output("modal-fondos-error", "children")],
     [Input("btn-add-fondo", "n_clicks"),
      Input("btn-cancel-fondo", "n_clicks"),
      Input("btn-save-fondo", "n_clicks")],
@@ -250,29 +323,35 @@ def toggle_modal_fondos(add_clicks, cancel_clicks, save_clicks,
                         nombre, ticker, tipo, valor, cantidad, fecha, fondo_id, is_open):
     ctx = callback_context
     if not ctx.triggered:
-        return False, "", "", "", "RV", "", "", datetime.now().strftime('%Y-%m-%d'), ""
+        return False, "", "", "", "RV", "", "", datetime.now().strftime('%Y-%m-%d'), "", None
     
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
     
     if button_id == "btn-add-fondo":
-        return True, "Añadir Nuevo Fondo", "", "", "RV", "", "", datetime.now().strftime('%Y-%m-%d'), ""
+        return True, "Añadir Nuevo Fondo", "", "", "RV", "", "", datetime.now().strftime('%Y-%m-%d'), "", None
     
     if button_id == "btn-save-fondo":
         if all([nombre, ticker, tipo, valor, cantidad, fecha]):
-            if fondo_id:
-                db.update_fondo(int(fondo_id), nombre, ticker, tipo, float(valor), float(cantidad), fecha)
-            else:
-                db.add_fondo(nombre, ticker, tipo, float(valor), float(cantidad), fecha)
-            return False, "", "", "", "RV", "", "", datetime.now().strftime('%Y-%m-%d'), ""
+            try:
+                if fondo_id:
+                    db.update_fondo(int(fondo_id), nombre, ticker, tipo, float(valor), float(cantidad), fecha)
+                else:
+                    db.add_fondo(nombre, ticker, tipo, float(valor), float(cantidad), fecha)
+            except ValueError as e:
+                # El modal sigue abierto con los datos para corregirlos
+                return (True, no_update, no_update, no_update, no_update, no_update, no_update, no_update,
+                        no_update, dbc.Alert(str(e), color="danger"))
+            return False, "", "", "", "RV", "", "", datetime.now().strftime('%Y-%m-%d'), "", None
     
     if button_id == "btn-cancel-fondo":
-        return False, "", "", "", "RV", "", "", datetime.now().strftime('%Y-%m-%d'), ""
+        return False, "", "", "", "RV", "", "", datetime.now().strftime('%Y-%m-%d'), "", None
     
-    return is_open, "Añadir Nuevo Fondo", "", "", "RV", "", "", datetime.now().strftime('%Y-%m-%d'), ""
+    return is_open, "Añadir Nuevo Fondo", "", "", "RV", "", "", datetime.now().strftime('%Y-%m-%d'), "", None
 
 @callback(
     [Output("modal-delete-fondo", "is_open"),
-     Output("fondo-to-delete", "children")],
+     Output("fondo-to-delete", "children"),
+     Output("modal-delete-fondo-error", "children")],
     [Input("btn-confirm-delete-fondo", "n_clicks"),
      Input("btn-cancel-delete-fondo", "n_clicks")],
     [State("fondo-to-delete", "children"),
@@ -281,15 +360,51 @@ def toggle_modal_fondos(add_clicks, cancel_clicks, save_clicks,
 def toggle_delete_modal(confirm_clicks, cancel_clicks, fondo_id, is_open):
     ctx = callback_context
     if not ctx.triggered:
-        return False, ""
+        return False, "", None
     
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
     
     if button_id == "btn-confirm-delete-fondo" and fondo_id:
-        db.delete_fondo(int(fondo_id))
-        return False, ""
+        try:
+            db.delete_fondo(int(fondo_id))
+        except ValueError as e:
+            return True, fondo_id, dbc.Alert(str(e), color="danger")
+        return False, "", None
     
     if button_id == "btn-cancel-delete-fondo":
-        return False, ""
+        return False, "", None
+    
+    return is_open, fondo_id, None
+
+@callback(
+    Output("import-fondos-result", "children"),
+    Input("upload-fondos", "contents"),
+    State("upload-fondos", "filename"),
+    prevent_initial_call=True
+)
+def import_fondos(contents, filename):
+    if not contents:
+        return None
+    try:
+        records = parse_upload(contents, filename)
+    except Exception as e:
+        return dbc.Alert(f"No se pudo leer {filename}: {e}", color="danger", dismissable=True)
+    
+    rows, errors = validate_rows('fondos', records)
+    # Las filas con id actualizan posiciones existentes; el resto se insertan en lotes
+    nuevas = [row for row in rows if 'id' not in row]
+    existentes = [row for row in rows if 'id' in row]
+    guardadas = len(db.insert_many('fondos', nuevas)) if nuevas else 0
+    if existentes:
+        # Las que dejarían ventas sin cubrir en el libro se rechazan
+        actualizadas, rechazadas = db.upsert_lots('fondos', existentes)
+        guardadas += len(actualizadas)
+        errors = errors + rechazadas
     
-    return is_open, fondo_id
+    color = "success" if not errors and guardadas == len(rows) else "warning"
+    return dbc.Alert([
+        html.P(f"{guardadas} de {len(records)} filas importadas desde {filename}.",
+               className="mb-0"),
+        *[html.Small(error, className="d-block") for error in errors[:20]],
+        html.Small(f"... y {len(errors) - 20} errores más", className="d-block") if len(errors) > 20 else None
+    ], color=color, dismissable=True)
@@ -1,12 +1,16 @@
 from dash import html, dcc, Input, Output, callback
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-from utils.database import Database
+from utils.async_database import AsyncDatabase
 from utils.market_data import MarketData
+from utils.async_market_data import AsyncMarketData
+from utils import aio
+from utils.portfolio import build_portfolio, group_values, POSICIONES_COLUMNS
+from utils.ticker_metadata import get_ticker_metadata
 from utils.styles import *
 
-db = Database()
-market = MarketData()
+adb = AsyncDatabase()
 
 def layout():
     return html.Div([
@@ -54,40 +58,59 @@ def layout():
                     ])
                 ], style=CARD_STYLE)
             ], width=12)
-        ]),
-        
-        dcc.Interval(id='interval-graph-acciones', interval=120000, n_intervals=0)
+        ])
     ])
 
+async def load_acciones_snapshot(budget):
+    """Posiciones abiertas (una por ticker) y cotizaciones dentro de ``budget`` (None si Supabase no responde)"""
+    acciones = await budget.wait(adb.get_posiciones('acciones'))
+    if acciones is None:
+        return None
+    quotes = await budget.wait(AsyncMarketData.get_quotes([accion['ticker'] for accion in acciones]))
+    if quotes is None:
+        quotes = [MarketData._quote_from_closes(None, None)] * len(acciones)
+    return build_portfolio(acciones, quotes, POSICIONES_COLUMNS)
+
+def get_acciones_snapshot():
+    """Carga las acciones y sus precios una sola vez para todas las gráficas"""
+    return aio.run(load_acciones_snapshot(aio.Budget()))
+
+def empty_figure():
+    """Figura vacía con el aviso de que no hay datos"""
+    fig = go.Figure()
+    fig.add_annotation(
+        text="No hay datos de acciones para mostrar",
+        xref="paper", yref="paper",
+        x=0.5, y=0.5, showarrow=False,
+        font=dict(size=16, color="#aaa")
+    )
+    fig.update_layout(**CHART_LAYOUT, height=400)
+    return fig
+
 @callback(
-    Output('graph-acciones-distribution', 'figure'),
-    Input('interval-graph-acciones', 'n_intervals')
+    [Output('graph-acciones-distribution', 'figure'),
+     Output('graph-acciones-sector', 'figure'),
+     Output('graph-acciones-performance', 'figure')],
+    Input('quote-version', 'data')
 )
-def update_acciones_distribution(n):
-    acciones = db.get_acciones()
+def update_acciones_graphs(quote_version):
+    acciones = get_acciones_snapshot()
+    if acciones is None:
+        raise PreventUpdate
     
-    if not acciones:
-        fig = go.Figure()
-        fig.add_annotation(
-            text="No hay datos de acciones para mostrar",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5, showarrow=False,
-            font=dict(size=16, color="#aaa")
-        )
-        fig.update_layout(**CHART_LAYOUT, height=400)
-        return fig
+    if acciones.empty:
+        return empty_figure(), empty_figure(), empty_figure()
     
-    labels = []
-    values = []
+    return (build_distribution_figure(acciones),
+            build_sector_figure(fill_missing_sectors(acciones)),
+            build_performance_figure(acciones))
+
+def build_distribution_figure(acciones):
+    labels = (acciones['nombre'] + " (" + acciones['ticker'] + ")").tolist()
+    values = acciones['valor_actual'].tolist()
     colors = ['#00d4ff', '#6c63ff', '#00e676', '#ff1744', '#ffc107', 
               '#e91e63', '#9c27b0', '#3f51b5', '#009688', '#ff5722']
     
-    for i, accion in enumerate(acciones):
-        current_price = market.get_current_price(accion['ticker'])
-        valor_actual = current_price * accion['num_acciones'] if current_price else 0
-        labels.append(f"{accion['nombre']} ({accion['ticker']})")
-        values.append(valor_actual)
-    
     fig = go.Figure(data=[go.Pie(
         labels=labels,
         values=values,
@@ -96,19 +119,19 @@ def update_acciones_distribution(n):
                    line=dict(color=CARD_BG, width=3)),
         textinfo='label+percent',
         textfont=dict(size=12, color='#fff'),
-        hovertemplate='<b>%{label}</b><br>Valor: €%{value:,.2f}<br>Porcentaje: %{percent}<extra></extra>'
+        hovertemplate=f'<b>%{{label}}</b><br>Valor: {CURRENCY_SYMBOL}%{{value:,.2f}}<br>Porcentaje: %{{percent}}<extra></extra>'
     )])
     
     total = sum(values)
     fig.add_annotation(
-        text=f"<b>Total</b><br>€{total:,.0f}",
+        text=f"<b>Total</b><br>{CURRENCY_SYMBOL}{total:,.0f}",
         x=0.5, y=0.5,
         font=dict(size=16, color=PRIMARY_COLOR),
         showarrow=False
     )
     
+    fig.update_layout(**CHART_LAYOUT)
     fig.update_layout(
-        **CHART_LAYOUT,
         height=450,
         showlegend=True,
         legend=dict(
@@ -122,38 +145,23 @@ def update_acciones_distribution(n):
     
     return fig
 
-@callback(
-    Output('graph-acciones-sector', 'figure'),
-    Input('interval-graph-acciones', 'n_intervals')
-)
-def update_acciones_sector(n):
-    acciones = db.get_acciones()
-    
-    if not acciones:
-        fig = go.Figure()
-        fig.add_annotation(
-            text="No hay datos de acciones para mostrar",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5, showarrow=False,
-            font=dict(size=16, color="#aaa")
-        )
-        fig.update_layout(**CHART_LAYOUT, height=400)
-        return fig
-    
-    sectores = {}
-    
-    for accion in acciones:
-        current_price = market.get_current_price(accion['ticker'])
-        valor_actual = current_price * accion['num_acciones'] if current_price else 0
-        sector = accion.get('sector', 'Sin Clasificar')
-        
-        if sector in sectores:
-            sectores[sector] += valor_actual
-        else:
-            sectores[sector] = valor_actual
+def fill_missing_sectors(acciones):
+    """Clasifica las acciones guardadas sin sector con la caché de metadatos (sin esperar a la red)"""
+    missing = acciones['sector'].isna() | acciones['sector'].isin(['', 'N/A'])
+    if not missing.any():
+        return acciones
+    metadata = get_ticker_metadata().cached(acciones.loc[missing, 'ticker'])
+    acciones = acciones.copy()
+    acciones.loc[missing, 'sector'] = (acciones.loc[missing, 'ticker'].str.upper()
+                                       .map(lambda ticker: metadata.get(ticker, {}).get('sector'))
+                                       .fillna('N/A'))
+    return acciones
+
+def build_sector_figure(acciones):
+    sectores = group_values(acciones, 'sector')
     
-    labels = list(sectores.keys())
-    values = list(sectores.values())
+    labels = sectores.index.tolist()
+    values = sectores.tolist()
     
     colors = ['#00d4ff', '#6c63ff', '#00e676', '#ff1744', '#ffc107', 
               '#e91e63', '#9c27b0', '#3f51b5']
@@ -165,20 +173,20 @@ def update_acciones_sector(n):
         marker=dict(colors=colors[:len(labels)],
                    line=dict(color=CARD_BG, width=3)),
         textinfo='label+percent',
-        textfont=dict(size=13, color='#fff', weight='bold'),
-        hovertemplate='<b>%{label}</b><br>Valor: €%{value:,.2f}<br>Porcentaje: %{percent}<extra></extra>'
+        textfont=dict(size=13, color='#fff'),
+        hovertemplate=f'<b>%{{label}}</b><br>Valor: {CURRENCY_SYMBOL}%{{value:,.2f}}<br>Porcentaje: %{{percent}}<extra></extra>'
     )])
     
     total = sum(values)
     fig.add_annotation(
-        text=f"<b>Total</b><br>€{total:,.0f}",
+        text=f"<b>Total</b><br>{CURRENCY_SYMBOL}{total:,.0f}",
         x=0.5, y=0.5,
         font=dict(size=16, color=PRIMARY_COLOR),
         showarrow=False
     )
     
+    fig.update_layout(**CHART_LAYOUT)
     fig.update_layout(
-        **CHART_LAYOUT,
         height=450,
         showlegend=True,
         legend=dict(
@@ -192,38 +200,11 @@ def update_acciones_sector(n):
     
     return fig
 
-@callback(
-    Output('graph-acciones-performance', 'figure'),
-    Input('interval-graph-acciones', 'n_intervals')
-)
-def update_acciones_performance(n):
-    acciones = db.get_acciones()
-    
-    if not acciones:
-        fig = go.Figure()
-        fig.add_annotation(
-            text="No hay datos de acciones para mostrar",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5, showarrow=False,
-            font=dict(size=16, color="#aaa")
-        )
-        fig.update_layout(**CHART_LAYOUT, height=400)
-        return fig
-    
-    nombres = []
-    rendimientos = []
-    colors_bar = []
-    
-    for accion in acciones:
-        current_price = market.get_current_price(accion['ticker'])
-        if current_price:
-            valor_actual = current_price * accion['num_acciones']
-            invertido = accion['precio_compra'] * accion['num_acciones']
-            rendimiento_pct = ((valor_actual - invertido) / invertido * 100) if invertido > 0 else 0
-            
-            nombres.append(f"{accion['ticker']}")
-            rendimientos.append(rendimiento_pct)
-            colors_bar.append(SUCCESS_COLOR if rendimiento_pct >= 0 else DANGER_COLOR)
+def build_performance_figure(acciones):
+    con_precio = acciones[acciones['precio_actual'].fillna(0) != 0]
+    nombres = con_precio['ticker'].tolist()
+    rendimientos = con_precio['ganancia_pct'].tolist()
+    colors_bar = [SUCCESS_COLOR if r >= 0 else DANGER_COLOR for r in rendimientos]
     
     fig = go.Figure(data=[go.Bar(
         x=nombres,
@@ -236,8 +217,8 @@ def update_acciones_performance(n):
         hovertemplate='<b>%{x}</b><br>Rendimiento: %{y:.2f}%<extra></extra>'
     )])
     
+    fig.update_layout(**CHART_LAYOUT)
     fig.update_layout(
-        **CHART_LAYOUT,
         height=450,
         xaxis=dict(
             title='Acción (Ticker)',
@@ -1,12 +1,15 @@
 from dash import html, dcc, Input, Output, callback
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-from utils.database import Database
+from utils.async_database import AsyncDatabase
 from utils.market_data import MarketData
+from utils.async_market_data import AsyncMarketData
+from utils import aio
+from utils.portfolio import build_portfolio, POSICIONES_COLUMNS
 from utils.styles import *
 
-db = Database()
-market = MarketData()
+adb = AsyncDatabase()
 
 def layout():
     return html.Div([
@@ -54,40 +57,59 @@ def layout():
                     ])
                 ], style=CARD_STYLE)
             ], width=12)
-        ]),
-        
-        dcc.Interval(id='interval-graph-fondos', interval=120000, n_intervals=0)
+        ])
     ])
 
+async def load_fondos_snapshot(budget):
+    """Posiciones abiertas (una por ticker) y cotizaciones dentro de ``budget`` (None si Supabase no responde)"""
+    fondos = await budget.wait(adb.get_posiciones('fondos'))
+    if fondos is None:
+        return None
+    quotes = await budget.wait(AsyncMarketData.get_quotes([fondo['ticker'] for fondo in fondos]))
+    if quotes is None:
+        quotes = [MarketData._quote_from_closes(None, None)] * len(fondos)
+    return build_portfolio(fondos, quotes, POSICIONES_COLUMNS)
+
+def get_fondos_snapshot():
+    """Carga los fondos y sus precios una sola vez para todas las gráficas"""
+    return aio.run(load_fondos_snapshot(aio.Budget()))
+
+def empty_figure():
+    """Figura vacía con el aviso de que no hay datos"""
+    fig = go.Figure()
+    fig.add_annotation(
+        text="No hay datos de fondos para mostrar",
+        xref="paper", yref="paper",
+        x=0.5, y=0.5, showarrow=False,
+        font=dict(size=16, color="#aaa")
+    )
+    fig.update_layout(**CHART_LAYOUT, height=400)
+    return fig
+
 @callback(
-    Output('graph-fondos-distribution', 'figure'),
-    Input('interval-graph-fondos', 'n_intervals')
+    [Output('graph-fondos-distribution', 'figure'),
+     Output('graph-fondos-tipo', 'figure'),
+     Output('graph-fondos-performance', 'figure')],
+    Input('quote-version', 'data')
 )
-def update_fondos_distribution(n):
-    fondos = db.get_fondos()
+def update_fondos_graphs(quote_version):
+    fondos = get_fondos_snapshot()
+    if fondos is None:
+        raise PreventUpdate
     
-    if not fondos:
-        fig = go.Figure()
-        fig.add_annotation(
-            text="No hay datos de fondos para mostrar",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5, showarrow=False,
-            font=dict(size=16, color="#aaa")
-        )
-        fig.update_layout(**CHART_LAYOUT, height=400)
-        return fig
+    if fondos.empty:
+        return empty_figure(), empty_figure(), empty_figure()
     
-    labels = []
-    values = []
+    return (build_distribution_figure(fondos),
+            build_tipo_figure(fondos),
+            build_performance_figure(fondos))
+
+def build_distribution_figure(fondos):
+    labels = fondos['nombre'].tolist()
+    values = fondos['valor_actual'].tolist()
     colors = ['#00d4ff', '#6c63ff', '#00e676', '#ff1744', '#ffc107', 
               '#e91e63', '#9c27b0', '#3f51b5', '#009688', '#ff5722']
     
-    for i, fondo in enumerate(fondos):
-        current_price = market.get_current_price(fondo['ticker'])
-        valor_actual = current_price * fondo['cantidad'] if current_price else 0
-        labels.append(fondo['nombre'])
-        values.append(valor_actual)
-    
     fig = go.Figure(data=[go.Pie(
         labels=labels,
         values=values,
@@ -96,19 +118,19 @@ def update_fondos_distribution(n):
                    line=dict(color=CARD_BG, width=3)),
         textinfo='label+percent',
         textfont=dict(size=12, color='#fff'),
-        hovertemplate='<b>%{label}</b><br>Valor: €%{value:,.2f}<br>Porcentaje: %{percent}<extra></extra>'
+        hovertemplate=f'<b>%{{label}}</b><br>Valor: {CURRENCY_SYMBOL}%{{value:,.2f}}<br>Porcentaje: %{{percent}}<extra></extra>'
     )])
     
     total = sum(values)
     fig.add_annotation(
-        text=f"<b>Total</b><br>€{total:,.0f}",
+        text=f"<b>Total</b><br>{CURRENCY_SYMBOL}{total:,.0f}",
         x=0.5, y=0.5,
         font=dict(size=16, color=PRIMARY_COLOR),
         showarrow=False
     )
     
+    fig.update_layout(**CHART_LAYOUT)
     fig.update_layout(
-        **CHART_LAYOUT,
         height=450,
         showlegend=True,
         legend=dict(
@@ -122,35 +144,10 @@ def update_fondos_distribution(n):
     
     return fig
 
-@callback(
-    Output('graph-fondos-tipo', 'figure'),
-    Input('interval-graph-fondos', 'n_intervals')
-)
-def update_fondos_tipo(n):
-    fondos = db.get_fondos()
-    
-    if not fondos:
-        fig = go.Figure()
-        fig.add_annotation(
-            text="No hay datos de fondos para mostrar",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5, showarrow=False,
-            font=dict(size=16, color="#aaa")
-        )
-        fig.update_layout(**CHART_LAYOUT, height=400)
-        return fig
-    
-    rf_total = 0
-    rv_total = 0
-    
-    for fondo in fondos:
-        current_price = market.get_current_price(fondo['ticker'])
-        valor_actual = current_price * fondo['cantidad'] if current_price else 0
-        
-        if fondo['tipo'] == 'RF':
-            rf_total += valor_actual
-        else:
-            rv_total += valor_actual
+def build_tipo_figure(fondos):
+    es_rf = fondos['tipo'] == 'RF'
+    rf_total = float(fondos.loc[es_rf, 'valor_actual'].sum())
+    rv_total = float(fondos.loc[~es_rf, 'valor_actual'].sum())
     
     fig = go.Figure(data=[go.Pie(
         labels=['Renta Fija', 'Renta Variable'],
@@ -159,20 +156,20 @@ def update_fondos_tipo(n):
         marker=dict(colors=[PRIMARY_COLOR, SECONDARY_COLOR],
                    line=dict(color=CARD_BG, width=3)),
         textinfo='label+percent',
-        textfont=dict(size=14, color='#fff', weight='bold'),
-        hovertemplate='<b>%{label}</b><br>Valor: €%{value:,.2f}<br>Porcentaje: %{percent}<extra></extra>'
+        textfont=dict(size=14, color='#fff'),
+        hovertemplate=f'<b>%{{label}}</b><br>Valor: {CURRENCY_SYMBOL}%{{value:,.2f}}<br>Porcentaje: %{{percent}}<extra></extra>'
     )])
     
     total = rf_total + rv_total
     fig.add_annotation(
-        text=f"<b>Total</b><br>€{total:,.0f}",
+        text=f"<b>Total</b><br>{CURRENCY_SYMBOL}{total:,.0f}",
         x=0.5, y=0.5,
         font=dict(size=16, color=PRIMARY_COLOR),
         showarrow=False
     )
     
+    fig.update_layout(**CHART_LAYOUT)
     fig.update_layout(
-        **CHART_LAYOUT,
         height=450,
         showlegend=True,
         legend=dict(
@@ -186,38 +183,11 @@ def update_fondos_tipo(n):
     
     return fig
 
-@callback(
-    Output('graph-fondos-performance', 'figure'),
-    Input('interval-graph-fondos', 'n_intervals')
-)
-def update_fondos_performance(n):
-    fondos = db.get_fondos()
-    
-    if not fondos:
-        fig = go.Figure()
-        fig.add_annotation(
-            text="No hay datos de fondos para mostrar",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5, showarrow=False,
-            font=dict(size=16, color="#aaa")
-        )
-        fig.update_layout(**CHART_LAYOUT, height=400)
-        return fig
-    
-    nombres = []
-    rendimientos = []
-    colors_bar = []
-    
-    for fondo in fondos:
-        current_price = market.get_current_price(fondo['ticker'])
-        if current_price:
-            valor_actual = current_price * fondo['cantidad']
-            invertido = fondo['valor_compra'] * fondo['cantidad']
-            rendimiento_pct = ((valor_actual - invertido) / invertido * 100) if invertido > 0 else 0
-            
-            nombres.append(fondo['nombre'][:25])
-            rendimientos.append(rendimiento_pct)
-            colors_bar.append(SUCCESS_COLOR if rendimiento_pct >= 0 else DANGER_COLOR)
+def build_performance_figure(fondos):
+    con_precio = fondos[fondos['precio_actual'].fillna(0) != 0]
+    nombres = con_precio['nombre'].str[:25].tolist()
+    rendimientos = con_precio['ganancia_pct'].tolist()
+    colors_bar = [SUCCESS_COLOR if r >= 0 else DANGER_COLOR for r in rendimientos]
     
     fig = go.Figure(data=[go.Bar(
         x=nombres,
@@ -230,8 +200,8 @@ def update_fondos_performance(n):
         hovertemplate='<b>%{x}</b><br>Rendimiento: %{y:.2f}%<extra></extra>'
     )])
     
+    fig.update_layout(**CHART_LAYOUT)
     fig.update_layout(
-        **CHART_LAYOUT,
         height=450,
         xaxis=dict(
             title='Fondo',
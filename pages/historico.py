@@ -0,0 +1,166 @@
+import asyncio
+import os
+from dash import html, dcc, Input, Output, callback
+from dash.exceptions import PreventUpdate
+import dash_bootstrap_components as dbc
+import plotly.graph_objects as go
+import pandas as pd
+from utils.async_database import AsyncDatabase
+from utils.async_market_data import AsyncMarketData
+from utils.cache import TTLCache, MISSING
+from utils.metrics import registry
+from utils import aio
+from utils.portfolio import value_history, FLUJOS_COLUMNS
+from utils.ledger import cost_flows, LEDGER_TABLES
+from utils.styles import *
+
+adb = AsyncDatabase()
+
+# Series ya calculadas por tabla; se recalculan al cambiar los movimientos o pasado
+# VALUE_HISTORY_TTL (s), que es cuando puede haber una barra nueva
+value_history_cache = TTLCache(ttl=float(os.environ.get("VALUE_HISTORY_TTL", 300)), max_entries=20)
+registry.register_cache('value_history', value_history_cache)
+
+def layout():
+    return html.Div([
+        html.Div([
+            html.H2([
+                html.I(className="fas fa-chart-line me-3"),
+                "Evolución de la Cartera"
+            ], style={"color": PRIMARY_COLOR, "fontWeight": "700"}),
+            html.P("Valor de mercado y capital invertido desde la primera compra",
+                  style={"color": "#aaa", "marginTop": "10px"})
+        ], style={"marginBottom": "30px"}),
+
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H5("Evolución de Fondos",
+                               className="text-center mb-4",
+                               style={"color": PRIMARY_COLOR, "fontWeight": "600"}),
+                        dcc.Graph(id='graph-historico-fondos', config=CHART_CONFIG)
+                    ])
+                ], style=CARD_STYLE)
+            ], width=12)
+        ], className="mb-4"),
+
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H5("Evolución de Acciones",
+                               className="text-center mb-4",
+                               style={"color": PRIMARY_COLOR, "fontWeight": "600"}),
+                        dcc.Graph(id='graph-historico-acciones', config=CHART_CONFIG)
+                    ])
+                ], style=CARD_STYLE)
+            ], width=12)
+        ])
+    ])
+
+def movements_key(tabla, movements):
+    """Clave de caché: cambia si cambia cualquier movimiento de la tabla"""
+    return (tabla, tuple(sorted(
+        (m['ticker'], str(m['fecha']), m['tipo'], float(m['cantidad']), float(m['precio']))
+        for m in movements
+    )))
+
+async def load_value_history(budget):
+    """Series de valor e invertido por tabla: {tabla: DataFrame} (None si Supabase no responde)
+
+    Sale del libro de movimientos: cada compra suma y cada venta resta su
+    cantidad y su coste FIFO desde su fecha.
+    """
+    movements = await budget.wait(adb.get_movimientos())
+    if movements is None:
+        return None
+    by_table = {tabla: [m for m in movements if m['tabla'] == tabla] for tabla in LEDGER_TABLES}
+
+    result = {}
+    for tabla, rows in by_table.items():
+        cached = value_history_cache.get(movements_key(tabla, rows))
+        if cached is not MISSING:
+            result[tabla] = cached
+    pending = [tabla for tabla in by_table if tabla not in result]
+    if not pending:
+        return result
+
+    # Una sola carga de cierres para las tablas que hay que recalcular
+    rows = [row for tabla in pending for row in by_table[tabla]]
+    tickers = sorted({row['ticker'] for row in rows})
+    dates = pd.to_datetime([row['fecha'] for row in rows], errors='coerce').dropna()
+    closes, synced = (await AsyncMarketData.get_base_history(tickers, dates.min(), budget)
+                      if tickers and not dates.empty else (pd.DataFrame(), True))
+
+    for tabla in pending:
+        flows = cost_flows(by_table[tabla])
+        series = await asyncio.to_thread(value_history, flows, closes, FLUJOS_COLUMNS)
+        # Con el histórico a medio sincronizar se muestra, pero no se guarda
+        if synced:
+            value_history_cache.set(movements_key(tabla, by_table[tabla]), series)
+        result[tabla] = series
+    return result
+
+def empty_figure(tabla):
+    """Figura vacía con el aviso de que no hay datos"""
+    fig = go.Figure()
+    fig.add_annotation(
+        text=f"No hay datos de {tabla} para mostrar",
+        xref="paper", yref="paper",
+        x=0.5, y=0.5, showarrow=False,
+        font=dict(size=16, color="#aaa")
+    )
+    fig.update_layout(**CHART_LAYOUT, height=400)
+    return fig
+
+@callback(
+    [Output('graph-historico-fondos', 'figure'),
+     Output('graph-historico-acciones', 'figure')],
+    Input('quote-version', 'data')
+)
+def update_historico_graphs(quote_version):
+    series = aio.run(load_value_history(aio.Budget()))
+    if series is None:
+        raise PreventUpdate
+
+    return tuple(
+        build_history_figure(series[tabla]) if not series[tabla].empty else empty_figure(tabla)
+        for tabla in ('fondos', 'acciones')
+    )
+
+def build_history_figure(history):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=history.index,
+        y=history['invertido'],
+        name='Invertido',
+        mode='lines',
+        line=dict(color=SECONDARY_COLOR, width=2, shape='hv'),
+        hovertemplate=f'Invertido: {CURRENCY_SYMBOL}%{{y:,.2f}}<extra></extra>'
+    ))
+    fig.add_trace(go.Scatter(
+        x=history.index,
+        y=history['valor'],
+        name='Valor',
+        mode='lines',
+        line=dict(color=PRIMARY_COLOR, width=2),
+        fill='tonexty',
+        fillcolor='rgba(0,212,255,0.08)',
+        hovertemplate=f'Valor: {CURRENCY_SYMBOL}%{{y:,.2f}}<extra></extra>'
+    ))
+
+    fig.update_layout(**CHART_LAYOUT)
+    fig.update_layout(
+        height=450,
+        hovermode='x unified',
+        xaxis=dict(gridcolor='rgba(255,255,255,0.05)'),
+        yaxis=dict(
+            title=f'Importe ({CURRENCY_SYMBOL.strip()})',
+            gridcolor='rgba(255,255,255,0.05)'
+        ),
+        showlegend=True,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+
+    return fig
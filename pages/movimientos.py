@@ -0,0 +1,235 @@
+from dash import html, dash_table, Input, Output, State, callback, callback_context
+from dash.exceptions import PreventUpdate
+import dash_bootstrap_components as dbc
+from utils.database import Database
+from utils.async_database import AsyncDatabase
+from utils.market_data import MarketData
+from utils.async_market_data import AsyncMarketData
+from utils import aio
+from utils.portfolio import build_portfolio, POSICIONES_COLUMNS
+from utils.styles import *
+from datetime import datetime
+
+db = Database()
+adb = AsyncDatabase()
+
+TIPOS = {'compra': 'Compra', 'venta': 'Venta', 'dividendo': 'Dividendo'}
+TABLAS = {'fondos': 'Fondos', 'acciones': 'Acciones'}
+
+POSITION_COLUMNS = [
+    {'name': 'Tabla', 'id': 'Tabla'},
+    {'name': 'Nombre', 'id': 'Nombre'},
+    {'name': 'Ticker', 'id': 'Ticker'},
+    {'name': 'Cantidad', 'id': 'Cantidad', 'type': 'numeric', 'format': NUMBER_FORMAT},
+    {'name': 'Coste Medio', 'id': 'Coste Medio', 'type': 'numeric', 'format': MONEY_FORMAT},
+    {'name': 'Valor Actual', 'id': 'Valor Actual', 'type': 'numeric', 'format': MONEY_FORMAT},
+    {'name': 'Ganancia/Pérdida', 'id': 'Ganancia/Pérdida', 'type': 'numeric', 'format': SIGNED_MONEY_FORMAT},
+    {'name': 'Ganancia Realizada', 'id': 'Ganancia Realizada', 'type': 'numeric', 'format': SIGNED_MONEY_FORMAT},
+    {'name': 'Dividendos', 'id': 'Dividendos', 'type': 'numeric', 'format': MONEY_FORMAT}
+]
+
+MOVEMENT_COLUMNS = [
+    {'name': 'Fecha', 'id': 'Fecha', 'type': 'datetime'},
+    {'name': 'Tabla', 'id': 'Tabla'},
+    {'name': 'Ticker', 'id': 'Ticker'},
+    {'name': 'Tipo', 'id': 'Tipo'},
+    {'name': 'Cantidad', 'id': 'Cantidad', 'type': 'numeric', 'format': NUMBER_FORMAT},
+    {'name': 'Precio', 'id': 'Precio', 'type': 'numeric', 'format': MONEY_FORMAT},
+    {'name': 'Importe', 'id': 'Importe', 'type': 'numeric', 'format': MONEY_FORMAT},
+    {'name': 'Origen', 'id': 'Origen'}
+]
+
+def layout():
+    return html.Div([
+        html.Div([
+            html.H2([
+                html.I(className="fas fa-exchange-alt me-3"),
+                "Libro de Movimientos"
+            ], style={"color": PRIMARY_COLOR, "fontWeight": "700"}),
+            html.P("Compras, ventas y dividendos con las posiciones resultantes (lotes FIFO)",
+                  style={"color": "#aaa", "marginTop": "10px"})
+        ], style={"marginBottom": "30px"}),
+
+        dbc.Card([
+            dbc.CardBody([
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Label("Tabla", style={"fontWeight": "600"}),
+                        dbc.Select(id="input-mov-tabla",
+                                   options=[{"label": label, "value": value} for value, label in TABLAS.items()],
+                                   value="acciones", style=INPUT_STYLE)
+                    ], width=2),
+                    dbc.Col([
+                        dbc.Label("Ticker", style={"fontWeight": "600"}),
+                        dbc.Input(id="input-mov-ticker", type="text",
+                                 placeholder="Ej: AAPL", style=INPUT_STYLE)
+                    ], width=2),
+                    dbc.Col([
+                        dbc.Label("Tipo", style={"fontWeight": "600"}),
+                        dbc.Select(id="input-mov-tipo",
+                                   options=[{"label": label, "value": value} for value, label in TIPOS.items()],
+                                   value="venta", style=INPUT_STYLE)
+                    ], width=2),
+                    dbc.Col([
+                        dbc.Label("Cantidad", style={"fontWeight": "600"}),
+                        dbc.Input(id="input-mov-cantidad", type="number",
+                                 placeholder="10", style=INPUT_STYLE)
+                    ], width=2),
+                    dbc.Col([
+                        dbc.Label(f"Precio ({CURRENCY_SYMBOL.strip()})", style={"fontWeight": "600"}),
+                        dbc.Input(id="input-mov-precio", type="number",
+                                 placeholder="100.50", style=INPUT_STYLE)
+                    ], width=2),
+                    dbc.Col([
+                        dbc.Label("Fecha", style={"fontWeight": "600"}),
+                        dbc.Input(id="input-mov-fecha", type="date",
+                                 value=datetime.now().strftime('%Y-%m-%d'),
+                                 style=INPUT_STYLE)
+                    ], width=2),
+                ], className="mb-3"),
+                html.Small("En un dividendo, la cantidad son los títulos con derecho y el precio el importe por título.",
+                           style={"color": "#aaa"}),
+                html.Div([
+                    dbc.Button([
+                        html.I(className="fas fa-plus me-2"),
+                        "Registrar Movimiento"
+                    ], id="btn-add-movimiento", color="primary", className="me-2",
+                       style=BUTTON_PRIMARY),
+                    dbc.Button([
+                        html.I(className="fas fa-trash me-2"),
+                        "Eliminar Seleccionado"
+                    ], id="btn-delete-movimiento", style=BUTTON_DANGER)
+                ], style={"marginTop": "15px"})
+            ])
+        ], style=CARD_STYLE, className="mb-4"),
+
+        html.Div(id="movimiento-result"),
+
+        dbc.Card([
+            dbc.CardBody([
+                html.H5("Posiciones",
+                       className="text-center mb-4",
+                       style={"color": PRIMARY_COLOR, "fontWeight": "600"}),
+                dash_table.DataTable(
+                    id='posiciones-datatable',
+                    data=[],
+                    columns=POSITION_COLUMNS,
+                    style_table=TABLE_STYLE,
+                    style_header=TABLE_HEADER_STYLE,
+                    style_cell=TABLE_CELL_STYLE,
+                    style_data_conditional=PROFIT_LOSS_STYLE,
+                    sort_action='native',
+                    page_size=20
+                )
+            ])
+        ], style=CARD_STYLE, className="mb-4"),
+
+        dbc.Card([
+            dbc.CardBody([
+                html.H5("Movimientos",
+                       className="text-center mb-4",
+                       style={"color": PRIMARY_COLOR, "fontWeight": "600"}),
+                dash_table.DataTable(
+                    id='movimientos-datatable',
+                    data=[],
+                    columns=MOVEMENT_COLUMNS,
+                    style_table=TABLE_STYLE,
+                    style_header=TABLE_HEADER_STYLE,
+                    style_cell=TABLE_CELL_STYLE,
+                    row_selectable='single',
+                    selected_rows=[],
+                    sort_action='native',
+                    page_size=20
+                )
+            ])
+        ], style=CARD_STYLE)
+    ])
+
+async def load_ledger(budget):
+    """Posiciones abiertas valoradas y movimientos (None si Supabase no responde)"""
+    fondos, acciones, movimientos = await budget.gather(
+        adb.get_posiciones('fondos'), adb.get_posiciones('acciones'), adb.get_movimientos()
+    )
+    if fondos is None or acciones is None or movimientos is None:
+        return None
+    posiciones = fondos + acciones
+    quotes = await budget.wait(AsyncMarketData.get_quotes([p['ticker'] for p in posiciones]))
+    if quotes is None:
+        quotes = [MarketData._quote_from_closes(None, None)] * len(posiciones)
+    return build_portfolio(posiciones, quotes, POSICIONES_COLUMNS), movimientos
+
+@callback(
+    Output("movimiento-result", "children"),
+    [Input("btn-add-movimiento", "n_clicks"),
+     Input("btn-delete-movimiento", "n_clicks")],
+    [State("input-mov-tabla", "value"),
+     State("input-mov-ticker", "value"),
+     State("input-mov-tipo", "value"),
+     State("input-mov-cantidad", "value"),
+     State("input-mov-precio", "value"),
+     State("input-mov-fecha", "value"),
+     State("movimientos-datatable", "data"),
+     State("movimientos-datatable", "selected_rows")],
+    prevent_initial_call=True
+)
+def save_movimiento(add_clicks, delete_clicks, tabla, ticker, tipo, cantidad, precio, fecha,
+                    rows, selected_rows):
+    button_id = callback_context.triggered[0]['prop_id'].split('.')[0]
+    try:
+        if button_id == "btn-delete-movimiento":
+            if not selected_rows or not rows:
+                raise ValueError("Selecciona un movimiento de la tabla")
+            row = rows[selected_rows[0]]
+            if not db.delete_movimiento(row['id']):
+                return dbc.Alert("No se pudo eliminar el movimiento.", color="danger", dismissable=True)
+            return dbc.Alert(f"Eliminado: {row['Tipo']} de {row['Ticker']} del {row['Fecha']}.",
+                             color="success", dismissable=True)
+
+        if not all([tabla, ticker, tipo, cantidad, fecha]) or precio is None:
+            raise ValueError("Rellena todos los campos")
+        movimiento = db.add_movimiento(tabla, ticker, tipo, cantidad, precio, fecha)
+    except ValueError as e:
+        return dbc.Alert(str(e), color="danger", dismissable=True)
+    if movimiento is None:
+        return dbc.Alert("No se pudo guardar el movimiento.", color="danger", dismissable=True)
+    return dbc.Alert(f"Registrado: {TIPOS[tipo]} de {movimiento['cantidad']:g} {movimiento['ticker']}.",
+                     color="success", dismissable=True)
+
+@callback(
+    [Output("posiciones-datatable", "data"),
+     Output("movimientos-datatable", "data"),
+     Output("movimientos-datatable", "selected_rows")],
+    [Input("quote-version", "data"),
+     Input("movimiento-result", "children")]
+)
+def update_ledger_tables(quote_version, result):
+    ledger = aio.run(load_ledger(aio.Budget()))
+    if ledger is None:
+        raise PreventUpdate
+    cartera, movimientos = ledger
+
+    posiciones = [{
+        'Tabla': TABLAS[p['tabla']],
+        'Nombre': p['nombre'],
+        'Ticker': p['ticker'],
+        'Cantidad': p['cantidad'],
+        'Coste Medio': round(p['coste_medio'], 4),
+        'Valor Actual': round(p['valor_actual'], 2),
+        'Ganancia/Pérdida': round(p['ganancia'], 2),
+        'Ganancia Realizada': round(p['ganancia_realizada'], 2),
+        'Dividendos': round(p['dividendos'], 2)
+    } for p in cartera.to_dict('records')]
+
+    # Los más recientes primero
+    libro = [{
+        'id': m.get('id'),
+        'Fecha': m['fecha'],
+        'Tabla': TABLAS[m['tabla']],
+        'Ticker': m['ticker'],
+        'Tipo': TIPOS[m['tipo']],
+        'Cantidad': m['cantidad'],
+        'Precio': m['precio'],
+        'Importe': round(m['cantidad'] * m['precio'], 2),
+        'Origen': 'Lote' if m.get('lote_id') is not None else 'Manual'
+    } for m in reversed(movimientos)]
+    return posiciones, libro, []
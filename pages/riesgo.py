@@ -0,0 +1,173 @@
+import asyncio
+from datetime import timedelta
+from dash import html, dcc, dash_table, Input, Output, callback
+from dash.exceptions import PreventUpdate
+import dash_bootstrap_components as dbc
+import plotly.graph_objects as go
+import pandas as pd
+from utils.async_database import AsyncDatabase
+from utils.async_market_data import AsyncMarketData
+from utils.cache import TTLCache, MISSING
+from utils.metrics import registry
+from utils.providers import get_provider
+from utils import aio
+from utils.risk import (risk_metrics, correlation_matrix, portfolio_closes,
+                        RISK_BENCHMARK, RISK_LOOKBACK_DAYS)
+from utils.styles import *
+
+adb = AsyncDatabase()
+
+# Informe por cartera y sesión: el intervalo de cotizaciones no lo recalcula
+risk_cache = TTLCache(ttl=86400, max_entries=20)
+registry.register_cache('risk', risk_cache)
+
+RISK_TABLE_COLUMNS = [
+    {'name': 'Ticker', 'id': 'Ticker'},
+    {'name': 'Volatilidad', 'id': 'Volatilidad', 'type': 'numeric', 'format': PERCENT_FORMAT},
+    {'name': 'Máx. Caída', 'id': 'Máx. Caída', 'type': 'numeric', 'format': SIGNED_PERCENT_FORMAT},
+    {'name': 'Sharpe', 'id': 'Sharpe', 'type': 'numeric', 'format': NUMBER_FORMAT},
+    {'name': f'Beta ({RISK_BENCHMARK})', 'id': 'Beta', 'type': 'numeric', 'format': NUMBER_FORMAT},
+]
+
+def layout():
+    return html.Div([
+        html.Div([
+            html.H2([
+                html.I(className="fas fa-shield-alt me-3"),
+                "Análisis de Riesgo"
+            ], style={"color": PRIMARY_COLOR, "fontWeight": "700"}),
+            html.P(f"Volatilidad, caídas, Sharpe y beta frente a {RISK_BENCHMARK} "
+                   f"en los últimos {RISK_LOOKBACK_DAYS} días",
+                  style={"color": "#aaa", "marginTop": "10px"})
+        ], style={"marginBottom": "30px"}),
+
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H5("Métricas por Posición",
+                               className="text-center mb-4",
+                               style={"color": PRIMARY_COLOR, "fontWeight": "600"}),
+                        dash_table.DataTable(
+                            id='riesgo-datatable',
+                            data=[],
+                            columns=RISK_TABLE_COLUMNS,
+                            style_table=TABLE_STYLE,
+                            style_header=TABLE_HEADER_STYLE,
+                            style_cell=TABLE_CELL_STYLE,
+                            sort_action='native',
+                            page_size=20
+                        )
+                    ])
+                ], style=CARD_STYLE)
+            ], width=12)
+        ], className="mb-4"),
+
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H5("Correlación de Rentabilidades Diarias",
+                               className="text-center mb-4",
+                               style={"color": PRIMARY_COLOR, "fontWeight": "600"}),
+                        dcc.Graph(id='graph-riesgo-correlacion', config=CHART_CONFIG)
+                    ])
+                ], style=CARD_STYLE)
+            ], width=12)
+        ])
+    ])
+
+async def load_risk_report(budget):
+    """Métricas y matriz de correlación de la cartera (None si Supabase no responde)
+
+    Se calcula como mucho una vez por sesión y composición de la cartera.
+    """
+    fondos, acciones = await budget.gather(adb.get_posiciones('fondos'), adb.get_posiciones('acciones'))
+    if fondos is None or acciones is None:
+        return None
+
+    # Un mismo ticker puede estar en las dos tablas
+    quantities = {}
+    for row in fondos + acciones:
+        quantities[row['ticker']] = quantities.get(row['ticker'], 0.0) + float(row['cantidad'])
+
+    today = get_provider().today().date()
+    key = (tuple(sorted(quantities.items())), RISK_BENCHMARK, RISK_LOOKBACK_DAYS, today)
+    report = risk_cache.get(key)
+    if report is not MISSING:
+        return report
+    if not quantities:
+        return risk_metrics(pd.DataFrame()), pd.DataFrame()
+
+    tickers = sorted(quantities)
+    closes, synced = await AsyncMarketData.get_base_history(
+        sorted({*tickers, RISK_BENCHMARK}), today - timedelta(days=RISK_LOOKBACK_DAYS), budget
+    )
+    report = await asyncio.to_thread(build_risk_report, closes, tickers, quantities)
+    # Con el histórico a medio sincronizar se muestra, pero no se guarda
+    if synced:
+        risk_cache.set(key, report)
+    return report
+
+def build_risk_report(closes, tickers, quantities):
+    """Métricas por ticker (más la cartera entera) y correlación entre posiciones"""
+    holdings = closes.reindex(columns=tickers).dropna(axis=1, how='all')
+    benchmark = closes[RISK_BENCHMARK] if RISK_BENCHMARK in closes else None
+    with_portfolio = holdings.join(portfolio_closes(holdings, quantities)) if not holdings.empty else holdings
+    return risk_metrics(with_portfolio, benchmark), correlation_matrix(holdings)
+
+def empty_figure():
+    """Figura vacía con el aviso de que no hay datos"""
+    fig = go.Figure()
+    fig.add_annotation(
+        text="No hay datos suficientes para calcular correlaciones",
+        xref="paper", yref="paper",
+        x=0.5, y=0.5, showarrow=False,
+        font=dict(size=16, color="#aaa")
+    )
+    fig.update_layout(**CHART_LAYOUT, height=400)
+    return fig
+
+@callback(
+    [Output('riesgo-datatable', 'data'),
+     Output('graph-riesgo-correlacion', 'figure')],
+    Input('quote-version', 'data')
+)
+def update_riesgo(quote_version):
+    report = aio.run(load_risk_report(aio.Budget()))
+    if report is None:
+        raise PreventUpdate
+    metrics, correlation = report
+
+    # Porcentajes para la tabla; la fila de la cartera va la última
+    table = (metrics[['volatilidad', 'max_drawdown']] * 100).join(metrics[['sharpe', 'beta']])
+    table.columns = ['Volatilidad', 'Máx. Caída', 'Sharpe', 'Beta']
+    table = table.astype(object).where(table.notna(), None).rename_axis('Ticker').reset_index()
+    data = table.to_dict('records')
+
+    figure = build_correlation_figure(correlation) if len(correlation) > 1 else empty_figure()
+    return data, figure
+
+def build_correlation_figure(correlation):
+    labels = correlation.columns.tolist()
+    fig = go.Figure(data=[go.Heatmap(
+        z=correlation.round(3).to_numpy(),
+        x=labels,
+        y=labels,
+        zmin=-1,
+        zmax=1,
+        colorscale=[[0, DANGER_COLOR], [0.5, CARD_BG], [1, PRIMARY_COLOR]],
+        colorbar=dict(outlinewidth=0),
+        hoverongaps=False,
+        hovertemplate='<b>%{y} / %{x}</b><br>Correlación: %{z:.2f}<extra></extra>'
+    )])
+
+    fig.update_layout(**CHART_LAYOUT)
+    fig.update_layout(
+        height=max(450, 14 * len(labels)),
+        xaxis=dict(tickangle=-45, showgrid=False),
+        yaxis=dict(autorange='reversed', showgrid=False),
+        showlegend=False
+    )
+
+    return fig
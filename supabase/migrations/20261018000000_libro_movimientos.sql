@@ -0,0 +1,40 @@
+-- Libro de movimientos y posiciones materializadas (mismo esquema que SCHEMA en
+-- utils/sqlite_client.py). Las compras de los lotes de fondos y acciones llevan
+-- su lote_id: hay una compra por (tabla, lote_id) y una posición por
+-- (tabla, ticker).
+
+create table if not exists public.movimientos (
+    id bigint generated by default as identity primary key,
+    tabla text not null,
+    ticker text not null,
+    tipo text not null,
+    cantidad double precision not null,
+    precio double precision not null,
+    fecha date not null,
+    lote_id bigint,
+    created_at timestamptz default now()
+);
+
+create table if not exists public.posiciones (
+    id bigint generated by default as identity primary key,
+    tabla text not null,
+    ticker text not null,
+    nombre text,
+    sector text,
+    tipo text,
+    cantidad double precision not null default 0,
+    coste_medio double precision not null default 0,
+    coste_total double precision not null default 0,
+    ganancia_realizada double precision not null default 0,
+    dividendos double precision not null default 0,
+    lotes text not null default '[]',
+    ultima_fecha date,
+    ultimo_movimiento bigint,
+    created_at timestamptz default now()
+);
+
+create unique index if not exists movimientos_tabla_lote_id_key
+    on public.movimientos (tabla, lote_id);
+
+create unique index if not exists posiciones_tabla_ticker_key
+    on public.posiciones (tabla, ticker);
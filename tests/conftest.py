@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import database, fx, history_store, market_data, providers, ticker_metadata
+from utils.sqlite_client import SQLiteClient, AsyncSQLiteClient
+
+# "Hoy" de los datos de mercado reproducidos en los tests
+REPLAY_TODAY = '2024-06-28'
+
+@pytest.fixture
+def sqlite_backend(tmp_path, monkeypatch):
+    """Almacenamiento SQLite vacío en un directorio temporal, con la caché y el libro sin estado"""
+    path = str(tmp_path / 'moneymoney.db')
+    client, async_client = SQLiteClient(path), AsyncSQLiteClient(path)
+    monkeypatch.setitem(database.DB_BACKENDS, 'sqlite', (lambda: client, lambda: async_client))
+    database.holdings_cache.clear()
+    database._ledger_synced.clear()
+    database._ledger_failed.clear()
+    yield client
+    database.holdings_cache.clear()
+    database._ledger_synced.clear()
+    database._ledger_failed.clear()
+
+@pytest.fixture
+def db(sqlite_backend):
+    return database.Database('sqlite')
+
+class Replay:
+    """Datos de mercado grabados en un directorio temporal para ``ReplayProvider``"""
+
+    def __init__(self, directory, provider):
+        self.directory = directory
+        self.provider = provider
+
+    def closes(self, ticker, closes, start='2024-01-01'):
+        """Graba un cierre por sesión (días laborables) desde ``start``"""
+        dates = pd.bdate_range(start, periods=len(closes))
+        frame = pd.DataFrame({'Open': closes, 'High': closes, 'Low': closes, 'Close': closes, 'Volume': 1000},
+                             index=pd.Index(dates, name='Date'))
+        frame.to_csv(os.path.join(self.directory, f"{ticker}.csv"))
+        self.provider._frames.pop(ticker, None)
+        return frame
+
+    def metadata(self, entries):
+        """Graba ``sectors.json`` ({ticker: sector o metadatos})"""
+        with open(os.path.join(self.directory, "sectors.json"), 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        self.provider._sectors = None
+
+@pytest.fixture
+def replay(tmp_path, monkeypatch):
+    """Proveedor de reproducción activo, con histórico, metadatos y cachés de mercado vacíos
+
+    El "hoy" del proveedor es ``REPLAY_TODAY``; nada sale a la red.
+    """
+    directory = tmp_path / 'replay'
+    directory.mkdir()
+    provider = providers.ReplayProvider(str(directory), as_of=REPLAY_TODAY)
+    monkeypatch.setattr(providers, '_provider', providers.TrackedProvider(provider))
+    store = history_store.HistoryStore(str(tmp_path / 'history.db'))
+    monkeypatch.setattr(history_store, '_store', store)
+    monkeypatch.setattr(history_store, '_closes_cache', None)
+    monkeypatch.setattr(ticker_metadata, '_metadata', ticker_metadata.TickerMetadata(store.path))
+    for cache in (market_data.quote_cache, fx.fx_cache):
+        cache.clear()
+    yield Replay(str(directory), provider)
+    for cache in (market_data.quote_cache, fx.fx_cache):
+        cache.clear()
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+import pytest
+
+from utils import aio
+
+async def value(result, delay=0.0):
+    await asyncio.sleep(delay)
+    return result
+
+async def failure():
+    raise RuntimeError("caída")
+
+def test_run_en_el_bucle_compartido():
+    loop = aio.get_event_loop()
+    assert aio.get_event_loop() is loop
+    assert aio.run(value(3)) == 3
+
+    async def current():
+        return asyncio.get_running_loop()
+    assert aio.run(current()) is loop
+    with pytest.raises(TimeoutError):
+        aio.run(value(1, delay=5), timeout=0.05)
+
+def test_gather_en_orden_con_fallos(capsys):
+    budget = aio.Budget(5)
+    assert aio.run(budget.gather(value('a', 0.02), failure(), value('c'), default='-')) == ['a', '-', 'c']
+    assert "Error en la carga asíncrona: caída" in capsys.readouterr().out
+    assert aio.run(budget.gather()) == []
+
+def test_plazo_comun_para_todas_las_esperas():
+    budget = aio.Budget(0.2)
+    started = time.monotonic()
+
+    async def callback():
+        first = await budget.wait(value('a', delay=1), default='tarde')
+        # El plazo ya se agotó: lo siguiente no espera
+        second = await budget.wait(value('b', delay=0.05), default='tarde')
+        return first, second
+    assert aio.run(callback()) == ('tarde', 'tarde')
+    assert time.monotonic() - started < 0.5
+    assert budget.remaining() == 0.0
+    assert aio.Budget().seconds == aio.CALLBACK_BUDGET
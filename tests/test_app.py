@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+# Sin refresco en segundo plano: los tests no llaman al proveedor de mercado
+os.environ.setdefault("QUOTE_REFRESHER", "0")
+
+import app as dashboard
+from utils import database
+
+@pytest.fixture
+def client(sqlite_backend, monkeypatch):
+    monkeypatch.setattr(database, 'DB_BACKEND', 'sqlite')
+    return dashboard.server.test_client()
+
+def test_todas_las_paginas_tienen_layout():
+    for path in ['/', '/fondos', '/acciones', '/graficas-fondos', '/graficas-acciones', '/historico',
+                 '/riesgo', '/movimientos']:
+        assert dashboard.display_page(path) is not None
+
+def test_index(client):
+    response = client.get('/')
+    assert response.status_code == 200
+    assert b'_dash-config' in response.data
+
+def test_export(client):
+    database.Database('sqlite').add_accion('Acme', 'acme', 'Tech', 10, 3, '2024-01-01')
+    response = client.get('/export/acciones.csv')
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == 'attachment; filename=acciones.csv'
+    lines = response.data.decode().splitlines()
+    assert lines[0] == 'id,nombre,ticker,sector,precio_compra,num_acciones,fecha_compra'
+    assert lines[1].startswith('1,Acme,ACME,Tech,10.0,3,2024-01-01')
+    assert client.get('/export/fondos.json').get_json() == []
+    assert client.get('/export/usuarios.csv').status_code == 404
+    assert client.get('/export/acciones.xml').status_code == 404
+
+def test_metrics(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    assert b'dash_callback_duration_seconds' in response.data
+
+def test_stream_sin_refresco_responde_204(client):
+    # EventSource no reconecta tras un 204: el navegador sigue con su intervalo
+    response = client.get('/stream/quotes')
+    assert response.status_code == 204
+    assert response.data == b''
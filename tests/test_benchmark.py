@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+BENCH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'bench_callbacks.py')
+
+def bench(*args, cwd):
+    """Ejecuta el benchmark en otro proceso (cambia el entorno y el proveedor al importarse)"""
+    return subprocess.run([sys.executable, BENCH, '--latency-ms', '0', '--cold-runs', '1', '--warm-runs', '2',
+                           *args], cwd=cwd, capture_output=True, text=True, timeout=120)
+
+def test_informe_y_comparacion(tmp_path):
+    result = bench('--sizes', '3', '--universe', '3', '--scenarios', 'acciones_table', 'fondos_graphs',
+                   '--output', 'antes.json', cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    report = json.loads((tmp_path / 'antes.json').read_text())
+    assert report['meta']['args']['sizes'] == [3]
+    assert [(r['size'], r['scenario']) for r in report['results']] == [(3, 'acciones_table'), (3, 'fondos_graphs')]
+
+    table = report['results'][0]
+    assert table['cold']['n'] == 1 and table['warm']['n'] == 2
+    assert table['cold']['provider_calls_per_run']['bulk_history'] == 1
+    # En caliente todo sale de las cachés y el navegador ya tiene las filas
+    assert table['warm']['provider_calls_per_run'] == {} and table['warm']['db_calls_per_run'] == {}
+    assert table['warm']['payload_bytes'] < table['cold']['payload_bytes']
+
+    result = bench('--sizes', '3', '--universe', '3', '--scenarios', 'acciones_table', '--output', 'despues.json',
+                   '--compare', 'antes.json', cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert 'Comparación con' in result.stderr
+    assert 'acciones_table' in result.stderr.split('Comparación con')[1]
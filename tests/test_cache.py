@@ -0,0 +1,72 @@
+import pytest
+
+from utils import cache
+from utils.cache import TTLCache, MISSING
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj controlado para ``time.monotonic`` dentro de ``utils.cache``"""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    return now
+
+def test_get_distingue_none_de_ausente():
+    c = TTLCache(ttl=None)
+    c.set('a', None)
+    assert c.get('a') is None
+    assert c.get('b') is MISSING
+    assert c.get('b', 0) == 0
+
+def test_caduca_al_pasar_el_ttl(clock):
+    c = TTLCache(ttl=10)
+    c.set('a', 1)
+    clock[0] += 9.9
+    assert c.get('a') == 1
+    clock[0] += 0.1
+    assert c.get('a') is MISSING
+    assert c.stats()['size'] == 0
+
+def test_ttl_por_entrada(clock):
+    c = TTLCache(ttl=10)
+    c.set('corto', 1, ttl=1)
+    c.set('eterno', 2)
+    c.ttl = None
+    c.set('sin_caducidad', 3)
+    clock[0] += 5
+    assert c.get('corto') is MISSING
+    assert c.get('eterno') == 2
+    clock[0] += 10 ** 6
+    assert c.get('sin_caducidad') == 3
+
+def test_expulsa_la_menos_usada():
+    c = TTLCache(ttl=None, max_entries=2)
+    c.set('a', 1)
+    c.set('b', 2)
+    assert c.get('a') == 1  # 'a' pasa a ser la más reciente
+    c.set('c', 3)
+    assert c.get('b') is MISSING
+    assert c.get('a') == 1 and c.get('c') == 3
+    assert c.stats()['evictions'] == 1
+
+def test_sobrescribir_no_expulsa():
+    c = TTLCache(ttl=None, max_entries=2)
+    c.set('a', 1)
+    c.set('b', 2)
+    c.set('a', 3)
+    assert c.get('a') == 3 and c.get('b') == 2
+    assert c.stats()['evictions'] == 0
+
+def test_delete_clear_y_contadores():
+    c = TTLCache(ttl=None)
+    c.set('a', 1)
+    c.get('a')
+    c.get('x')
+    c.delete('a')
+    c.delete('x')
+    assert c.get('a') is MISSING
+    c.set('b', 2)
+    c.clear()
+    stats = c.stats()
+    assert stats['size'] == 0
+    assert (stats['hits'], stats['misses']) == (1, 2)
+    assert stats['hit_ratio'] == pytest.approx(1 / 3)
@@ -0,0 +1,61 @@
+import pytest
+
+from utils.cache import MISSING
+from utils.database import holdings_cache
+from utils.sqlite_client import SQLiteQuery
+
+@pytest.fixture
+def reads(monkeypatch):
+    """Lecturas de la tabla de fondos que llegan al almacenamiento"""
+    sent = []
+    run = SQLiteQuery._run
+
+    def tracked(self):
+        if self.table == 'fondos' and self.action == 'select':
+            sent.append(self.params)
+        return run(self)
+    monkeypatch.setattr(SQLiteQuery, '_run', tracked)
+    return sent
+
+def tickers(db):
+    return [row['ticker'] for row in db.get_fondos()]
+
+def test_lectura_a_traves_de_la_cache(db, reads):
+    db.add_fondo('Fff', 'FFF', 'RF', 10.0, 2, '2024-01-01')
+    assert tickers(db) == ['FFF']
+    assert tickers(db) == ['FFF']
+    assert len(reads) == 1
+    # Las filas devueltas son copias: modificarlas no toca la caché
+    db.get_fondos()[0]['ticker'] = 'XXX'
+    assert tickers(db) == ['FFF']
+
+def test_las_escrituras_parchean_la_cache(db, reads):
+    first = db.add_fondo('Fff', 'FFF', 'RF', 10.0, 2, '2024-01-01')
+    tickers(db)
+    reads.clear()
+
+    second = db.add_fondo('Ggg', 'GGG', 'RV', 5.0, 1, '2024-02-01')
+    assert db.update_fondo(first['id'], 'Fff', 'FFF', 'RF', 11.0, 2, '2024-01-01')
+    assert [(r['ticker'], r['valor_compra']) for r in db.get_fondos()] == [('FFF', 11.0), ('GGG', 5.0)]
+    assert db.delete_fondo(second['id'])
+    assert tickers(db) == ['FFF']
+    # Ninguna lectura completa de la tabla (solo las del libro, filtradas por id)
+    assert all(params for params in reads)
+
+def test_cambios_externos_hasta_invalidar(db, sqlite_backend):
+    db.add_fondo('Fff', 'FFF', 'RF', 10.0, 2, '2024-01-01')
+    tickers(db)
+    sqlite_backend.table('fondos').insert({'nombre': 'Ext', 'ticker': 'EXT', 'tipo': 'RV', 'valor_compra': 1.0,
+                                           'cantidad': 1, 'fecha_compra': '2024-03-01'}).execute()
+    assert tickers(db) == ['FFF']
+    db.invalidate_cache('fondos')
+    assert tickers(db) == ['FFF', 'EXT']
+    db.invalidate_cache()
+    assert holdings_cache.get('fondos') is MISSING
+
+def test_escritura_fallida_descarta_la_tabla(db):
+    db.add_fondo('Fff', 'FFF', 'RF', 10.0, 2, '2024-01-01')
+    tickers(db)
+    assert db.update_fondo(999, 'Zzz', 'ZZZ', 'RF', 1.0, 1, '2024-01-01') is False
+    assert holdings_cache.get('fondos') is MISSING
+    assert tickers(db) == ['FFF']
@@ -0,0 +1,225 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import aio, database
+from utils.database import Database, holdings_cache
+from utils.async_database import AsyncDatabase
+
+def accion(ticker, num, precio=10.0, fecha='2024-01-01'):
+    return {'nombre': ticker, 'ticker': ticker, 'sector': 'Tech', 'precio_compra': precio,
+            'num_acciones': num, 'fecha_compra': fecha}
+
+def fondo(ticker, cantidad, valor=10.0, fecha='2024-01-01'):
+    return {'nombre': ticker, 'ticker': ticker, 'tipo': 'RV', 'valor_compra': valor,
+            'cantidad': cantidad, 'fecha_compra': fecha}
+
+def seed_lots(client, n=50):
+    """Lotes escritos sin pasar por ``Database`` (como si vinieran de antes del libro)"""
+    client.table('acciones').insert([accion(f"A{i % 5}", 1) for i in range(n)]).execute()
+    client.table('fondos').insert([fondo(f"F{i % 5}", 1.0) for i in range(n)]).execute()
+
+def rows(client, table):
+    return client.table(table).select('*').order('id').execute().data
+
+def positions(client, tabla):
+    return {p['ticker']: p for p in rows(client, 'posiciones') if p['tabla'] == tabla}
+
+def test_reconciliacion_inicial_lleva_los_lotes_al_libro(db, sqlite_backend):
+    seed_lots(sqlite_backend, 10)
+    assert {p['ticker']: p['cantidad'] for p in db.get_posiciones('acciones')} == {f"A{i}": 2 for i in range(5)}
+    assert len(db.get_movimientos()) == 20
+    assert all(m['lote_id'] is not None for m in rows(sqlite_backend, 'movimientos'))
+
+def test_reconciliar_de_nuevo_no_duplica(db, sqlite_backend):
+    seed_lots(sqlite_backend, 10)
+    db.sync_lots('acciones')
+    db.sync_lots('acciones')
+    database._ledger_synced.clear()
+    holdings_cache.clear()
+    db.get_posiciones('acciones')
+    assert len(rows(sqlite_backend, 'movimientos')) == 10
+    assert len(rows(sqlite_backend, 'posiciones')) == 5
+
+def test_reconciliaciones_simultaneas_en_hilos(sqlite_backend):
+    seed_lots(sqlite_backend)
+    barrier = threading.Barrier(8)
+
+    def read(i):
+        barrier.wait()
+        db = Database('sqlite')
+        return db.get_posiciones('acciones') if i % 2 else db.get_movimientos()
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(read, range(8)))
+    movements = rows(sqlite_backend, 'movimientos')
+    assert len(movements) == 100
+    assert len({(m['tabla'], m['lote_id']) for m in movements}) == 100
+    saved = rows(sqlite_backend, 'posiciones')
+    assert len(saved) == len({(p['tabla'], p['ticker']) for p in saved}) == 10
+
+def test_lecturas_asincronas_simultaneas(sqlite_backend):
+    seed_lots(sqlite_backend)
+    adb = AsyncDatabase('sqlite')
+
+    async def load():
+        return await aio.Budget().gather(adb.get_posiciones('fondos'), adb.get_posiciones('acciones'),
+                                         adb.get_movimientos())
+
+    fondos, acciones, movimientos = aio.run(load())
+    assert len(movimientos) == 100
+    assert sum(p['cantidad'] for p in fondos + acciones) == 100
+    assert len(rows(sqlite_backend, 'movimientos')) == 100
+    assert len(rows(sqlite_backend, 'posiciones')) == 10
+
+def test_la_reconciliacion_completa_repara_posiciones(db, sqlite_backend):
+    seed_lots(sqlite_backend, 10)
+    db.get_posiciones('acciones')
+    sqlite_backend.table('posiciones').update({'cantidad': 99.0}).eq('ticker', 'A0').execute()
+    sqlite_backend.table('posiciones').insert({'tabla': 'acciones', 'ticker': 'ZZZ', 'cantidad': 1.0}).execute()
+    database._ledger_synced.clear()
+    holdings_cache.clear()
+    assert {p['ticker']: p['cantidad'] for p in db.get_posiciones('acciones')} == {f"A{i}": 2 for i in range(5)}
+    assert set(positions(sqlite_backend, 'acciones')) == {f"A{i}" for i in range(5)}
+
+def test_alta_edicion_y_borrado_de_lotes(db, sqlite_backend):
+    first = db.add_accion(**accion('AAA', 10))
+    second = db.add_fondo(**fondo('FFF', 2.5))
+    assert db.update_accion(first['id'], **accion('AAA', 4, precio=12.0))
+    assert positions(sqlite_backend, 'acciones')['AAA']['coste_total'] == pytest.approx(48)
+    assert db.update_accion(first['id'], **accion('BBB', 4))
+    assert set(positions(sqlite_backend, 'acciones')) == {'BBB'}
+    assert db.delete_accion(first['id'])
+    assert positions(sqlite_backend, 'acciones') == {}
+    assert [m['ticker'] for m in rows(sqlite_backend, 'movimientos')] == ['FFF']
+    assert positions(sqlite_backend, 'fondos')['FFF']['cantidad'] == 2.5
+    assert db.delete_fondo(second['id'])
+    assert rows(sqlite_backend, 'movimientos') == []
+
+def test_no_se_borra_un_lote_con_ventas(db, sqlite_backend):
+    lot = db.add_accion(**accion('AAA', 10))
+    db.add_movimiento('acciones', 'AAA', 'venta', 8, 12, '2024-02-01')
+    before = rows(sqlite_backend, 'posiciones')
+    with pytest.raises(ValueError, match="No se pueden vender 8"):
+        db.delete_accion(lot['id'])
+    with pytest.raises(ValueError):
+        db.update_accion(lot['id'], **accion('AAA', 5))
+    # Una compra posterior a la venta tampoco la cubre
+    with pytest.raises(ValueError):
+        db.update_accion(lot['id'], **accion('AAA', 10, fecha='2024-03-01'))
+    with pytest.raises(ValueError):
+        aio.run(AsyncDatabase('sqlite').delete_accion(lot['id']))
+    assert [l['num_acciones'] for l in rows(sqlite_backend, 'acciones')] == [10]
+    assert len(rows(sqlite_backend, 'movimientos')) == 2
+    assert rows(sqlite_backend, 'posiciones') == before
+    # Reducirlo hasta lo vendido sí cuadra
+    assert db.update_accion(lot['id'], **accion('AAA', 8))
+    assert positions(sqlite_backend, 'acciones')['AAA']['cantidad'] == 0
+
+def test_movimientos_manuales(db, sqlite_backend):
+    lot = db.add_accion(**accion('AAA', 10, fecha='2024-02-01'))
+    with pytest.raises(ValueError):
+        db.add_movimiento('acciones', 'AAA', 'venta', 11, 12, '2024-03-01')
+    with pytest.raises(ValueError):
+        db.add_movimiento('acciones', 'AAA', 'venta', 1, 12, '2024-01-01')
+    assert len(rows(sqlite_backend, 'movimientos')) == 1
+
+    sale = db.add_movimiento('acciones', 'AAA', 'venta', 4, 15, '2024-03-01')
+    # Compra atrasada: se rehace la posición con todos los movimientos
+    db.add_movimiento('acciones', 'AAA', 'compra', 2, 5, '2024-01-01')
+    position = positions(sqlite_backend, 'acciones')['AAA']
+    assert position['cantidad'] == 8
+    assert position['ganancia_realizada'] == pytest.approx(4 * 15 - (2 * 5 + 2 * 10))
+
+    purchase = next(m for m in db.get_movimientos('acciones', 'AAA') if m['lote_id'] == lot['id'])
+    with pytest.raises(ValueError, match="lote"):
+        db.delete_movimiento(purchase['id'])
+    assert db.delete_movimiento(sale['id'])
+    assert positions(sqlite_backend, 'acciones')['AAA']['cantidad'] == 12
+    assert db.delete_movimiento(sale['id']) is False
+
+def test_las_escrituras_no_usan_la_cache(db, sqlite_backend):
+    db.add_accion(**accion('AAA', 10))
+    stale = {table: holdings_cache.get(table) for table in ('movimientos', 'posiciones')}
+    db.add_movimiento('acciones', 'AAA', 'venta', 4, 12, '2024-02-01')
+    # Otro proceso ya vendió 4: esta caché no lo sabe
+    for table, cached in stale.items():
+        holdings_cache.set(table, cached)
+    with pytest.raises(ValueError, match="solo hay 6"):
+        db.add_movimiento('acciones', 'AAA', 'venta', 7, 12, '2024-03-01')
+    db.add_movimiento('acciones', 'AAA', 'venta', 6, 12, '2024-03-01')
+    assert positions(sqlite_backend, 'acciones')['AAA']['cantidad'] == 0
+    assert len(rows(sqlite_backend, 'posiciones')) == 1
+
+def test_sin_libro_se_calcula_desde_los_lotes(db, sqlite_backend, monkeypatch, capsys):
+    seed_lots(sqlite_backend, 10)
+    calls = []
+
+    def fail(self, tabla, ids=None):
+        calls.append(tabla)
+        raise RuntimeError('relation "movimientos" does not exist')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Database, 'sync_lots', fail)
+        for _ in range(3):
+            assert {p['ticker']: p['cantidad'] for p in db.get_posiciones('acciones')} == {
+                f"A{i}": 2 for i in range(5)}
+            assert len(db.get_movimientos()) == 20
+    # Un solo intento (y un solo aviso) por tabla hasta LEDGER_RETRY
+    assert sorted(calls) == ['acciones', 'fondos']
+    assert capsys.readouterr().out.count('no disponible') == 2
+    assert rows(sqlite_backend, 'movimientos') == []
+
+    monkeypatch.setattr(database, 'LEDGER_RETRY', 0)
+    db.get_posiciones('acciones')
+    assert len(rows(sqlite_backend, 'movimientos')) == 10
+
+def test_un_movimiento_manual_reconcilia_antes_los_lotes(db, sqlite_backend):
+    seed_lots(sqlite_backend, 10)
+    # Primera escritura del proceso: sin reconciliar, la venta no tendría lotes que la cubrieran
+    sale = db.add_movimiento('acciones', 'A0', 'venta', 2, 12, '2024-02-01')
+    assert sale is not None
+    assert positions(sqlite_backend, 'acciones')['A0']['cantidad'] == 0
+    assert positions(sqlite_backend, 'acciones')['A1']['cantidad'] == 2
+
+def test_borrar_movimiento_sin_id_valido(db, sqlite_backend):
+    db.add_accion(**accion('AAA', 10))
+    for id in (None, 'None', '1', 1.5, True):
+        assert db.delete_movimiento(id) is False
+    assert len(rows(sqlite_backend, 'movimientos')) == 1
+
+def test_movimiento_sin_libro_disponible(db, sqlite_backend, monkeypatch, capsys):
+    db.add_accion(**accion('AAA', 10))
+    sale = db.add_movimiento('acciones', 'AAA', 'venta', 2, 12, '2024-02-01')
+    database._ledger_synced.clear()
+    monkeypatch.setattr(Database, 'sync_lots', lambda self, tabla, ids=None: 1 / 0)
+    assert db.add_movimiento('acciones', 'AAA', 'venta', 1, 12, '2024-03-01') is None
+    assert db.delete_movimiento(sale['id']) is False
+    assert len(rows(sqlite_backend, 'movimientos')) == 2
+    assert 'no disponible' in capsys.readouterr().out
+
+def test_importar_lotes_con_id_sobre_ventas(db, sqlite_backend):
+    lot = db.add_accion(**accion('AAA', 10))
+    other = db.add_accion(**accion('BBB', 5))
+    db.add_movimiento('acciones', 'AAA', 'venta', 8, 12, '2024-02-01')
+    before = rows(sqlite_backend, 'posiciones')
+    written, errors = db.upsert_lots('acciones', [{**accion('AAA', 5), 'id': lot['id']},
+                                                  {**accion('BBB', 7), 'id': other['id']}])
+    assert [row['id'] for row in written] == [other['id']]
+    assert len(errors) == 1 and errors[0].startswith(f"Lote {lot['id']}: El cambio del lote")
+    assert [l['num_acciones'] for l in rows(sqlite_backend, 'acciones')] == [10, 7]
+    assert positions(sqlite_backend, 'acciones')['AAA'] == next(p for p in before if p['ticker'] == 'AAA')
+    assert positions(sqlite_backend, 'acciones')['BBB']['cantidad'] == 7
+    # Cada lote se comprueba con los aceptados antes que él
+    second = db.add_accion(**accion('AAA', 4, fecha='2024-01-15'))
+    written, errors = db.upsert_lots('acciones', [{**accion('AAA', 4), 'id': lot['id']},
+                                                  {**accion('AAA', 3, fecha='2024-01-15'), 'id': second['id']}])
+    assert [row['id'] for row in written] == [lot['id']]
+    assert len(errors) == 1
+    assert positions(sqlite_backend, 'acciones')['AAA']['cantidad'] == 0
+    # insert_many con upsert pasa por la misma comprobación (también la asíncrona)
+    assert db.insert_many('acciones', [{**accion('AAA', 1), 'id': lot['id']}], upsert=True) == []
+    assert aio.run(AsyncDatabase('sqlite').insert_many(
+        'acciones', [{**accion('AAA', 1), 'id': second['id']}], upsert=True)) == []
+    assert [l['num_acciones'] for l in rows(sqlite_backend, 'acciones')] == [4, 7, 4]
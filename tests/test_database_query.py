@@ -0,0 +1,72 @@
+import pytest
+
+from utils import aio
+from utils.async_database import AsyncDatabase
+from utils.cache import MISSING
+from utils.database import holdings_cache
+
+def seed(client):
+    client.table('acciones').insert([
+        {'nombre': f"Empresa {t}", 'ticker': t, 'sector': s, 'precio_compra': p, 'num_acciones': n,
+         'fecha_compra': f}
+        for t, s, p, n, f in [('AAA', 'Tech', 10.0, 5, '2024-01-01'), ('BBB', 'Energía', 20.0, 1, '2024-02-01'),
+                              ('CCC', 'Tech', 5.0, 8, '2024-03-01'), ('DDD', 'Salud', 15.0, 2, '2024-04-01')]
+    ]).execute()
+
+@pytest.fixture
+def requests(sqlite_backend, monkeypatch):
+    """Peticiones enviadas al almacenamiento tras los datos de ``seed``
+
+    Cada una es ``(acción, columnas, valores de los filtros, orden, límite, desplazamiento)``.
+    """
+    seed(sqlite_backend)
+    sent = []
+    for cls in {type(sqlite_backend.table('acciones')), type(AsyncDatabase('sqlite').client.table('acciones'))}:
+        run = cls._run
+
+        def tracked(self, _run=run):
+            sent.append((self.action, self.columns, self.params, self.ordering, self.limit_rows, self.offset_rows))
+            return _run(self)
+        monkeypatch.setattr(cls, '_run', tracked)
+    return sent
+
+def test_la_pagina_se_resuelve_en_el_almacenamiento(db, sqlite_backend, requests):
+    rows = db.query('acciones', columns=['ticker', 'precio_compra'], filters=[('sector', 'eq', 'Tech')],
+                    order_by='precio_compra', descending=True, offset=1, limit=1)
+    assert rows == [{'ticker': 'CCC', 'precio_compra': 5.0}]
+    action, columns, params, ordering, limit, offset = requests[-1]
+    assert (action, columns, params, limit, offset) == ('select', ['ticker', 'precio_compra'], ['Tech'], 1, 1)
+    # Ni se lee ni se guarda la tabla completa
+    assert len(requests) == 1
+    assert holdings_cache.get('acciones') is MISSING
+
+def test_recuento_con_filtros(db, sqlite_backend, requests):
+    assert db.count('acciones', [('num_acciones', 'gte', 2), ('ticker', 'ilike', '%d%')]) == 1
+    assert requests[-1][1] == ['id'] and requests[-1][4] == 1
+    assert db.count_acciones([('sector', 'in', ['Tech', 'Salud'])]) == 3
+
+def test_tabla_completa_desde_la_cache(db, sqlite_backend, requests):
+    assert [r['ticker'] for r in db.query('acciones', columns=['ticker'], order_by='fecha_compra',
+                                          descending=True)] == ['DDD', 'CCC', 'BBB', 'AAA']
+    assert db.count('acciones') == 4
+    assert [r['ticker'] for r in db.get_acciones()] == ['AAA', 'BBB', 'CCC', 'DDD']
+    assert len(requests) == 1
+
+def test_exportacion_por_paginas(db, sqlite_backend, requests):
+    assert [r['ticker'] for r in db.iter_rows('acciones', columns=['ticker'], chunk_size=3)] == [
+        'AAA', 'BBB', 'CCC', 'DDD']
+    assert [(r[4], r[5]) for r in requests] == [(3, None), (3, 3)]
+
+def test_consultas_asincronas(sqlite_backend, requests):
+    adb = AsyncDatabase('sqlite')
+
+    async def load():
+        return await aio.Budget().gather(
+            adb.get_acciones(columns=['ticker'], filters=[('precio_compra', 'lt', 16.0)], order_by='ticker',
+                             descending=True, limit=2),
+            adb.count_acciones([('fecha_compra', 'gte', '2024-02-01')]))
+
+    page, total = aio.run(load())
+    assert page == [{'ticker': 'DDD'}, {'ticker': 'CCC'}]
+    assert total == 3
+    assert holdings_cache.get('acciones') is MISSING
@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+
+from utils import fx
+from utils.fx import (convert_closes, convert_quotes, currency_symbol, fx_pairs, get_rates,
+                      ticker_currencies)
+from utils.market_data import MarketData
+from utils.ticker_metadata import get_ticker_metadata
+
+def currency(ticker, code):
+    get_ticker_metadata().save(ticker, {'currency': code})
+
+def test_simbolos_y_pares():
+    assert currency_symbol('EUR') == '€'
+    assert currency_symbol('CHF') == 'CHF '
+    assert fx_pairs(['USD', 'GBp', 'GBP', 'EUR', None], base='EUR') == {
+        'USD': 'USDEUR=X', 'GBp': 'GBPEUR=X', 'GBP': 'GBPEUR=X'}
+
+def test_divisa_por_metadatos_o_por_sufijo(replay):
+    currency('AAPL', 'USD')
+    currency('SAN.MC', 'EUR')
+    assert ticker_currencies(['aapl', 'san.mc', 'VOD.L', 'BMW.DE', 'ZZZ']) == ['USD', 'EUR', 'GBp', 'EUR', None]
+
+def test_tipos_en_una_descarga_y_en_cache(replay, capsys):
+    replay.closes('USDEUR=X', [0.90, 0.92], start='2024-06-27')
+    replay.closes('GBPEUR=X', [1.17, 1.18], start='2024-06-27')
+    calls = []
+    bulk_history = replay.provider.bulk_history
+    replay.provider.bulk_history = lambda tickers, start: calls.append(sorted(tickers)) or bulk_history(tickers, start)
+
+    rates = get_rates({'USD', 'GBp', 'EUR', 'JPY'}, base='EUR')
+    assert rates == {'USD': 0.92, 'GBp': pytest.approx(0.0118), 'EUR': 1.0}
+    assert calls == [['GBPEUR=X', 'JPYEUR=X', 'USDEUR=X']]
+    assert "Sin tipo de cambio JPY/EUR" in capsys.readouterr().out
+    assert get_rates({'USD', 'GBP'}, base='EUR') == {'USD': 0.92, 'GBP': 1.18}
+    assert len(calls) == 1
+
+def test_convertir_cotizaciones(replay):
+    replay.closes('USDEUR=X', [0.5], start='2024-06-28')
+    currency('AAPL', 'USD')
+    currency('SAN.MC', 'EUR')
+    quotes = convert_quotes(['AAPL', 'SAN.MC', 'ZZZ'], [
+        {'price': 200.0, 'daily_change_pct': 1.0, 'daily_change_abs': 2.0},
+        {'price': 4.0, 'daily_change_pct': -1.0, 'daily_change_abs': -0.04},
+        {'price': None, 'daily_change_pct': 0, 'daily_change_abs': 0}], base='EUR')
+    assert quotes == [
+        {'price': 100.0, 'daily_change_pct': 1.0, 'daily_change_abs': 1.0, 'currency': 'USD'},
+        {'price': 4.0, 'daily_change_pct': -1.0, 'daily_change_abs': -0.04, 'currency': 'EUR'},
+        {'price': None, 'daily_change_pct': 0.0, 'daily_change_abs': 0.0, 'currency': None}]
+
+def test_convertir_cierres_con_el_tipo_de_cada_dia(capsys):
+    index = pd.bdate_range('2024-06-24', periods=4)
+    closes = pd.DataFrame({'AAPL': [10.0, 10.0, 10.0, 10.0], 'VOD.L': [100.0] * 4, 'SAN.MC': [4.0] * 4,
+                           'XX': [1.0] * 4}, index=index)
+    pairs = pd.DataFrame({'USDEUR=X': [0.9, None, 0.8, 0.7]}, index=index)
+    converted = convert_closes(closes, {'AAPL': 'USD', 'VOD.L': 'GBp', 'SAN.MC': 'EUR', 'XX': None}, pairs,
+                               base='EUR')
+    assert converted['AAPL'].tolist() == pytest.approx([9.0, 9.0, 8.0, 7.0])
+    assert converted['SAN.MC'].tolist() == [4.0] * 4
+    assert converted['XX'].tolist() == [1.0] * 4
+    # Sin histórico de GBPEUR=X se deja como está y se avisa
+    assert converted['VOD.L'].tolist() == [100.0] * 4
+    assert "Sin histórico de GBPEUR=X" in capsys.readouterr().out
+
+def test_las_cotizaciones_llegan_en_la_divisa_base(replay, monkeypatch):
+    monkeypatch.setattr(fx, 'BASE_CURRENCY', 'EUR')
+    replay.closes('AAPL', [100.0, 110.0], start='2024-06-27')
+    replay.closes('USDEUR=X', [0.9, 0.9], start='2024-06-27')
+    currency('AAPL', 'USD')
+    quote = MarketData.get_quotes(['AAPL'])[0]
+    assert quote['price'] == pytest.approx(99.0)
+    assert quote['daily_change_abs'] == pytest.approx(9.0)
+    assert quote['daily_change_pct'] == pytest.approx(10.0)
+    assert quote['currency'] == 'USD'
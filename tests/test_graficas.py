@@ -0,0 +1,56 @@
+import pytest
+
+from utils.async_database import AsyncDatabase
+from utils.async_market_data import AsyncMarketData
+from pages import graficas_acciones, graficas_fondos
+
+PRICES = {'AAA': 15.0, 'BBB': 1.0, 'FFF': 12.0, 'GGG': None}
+
+@pytest.fixture
+def calls(db, replay, monkeypatch):
+    """Lecturas de posiciones y de cotizaciones de cada refresco de las gráficas"""
+    sent = []
+    adb = AsyncDatabase('sqlite')
+    get_posiciones = adb.get_posiciones
+
+    async def posiciones(tabla):
+        sent.append(('posiciones', tabla))
+        return await get_posiciones(tabla)
+
+    async def get_quotes(tickers, purchase_dates=None, refresh=False, ttl=None):
+        sent.append(('quotes', tuple(tickers)))
+        return [{'price': PRICES[t], 'daily_change_pct': 0.0, 'daily_change_abs': 0.0, 'ytd_change': 0.0}
+                for t in tickers]
+    monkeypatch.setattr(adb, 'get_posiciones', posiciones)
+    monkeypatch.setattr(AsyncMarketData, 'get_quotes', get_quotes)
+    for page in (graficas_acciones, graficas_fondos):
+        monkeypatch.setattr(page, 'adb', adb)
+    return sent
+
+def test_una_carga_para_las_tres_graficas_de_acciones(db, calls):
+    db.add_accion('Aaa', 'AAA', 'Tech', 10.0, 10, '2024-01-01')
+    db.add_accion('Bbb', 'BBB', 'N/A', 2.0, 10, '2024-01-01')
+    distribution, sector, performance = graficas_acciones.update_acciones_graphs(1)
+    assert calls == [('posiciones', 'acciones'), ('quotes', ('AAA', 'BBB'))]
+
+    assert list(distribution.data[0].labels) == ['Aaa (AAA)', 'Bbb (BBB)']
+    assert list(distribution.data[0].values) == [150.0, 10.0]
+    # Sin sector guardado ni en la caché de metadatos
+    assert list(sector.data[0].labels) == ['Tech', 'N/A']
+    assert list(performance.data[0].x) == ['AAA', 'BBB']
+    assert list(performance.data[0].y) == pytest.approx([50.0, -50.0])
+
+def test_una_carga_para_las_tres_graficas_de_fondos(db, calls):
+    db.add_fondo('Fff', 'FFF', 'RF', 10.0, 1, '2024-01-01')
+    db.add_fondo('Ggg', 'GGG', 'RV', 5.0, 2, '2024-01-01')
+    distribution, tipo, performance = graficas_fondos.update_fondos_graphs(1)
+    assert calls == [('posiciones', 'fondos'), ('quotes', ('FFF', 'GGG'))]
+    assert list(distribution.data[0].values) == [12.0, 0.0]
+    assert list(tipo.data[0].values) == [12.0, 0.0]
+    # Sin precio no hay rendimiento que mostrar
+    assert list(performance.data[0].x) == ['Fff']
+
+def test_sin_posiciones_las_tres_vacias(db, calls):
+    figures = graficas_acciones.update_acciones_graphs(1)
+    assert [fig.layout.annotations[0].text for fig in figures] == ["No hay datos de acciones para mostrar"] * 3
+    assert calls == [('posiciones', 'acciones'), ('quotes', ())]
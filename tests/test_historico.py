@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from utils import aio
+from utils.async_database import AsyncDatabase
+from utils.history_store import ClosesCache, HistoryStore
+from utils.ledger import cost_flows
+from utils.portfolio import value_history, FLUJOS_COLUMNS, POSICIONES_COLUMNS
+from pages import historico
+
+def closes_frame(data, start='2024-01-01'):
+    return pd.DataFrame(data, index=pd.bdate_range(start, periods=len(next(iter(data.values())))))
+
+def test_valor_desde_la_fecha_de_compra():
+    closes = closes_frame({'AAA': [10.0, 11.0, None, 13.0], 'BBB': [2.0, 2.0, 3.0, 3.0]})
+    holdings = [
+        {'ticker': 'aaa', 'fecha_compra': '2024-01-02', 'cantidad': 2, 'coste_medio': 10.0},
+        # Comprada en fin de semana: cuenta desde el lunes
+        {'ticker': 'BBB', 'fecha_compra': '2023-12-30', 'cantidad': 10, 'coste_medio': 1.5},
+        # Posterior al último cierre: no suma
+        {'ticker': 'BBB', 'fecha_compra': '2024-02-01', 'cantidad': 99, 'coste_medio': 1.0},
+    ]
+    history = value_history(holdings, closes, POSICIONES_COLUMNS)
+    # El miércoles sin cierre de AAA toma el del martes
+    assert history['valor'].tolist() == pytest.approx([20.0, 42.0, 52.0, 56.0])
+    assert history['invertido'].tolist() == pytest.approx([15.0, 35.0, 35.0, 35.0])
+    assert value_history([], closes, POSICIONES_COLUMNS).empty
+
+def test_las_ventas_restan_cantidad_y_coste():
+    movements = [
+        {'id': 1, 'tabla': 'acciones', 'ticker': 'AAA', 'tipo': 'compra', 'cantidad': 10, 'precio': 10.0,
+         'fecha': '2024-01-01'},
+        {'id': 2, 'tabla': 'acciones', 'ticker': 'AAA', 'tipo': 'compra', 'cantidad': 10, 'precio': 20.0,
+         'fecha': '2024-01-02'},
+        {'id': 3, 'tabla': 'acciones', 'ticker': 'AAA', 'tipo': 'venta', 'cantidad': 15, 'precio': 30.0,
+         'fecha': '2024-01-03'},
+        {'id': 4, 'tabla': 'acciones', 'ticker': 'AAA', 'tipo': 'dividendo', 'cantidad': 5, 'precio': 1.0,
+         'fecha': '2024-01-03'},
+    ]
+    flows = cost_flows(movements)
+    assert [(f['cantidad'], f['precio']) for f in flows] == [(10, 10.0), (10, 20.0), (-15, pytest.approx(40 / 3))]
+    history = value_history(flows, closes_frame({'AAA': [10.0, 20.0, 30.0]}), FLUJOS_COLUMNS)
+    assert history['valor'].tolist() == pytest.approx([100.0, 400.0, 150.0])
+    # FIFO: la venta se lleva los 10 del primer lote y 5 del segundo
+    assert history['invertido'].tolist() == pytest.approx([100.0, 300.0, 100.0])
+
+def test_la_matriz_de_cierres_solo_relee_lo_nuevo(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.db'))
+    bars = lambda values, start: pd.DataFrame({'Close': values}, index=pd.bdate_range(start, periods=len(values)))
+    store.save_many({'AAA': bars([1.0, 2.0], '2024-01-01')}, {'AAA': '2024-01-01'})
+    cache = ClosesCache(store)
+    assert cache.get_closes(['AAA'], '2024-01-01')['AAA'].tolist() == [1.0, 2.0]
+
+    reads = []
+    get_closes = store.get_closes
+    store.get_closes = lambda tickers, start=None: reads.append(pd.Timestamp(start)) or get_closes(tickers, start)
+    # La barra del día en curso cambia y llega una nueva
+    store.save_many({'AAA': bars([2.5, 3.0], '2024-01-02')}, {'AAA': '2024-01-02'})
+    assert cache.get_closes(['AAA'], '2024-01-01')['AAA'].tolist() == [1.0, 2.5, 3.0]
+    assert reads == [pd.Timestamp('2024-01-02')]
+
+def test_series_de_la_pagina_desde_el_libro(db, replay, monkeypatch):
+    monkeypatch.setattr(historico, 'adb', AsyncDatabase('sqlite'))
+    historico.value_history_cache.clear()
+    replay.metadata({'AAA': {'currency': 'EUR'}, 'BBB': {'currency': 'EUR'}})
+    replay.closes('AAA', [10.0, 12.0, 14.0], start='2024-06-26')
+    replay.closes('BBB', [5.0, 5.0, 6.0], start='2024-06-26')
+    db.add_accion('Aaa', 'AAA', 'Tech', 10.0, 3, '2024-06-26')
+    db.add_movimiento('acciones', 'AAA', 'venta', 1, 14.0, '2024-06-28')
+    db.add_fondo('Bbb', 'BBB', 'Renta fija', 4.0, 10, '2024-06-27')
+
+    series = aio.run(historico.load_value_history(aio.Budget()))
+    assert series['acciones']['valor'].tolist() == pytest.approx([30.0, 36.0, 28.0])
+    assert series['acciones']['invertido'].tolist() == pytest.approx([30.0, 30.0, 20.0])
+    # Los cierres se cargan una vez para las dos tablas: antes de la compra el valor es 0
+    assert series['fondos']['valor'].tolist() == pytest.approx([0.0, 50.0, 60.0])
+    assert len(historico.value_history_cache._entries) == 2
+
+    # Sin cambios en los movimientos sale de la caché, sin leer cierres
+    replay.closes('AAA', [1.0, 1.0, 1.0], start='2024-06-26')
+    assert aio.run(historico.load_value_history(aio.Budget()))['acciones'] is series['acciones']
+    historico.value_history_cache.clear()
@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+from utils import aio
+from utils.async_market_data import AsyncMarketData
+from utils.history_store import HistoryStore, get_history_store
+from utils.market_data import MarketData
+
+def bars(values, start):
+    return pd.DataFrame({'Close': values, 'Volume': 1}, index=pd.bdate_range(start, periods=len(values)))
+
+def track_bulk(replay):
+    """Descargas en bloque pedidas al proveedor: [(desde, tickers)]"""
+    calls = []
+    bulk_history = replay.provider.bulk_history
+    replay.provider.bulk_history = lambda tickers, start: (calls.append((start, sorted(tickers)))
+                                                           or bulk_history(tickers, start))
+    return calls
+
+def test_guardar_cobertura_y_cierres(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.db'))
+    store.save_many({'AAA': bars([1.0, 2.0, None], '2024-01-01'), 'BBB': bars([5.0], '2024-01-02'),
+                     'VACIO': bars([], '2024-01-01')},
+                    {'AAA': '2023-12-01', 'BBB': '2024-01-01', 'VACIO': '2024-01-01'})
+    # La cobertura empieza en lo pedido, no en la primera barra; sin cierre no hay barra
+    assert store.coverage(['AAA', 'BBB', 'VACIO', 'ZZZ']) == {
+        'AAA': ('2023-12-01', '2024-01-02'), 'BBB': ('2024-01-01', '2024-01-02'),
+        'VACIO': ('2024-01-01', '2024-01-01')}
+
+    # Sustituir la última barra y ampliar por los dos lados
+    store.save_bars('AAA', bars([2.5, 3.0], '2024-01-02'), '2024-01-02')
+    store.save_bars('AAA', bars([0.5], '2023-11-01'), '2023-11-01')
+    assert store.coverage(['AAA'])['AAA'] == ('2023-11-01', '2024-01-03')
+
+    closes = store.get_closes(['AAA', 'BBB'], start='2024-01-01')
+    assert closes.index.tolist() == list(pd.bdate_range('2024-01-01', periods=3))
+    assert closes['AAA'].tolist() == [1.0, 2.5, 3.0]
+    assert closes['BBB'].tolist()[1] == 5.0
+    assert store.get_closes(['ZZZ']).empty and store.get_closes([]).empty
+
+def test_sincronizacion_incremental(replay):
+    replay.closes('AAA', [1.0, 2.0, 3.0, 4.0, 5.0], start='2024-06-24')
+    replay.closes('BBB', [10.0, 20.0, 30.0, 40.0, 50.0], start='2024-06-24')
+    calls = track_bulk(replay)
+    store = get_history_store()
+
+    MarketData.sync_history(['AAA'], '2024-06-01')
+    assert calls == [('2024-06-01', ['AAA'])]
+    assert store.coverage(['AAA']) == {'AAA': ('2024-06-01', '2024-06-28')}
+
+    # AAA solo desde su última barra (la del día puede cambiar); BBB completo
+    replay.closes('AAA', [1.0, 2.0, 3.0, 4.0, 5.5], start='2024-06-24')
+    MarketData.sync_history(['AAA', 'BBB'], '2024-06-01')
+    assert calls[1:] == [('2024-06-28', ['AAA']), ('2024-06-01', ['BBB'])]
+    closes = store.get_closes(['AAA', 'BBB'])
+    assert closes['AAA'].tolist() == [1.0, 2.0, 3.0, 4.0, 5.5]
+    assert closes['BBB'].tolist() == [10.0, 20.0, 30.0, 40.0, 50.0]
+
+    # Pedir desde antes de lo cubierto vuelve a descargar desde ahí
+    MarketData.sync_history(['AAA'], '2024-05-01')
+    assert calls[3:] == [('2024-05-01', ['AAA'])]
+    assert store.coverage(['AAA'])['AAA'][0] == '2024-05-01'
+
+def test_sincronizacion_asincrona(replay):
+    replay.closes('AAA', [1.0, 2.0], start='2024-06-27')
+    calls = track_bulk(replay)
+    aio.run(AsyncMarketData.sync_history(['AAA'], '2024-06-01'))
+    aio.run(AsyncMarketData.sync_history(['AAA'], '2024-06-01'))
+    assert calls == [('2024-06-01', ['AAA']), ('2024-06-28', ['AAA'])]
+    assert get_history_store().get_closes(['AAA'])['AAA'].tolist() == [1.0, 2.0]
@@ -0,0 +1,60 @@
+import base64
+import json
+
+import pytest
+
+from utils.holdings_io import export_columns, parse_upload, stream_csv, stream_json, validate_rows
+
+def upload(text, mime='text/csv'):
+    return f"data:{mime};base64," + base64.b64encode(text.encode('utf-8')).decode()
+
+def test_csv_con_coma_o_punto_y_coma():
+    assert parse_upload(upload("ticker,nombre\nAAA,Aaa\n"), 'a.CSV') == [{'ticker': 'AAA', 'nombre': 'Aaa'}]
+    # Excel en español: punto y coma y BOM
+    assert parse_upload(upload("﻿ticker;precio_compra\nAAA;10,5\n"), 'a.csv') == [
+        {'ticker': 'AAA', 'precio_compra': '10,5'}]
+
+def test_json_objeto_o_lista():
+    assert parse_upload(upload('{"ticker": "AAA"}'), 'a.json') == [{'ticker': 'AAA'}]
+    assert parse_upload(upload('[{"ticker": "AAA"}, {"ticker": "BBB"}]'), 'a.json') == [
+        {'ticker': 'AAA'}, {'ticker': 'BBB'}]
+    with pytest.raises(ValueError, match="lista de objetos"):
+        parse_upload(upload('[1, 2]'), 'a.json')
+    with pytest.raises(ValueError, match="Formato no soportado"):
+        parse_upload(upload('x'), 'a.xlsx')
+
+def test_valida_y_normaliza_acciones():
+    rows, errors = validate_rows('acciones', [
+        {' Ticker ': 'aaa', 'Nombre': 'Aaa', 'precio_compra': '10,5', 'num_acciones': '3.0',
+         'fecha_compra': '2024-01-02T00:00:00', 'id': '7'},
+        {'ticker': 'BBB', 'nombre': 'Bbb', 'precio_compra': '0', 'num_acciones': '1.5', 'fecha_compra': '02/01/2024'},
+    ])
+    assert rows == [{'nombre': 'Aaa', 'ticker': 'AAA', 'precio_compra': 10.5, 'num_acciones': 3,
+                     'fecha_compra': '2024-01-02', 'sector': 'N/A', 'id': 7}]
+    assert errors == ["Fila 2: 'num_acciones' no es válido (1.5), 'precio_compra' debe ser mayor que 0, "
+                      "'fecha_compra' debe tener formato AAAA-MM-DD"]
+
+def test_valida_fondos():
+    rows, errors = validate_rows('fondos', [
+        {'nombre': 'Fff', 'ticker': 'fff', 'tipo': 'rf', 'valor_compra': 1, 'cantidad': 2.5,
+         'fecha_compra': '2024-01-02'},
+        {'nombre': 'Ggg', 'ticker': '', 'tipo': 'mixto', 'valor_compra': 1, 'cantidad': 1,
+         'fecha_compra': '2024-01-02', 'id': 'x'},
+    ])
+    assert rows == [{'nombre': 'Fff', 'ticker': 'FFF', 'tipo': 'RF', 'valor_compra': 1.0, 'cantidad': 2.5,
+                     'fecha_compra': '2024-01-02'}]
+    assert errors == ["Fila 2: falta 'ticker', 'tipo' debe ser RF o RV, 'id' no es válido (x)"]
+
+def test_exportacion_en_streaming():
+    columns = export_columns('acciones')
+    assert columns == ['id', 'nombre', 'ticker', 'sector', 'precio_compra', 'num_acciones', 'fecha_compra']
+    rows = [{'id': 1, 'nombre': 'Ñu', 'ticker': 'AAA', 'extra': 'x'}, {'id': 2, 'ticker': 'BBB'}]
+
+    chunks = list(stream_csv(iter(rows), ['id', 'nombre', 'ticker']))
+    assert len(chunks) == 3
+    assert ''.join(chunks).splitlines() == ['id,nombre,ticker', '1,Ñu,AAA', '2,,BBB']
+
+    text = ''.join(stream_json(iter(rows), ['id', 'nombre']))
+    assert 'Ñu' in text
+    assert json.loads(text) == [{'id': 1, 'nombre': 'Ñu'}, {'id': 2, 'nombre': None}]
+    assert ''.join(stream_json(iter([]), columns)) == '[]'
@@ -0,0 +1,103 @@
+import math
+
+import pytest
+from dash import no_update
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+
+from utils import aio
+from utils.async_database import AsyncDatabase
+from utils.async_market_data import AsyncMarketData
+from utils.holdings_table import load_positions_page
+from utils.styles import DANGER_COLOR, MONEY_FORMAT, SIGNED_PERCENT_FORMAT
+from pages import acciones
+from pages.acciones import POSITION_COLUMNS, PAGE_SIZE
+
+PRICES = {'AAA': 15.0, 'BBB': 2.0, 'CCC': None}
+
+@pytest.fixture
+def quotes(monkeypatch):
+    """Cotizaciones fijas (sin red): las fechas pedidas quedan en ``requested``"""
+    requested = {}
+
+    async def get_quotes(tickers, purchase_dates=None, refresh=False, ttl=None):
+        requested.update(zip(tickers, purchase_dates))
+        return [{'price': PRICES[t], 'daily_change_pct': 1.0, 'daily_change_abs': 0.1, 'ytd_change': 5.0}
+                for t in tickers]
+    monkeypatch.setattr(AsyncMarketData, 'get_quotes', get_quotes)
+    return requested
+
+def load(page=0, sort=None, descending=False, page_size=20, filters=()):
+    return aio.run(load_positions_page(AsyncDatabase('sqlite'), 'acciones', POSITION_COLUMNS, page, sort,
+                                       descending, page_size, list(filters), aio.Budget()))
+
+def seed(db):
+    db.add_accion('Aaa', 'AAA', 'Tech', 10, 10, '2024-01-01')
+    db.add_accion('Aaa', 'AAA', 'Tech', 12, 10, '2024-03-01')
+    db.add_accion('Bbb', 'BBB', 'Energía', 1, 100, '2024-01-01')
+    db.add_accion('Ccc', 'CCC', 'Tech', 5, 1, '2024-01-01')
+    db.add_movimiento('acciones', 'AAA', 'venta', 15, 20, '2024-04-01')
+    db.add_movimiento('acciones', 'CCC', 'venta', 1, 6, '2024-04-01')
+
+def test_filas_y_total_salen_de_las_posiciones(db, quotes):
+    seed(db)
+    total, cartera_total, cartera = load()
+    # CCC se vendió entera: no aparece; de AAA quedan 5 del segundo lote
+    assert total == 2
+    assert cartera['ticker'].tolist() == ['AAA', 'BBB']
+    aaa = cartera.iloc[0]
+    assert aaa['id'] == 'AAA'
+    assert aaa['cantidad'] == 5
+    assert aaa['coste_medio'] == 12
+    assert aaa['fecha_compra'] == '2024-03-01'
+    assert quotes == {'AAA': '2024-03-01', 'BBB': '2024-01-01'}
+    assert cartera_total['invertido'].sum() == pytest.approx(5 * 12 + 100 * 1)
+    assert cartera_total['valor_actual'].sum() == pytest.approx(5 * 15 + 100 * 2)
+
+def test_orden_filtros_y_paginas(db, quotes):
+    seed(db)
+    db.add_accion('Ddd', 'DDD', 'Tech', 1, 1, '2024-01-01')
+    PRICES['DDD'] = 1.0
+    try:
+        total, _, cartera = load(sort='Ganancia/Pérdida', descending=True, page_size=2)
+        assert total == 3 and cartera['ticker'].tolist() == ['BBB', 'AAA']
+        assert load(page=5, sort='Ganancia/Pérdida', descending=True, page_size=2)[2]['ticker'].tolist() == ['DDD']
+        total, cartera_total, cartera = load(filters=[('Sector', 'eq', 'Tech'), ('Num. Acciones', 'gt', 2.0)])
+        assert total == 1 and cartera['ticker'].tolist() == ['AAA']
+        assert cartera_total['ticker'].tolist() == ['AAA']
+        assert load(filters=[('Valor Actual', 'lt', 10.0)])[2]['ticker'].tolist() == ['BBB', 'DDD']
+    finally:
+        del PRICES['DDD']
+
+def test_sin_posiciones(db, quotes):
+    total, cartera_total, cartera = load(sort='Cambio YTD')
+    assert total == 0 and cartera.empty and cartera_total.empty
+
+def run_table(callback, current_data=None, filter_query=None, sort_by=None):
+    """Ejecuta el callback de la tabla como lo dispara el intervalo de cotizaciones"""
+    context_value.set(AttributeDict(triggered_inputs=[{'prop_id': 'quote-version.data', 'value': 1}]))
+    return callback(None, 1, None, None, 0, sort_by, filter_query, None, PAGE_SIZE, current_data)
+
+def test_la_tabla_envia_numeros_sin_formato(db, quotes, monkeypatch):
+    monkeypatch.setattr(acciones, 'adb', AsyncDatabase('sqlite'))
+    seed(db)
+    data, page_count, style, container, empty = run_table(acciones.update_acciones_table)
+    assert page_count == 1 and container == {} and empty is None
+    aaa, bbb, total = data
+    assert aaa['Precio Compra'] == 12.0 and aaa['Num. Acciones'] == 5
+    assert aaa['Valor Actual'] == 15.0 and aaa['Cambio Diario'] == 1.0 and aaa['Ganancia/Pérdida'] == 15.0
+    assert bbb['Ganancia/Pérdida (%)'] == 100.0
+    assert total['Nombre'] == 'TOTAL' and total['Valor Actual'] == 275.0
+    assert all(isinstance(row[column], (int, float)) for row in (aaa, bbb)
+               for column in ('Valor Actual', 'Cambio Diario (€)', 'Cambio YTD', 'Ganancia/Pérdida'))
+    # El navegador colorea por el número de la ganancia
+    assert {'if': {'filter_query': '{Ganancia/Pérdida} < 0'}, 'color': DANGER_COLOR} in style
+    formats = {column['id']: column.get('format') for column in acciones.TABLE_COLUMNS}
+    assert formats['Valor Actual'] == MONEY_FORMAT and formats['Cambio YTD'] == SIGNED_PERCENT_FORMAT
+
+    # Filtro de DataTable sobre una columna calculada
+    data = run_table(acciones.update_acciones_table, filter_query='{Valor Actual} < 10')[0]
+    assert [row['Ticker'] for row in data] == ['BBB', '']
+    # Mismas filas que ya tiene el navegador: no viaja nada
+    current = run_table(acciones.update_acciones_table)[0]
+    assert run_table(acciones.update_acciones_table, current_data=current)[0] is no_update
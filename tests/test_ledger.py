@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+from utils.ledger import (movement_data, empty_position, applies_after, apply_movement, build_position,
+                          build_positions, cost_flows, lot_movement)
+from utils.portfolio import ACCIONES_COLUMNS
+
+def movement(tipo, cantidad, precio, fecha, id=None, ticker='AAA', tabla='acciones'):
+    return {**movement_data(tabla, ticker, tipo, cantidad, precio, fecha), 'id': id}
+
+def test_movement_data_normaliza_y_valida():
+    data = movement_data('acciones', ' aaa ', 'compra', '10', '1.5', '2024-01-05T00:00:00')
+    assert data == {'tabla': 'acciones', 'ticker': 'AAA', 'tipo': 'compra', 'cantidad': 10.0,
+                    'precio': 1.5, 'fecha': '2024-01-05', 'lote_id': None}
+    with pytest.raises(ValueError):
+        movement_data('bonos', 'AAA', 'compra', 1, 1, '2024-01-01')
+    with pytest.raises(ValueError):
+        movement_data('acciones', 'AAA', 'regalo', 1, 1, '2024-01-01')
+    with pytest.raises(ValueError):
+        movement_data('acciones', 'AAA', 'venta', 0, 1, '2024-01-01')
+
+def test_venta_consume_los_lotes_mas_antiguos():
+    position = build_position('acciones', 'AAA', [
+        movement('compra', 10, 10, '2024-01-01', 1),
+        movement('compra', 10, 20, '2024-02-01', 2),
+        movement('venta', 15, 30, '2024-03-01', 3),
+    ])
+    assert position['cantidad'] == 5
+    assert position['ganancia_realizada'] == pytest.approx(15 * 30 - (10 * 10 + 5 * 20))
+    assert json.loads(position['lotes']) == [['2024-02-01', 5, 20]]
+    assert position['coste_total'] == pytest.approx(100)
+    assert position['coste_medio'] == pytest.approx(20)
+    assert position['ultima_fecha'] == '2024-03-01'
+    assert position['ultimo_movimiento'] == 3
+
+def test_build_position_ordena_por_fecha_y_alta():
+    # Un movimiento con fecha anterior se aplica en su sitio aunque se diera de alta después
+    movements = [
+        movement('venta', 5, 30, '2024-03-01', 2),
+        movement('compra', 10, 10, '2024-01-01', 1),
+        movement('compra', 10, 20, '2024-02-01', 3),
+    ]
+    position = build_position('acciones', 'AAA', movements)
+    assert json.loads(position['lotes']) == [['2024-01-01', 5, 10], ['2024-02-01', 10, 20]]
+    assert position['ganancia_realizada'] == pytest.approx(5 * 30 - 5 * 10)
+
+def test_applies_after_detecta_movimientos_atrasados():
+    position = build_position('acciones', 'AAA', [movement('compra', 10, 10, '2024-02-01', 4)])
+    assert applies_after(position, movement('venta', 1, 10, '2024-02-02'))
+    assert applies_after(position, movement('venta', 1, 10, '2024-02-01'))
+    assert not applies_after(position, movement('compra', 1, 10, '2024-01-15'))
+    assert applies_after(empty_position('acciones', 'AAA'), movement('compra', 1, 10, '2020-01-01'))
+
+def test_venta_anterior_a_la_compra_no_cuadra():
+    with pytest.raises(ValueError, match="No se pueden vender"):
+        build_position('acciones', 'AAA', [
+            movement('compra', 10, 10, '2024-02-01', 1),
+            movement('venta', 5, 10, '2024-01-01', 2),
+        ])
+
+def test_vender_de_mas_no_modifica_la_posicion():
+    position = apply_movement(empty_position('acciones', 'AAA'), movement('compra', 10, 10, '2024-01-01', 1))
+    before = dict(position)
+    with pytest.raises(ValueError):
+        apply_movement(position, movement('venta', 10.5, 10, '2024-02-01', 2))
+    assert position == before
+
+def test_venta_fraccionaria_dentro_del_margen():
+    position = build_position('fondos', 'FFF', [
+        movement('compra', 0.1, 10, '2024-01-01', 1, 'FFF', 'fondos'),
+        movement('compra', 0.2, 10, '2024-01-02', 2, 'FFF', 'fondos'),
+        movement('venta', 0.3, 10, '2024-01-03', 3, 'FFF', 'fondos'),
+    ])
+    assert position['cantidad'] == pytest.approx(0)
+    assert json.loads(position['lotes']) == []
+    assert position['coste_medio'] == 0
+
+def test_dividendo_solo_suma_a_dividendos():
+    position = build_position('acciones', 'AAA', [
+        movement('compra', 10, 10, '2024-01-01', 1),
+        movement('dividendo', 10, 0.5, '2024-06-01', 2),
+    ])
+    assert position['cantidad'] == 10
+    assert position['coste_total'] == pytest.approx(100)
+    assert position['dividendos'] == pytest.approx(5)
+    assert position['ganancia_realizada'] == 0
+
+def test_build_position_conserva_id_y_nombre_de_la_base():
+    base = {'id': 7, 'nombre': 'Acme', 'cantidad': 99, 'lotes': '[["2020-01-01", 99, 1]]'}
+    position = build_position('acciones', 'AAA', [movement('compra', 1, 10, '2024-01-01', 1)], base=base)
+    assert position['id'] == 7 and position['nombre'] == 'Acme'
+    assert position['cantidad'] == 1
+
+def test_build_positions_agrupa_por_tabla_y_ticker():
+    positions = build_positions([
+        movement('compra', 1, 10, '2024-01-01', 1, 'AAA'),
+        movement('compra', 2, 10, '2024-01-01', 2, 'BBB'),
+        movement('compra', 3, 10, '2024-01-01', 3, 'AAA', 'fondos'),
+    ])
+    assert {key: p['cantidad'] for key, p in positions.items()} == {
+        ('acciones', 'AAA'): 1, ('acciones', 'BBB'): 2, ('fondos', 'AAA'): 3}
+
+def test_cost_flows_sigue_el_coste_fifo():
+    flows = cost_flows([
+        movement('compra', 10, 10, '2024-01-01', 1),
+        movement('compra', 10, 20, '2024-02-01', 2),
+        movement('dividendo', 20, 1, '2024-02-15', 3),
+        movement('venta', 15, 30, '2024-03-01', 4),
+    ])
+    assert [(f['fecha_compra'], f['cantidad']) for f in flows] == [
+        ('2024-01-01', 10), ('2024-02-01', 10), ('2024-03-01', -15)]
+    # La venta sale a su coste FIFO, no a su precio
+    assert flows[2]['precio'] == pytest.approx((10 * 10 + 5 * 20) / 15)
+    assert sum(f['cantidad'] * f['precio'] for f in flows) == pytest.approx(5 * 20)
+
+def test_cost_flows_omite_los_tickers_incoherentes(capsys):
+    flows = cost_flows([
+        movement('venta', 1, 10, '2024-01-01', 1, 'AAA'),
+        movement('compra', 1, 10, '2024-01-01', 2, 'BBB'),
+    ])
+    assert [f['ticker'] for f in flows] == ['BBB']
+    assert 'AAA' in capsys.readouterr().out
+
+def test_lot_movement_usa_las_columnas_de_la_tabla():
+    lot = {'id': 3, 'ticker': 'aaa', 'precio_compra': 12.5, 'num_acciones': 4, 'fecha_compra': '2024-01-01'}
+    assert lot_movement('acciones', lot, ACCIONES_COLUMNS) == {
+        'tabla': 'acciones', 'ticker': 'AAA', 'tipo': 'compra', 'cantidad': 4.0, 'precio': 12.5,
+        'fecha': '2024-01-01', 'lote_id': 3}
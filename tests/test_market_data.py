@@ -0,0 +1,118 @@
+import time
+
+import pandas as pd
+import pytest
+
+from utils import aio
+from utils.async_market_data import AsyncMarketData
+from utils.market_data import MarketData
+from utils.providers import get_provider
+from utils.ticker_metadata import get_ticker_metadata
+
+def track():
+    """Peticiones al proveedor activo: [('bulk', desde, tickers)] y [('history', ticker)]"""
+    calls = []
+    provider = get_provider()
+    bulk_history, history = provider.bulk_history, provider.history
+    provider.bulk_history = lambda tickers, start: (calls.append(('bulk', start, sorted(tickers)))
+                                                    or bulk_history(tickers, start))
+    provider.history = lambda ticker, start, timeout=None: (calls.append(('history', ticker))
+                                                            or history(ticker, start, timeout))
+    return calls
+
+@pytest.fixture
+def market(replay):
+    """AAA y BBB en euros, con cierres desde diciembre"""
+    for ticker in ('AAA', 'BBB'):
+        get_ticker_metadata().save(ticker, {'currency': 'EUR'})
+    # Hasta el "hoy" del proveedor (viernes 28 de junio)
+    sessions = len(pd.bdate_range('2023-12-25', '2024-06-28'))
+    replay.closes('AAA', [8.0] * 5 + [10.0] * (sessions - 7) + [12.0, 15.0], start='2023-12-25')
+    replay.closes('BBB', [4.0] * sessions, start='2023-12-25')
+    return replay
+
+def test_cotizaciones_de_toda_la_tabla_en_una_descarga(market):
+    calls = track()
+    quotes = MarketData.get_quotes(['aaa', 'BBB', 'AAA'], [None, None, '2024-06-27'])
+    assert calls == [('bulk', '2023-12-22', ['AAA', 'BBB'])]
+    aaa, bbb, aaa_compra = quotes
+    assert aaa['price'] == 15.0
+    assert aaa['daily_change_abs'] == 3.0 and aaa['daily_change_pct'] == pytest.approx(25.0)
+    # YTD desde la primera sesión del año, o desde la compra si es de este año
+    assert aaa['ytd_change'] == pytest.approx(50.0)
+    assert aaa_compra['ytd_change'] == pytest.approx(25.0)
+    assert bbb == {'price': 4.0, 'daily_change_pct': 0.0, 'daily_change_abs': 0.0, 'ytd_change': 0.0,
+                   'currency': 'EUR'}
+
+def test_ticker_sin_datos(market):
+    quote = MarketData.get_quotes(['ZZZ'])[0]
+    assert quote['price'] is None and quote['ytd_change'] == 0
+    assert MarketData.get_quotes([]) == []
+
+def test_cotizaciones_asincronas_iguales(market):
+    expected = MarketData.get_quotes(['AAA', 'BBB'], [None, '2024-06-27'], refresh=True)
+    assert aio.run(AsyncMarketData.get_quotes(['AAA', 'BBB'], [None, '2024-06-27'], refresh=True)) == expected
+
+def test_la_cache_evita_descargas(market):
+    calls = track()
+    first = MarketData.get_quotes(['AAA', 'BBB'])
+    assert MarketData.get_quotes(['BBB', 'AAA']) == [first[1], first[0]]
+    assert MarketData.get_current_price('aaa') == 15.0
+    assert MarketData.get_daily_change('AAA') == (pytest.approx(25.0), 3.0)
+    assert len(calls) == 1
+
+    # Otro inicio de YTD recalcula solo ese ticker (y sincroniza desde su última barra)
+    assert MarketData.get_ytd_change('AAA', '2024-06-27') == pytest.approx(25.0)
+    assert calls[1:] == [('bulk', '2024-06-28', ['AAA'])]
+    assert MarketData.cache_stats()['hits'] > 0
+
+def test_refresh_ignora_la_cache_y_republica(market):
+    calls = track()
+    MarketData.get_quotes(['AAA'])
+    market.closes('AAA', [20.0, 30.0], start='2024-06-27')
+    assert MarketData.get_quotes(['AAA'])[0]['price'] == 15.0
+    assert MarketData.get_quotes(['AAA'], refresh=True, ttl=60)[0]['price'] == 30.0
+    assert MarketData.get_quotes(['AAA'])[0]['price'] == 30.0
+    assert len(calls) == 2
+
+def test_caducidad_de_la_cache(market):
+    calls = track()
+    MarketData.get_quotes(['AAA'], refresh=True, ttl=0.01)
+    time.sleep(0.02)
+    MarketData.get_quotes(['AAA'])
+    MarketData.get_quotes(['AAA'])
+    assert len(calls) == 2
+
+def test_descarga_concurrente_omite_fallos_y_lentos(market, capsys):
+    provider = get_provider()
+    history = provider.history
+
+    def flaky(ticker, start, timeout=None):
+        if ticker == 'ROTO':
+            raise RuntimeError("caída")
+        if ticker == 'LENTO':
+            time.sleep(1)
+        return history(ticker, start, timeout)
+    provider.history = flaky
+
+    started = time.monotonic()
+    bars = MarketData.fetch_history_concurrent(['AAA', 'ROTO', 'LENTO', 'ZZZ', 'BBB'], '2024-06-27',
+                                               max_workers=5, timeout=0.2)
+    assert time.monotonic() - started < 0.8
+    assert sorted(bars) == ['AAA', 'BBB']
+    assert bars['AAA']['Close'].tolist() == [12.0, 15.0]
+    assert MarketData.fetch_history_concurrent([], '2024-06-27') == {}
+
+def test_concurrent_y_tickers_que_faltan_en_bloque(market):
+    calls = track()
+    MarketData.get_quotes(['AAA', 'BBB'], concurrent=True)
+    assert sorted(calls) == [('history', 'AAA'), ('history', 'BBB')]
+
+    # Lo que no llega en la descarga en bloque se pide uno a uno
+    provider = get_provider()
+    bulk_history = provider.bulk_history
+    provider.bulk_history = lambda tickers, start: {ticker: frame for ticker, frame
+                                                    in bulk_history(tickers, start).items() if ticker != 'AAA'}
+    del calls[:]
+    assert MarketData.get_quotes(['AAA', 'BBB'], refresh=True)[0]['price'] == 15.0
+    assert calls[-1] == ('history', 'AAA')
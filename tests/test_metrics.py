@@ -0,0 +1,83 @@
+import dash
+import pytest
+from dash import html, dcc, Input, Output
+from dash.exceptions import PreventUpdate
+
+from utils import metrics
+from utils.cache import TTLCache
+from utils.metrics import Counter, Histogram, Registry, track, CALLBACK_DURATION, CALLBACK_ERRORS, UPSTREAM_CALLS
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Registro vacío para las métricas creadas en el test"""
+    registry = Registry()
+    monkeypatch.setattr(metrics, 'registry', registry)
+    return registry
+
+def test_formato_de_texto_de_prometheus(registry):
+    counter = Counter('peticiones_total', "Peticiones", ['ruta'])
+    histogram = Histogram('latencia_seconds', "Latencia", ['ruta'], buckets=(0.1, 1))
+    counter.inc(ruta='/a')
+    counter.inc(2, ruta='/a"b')
+    histogram.observe(0.05, ruta='/a')
+    histogram.observe(0.5, ruta='/a')
+    cache = TTLCache(ttl=None)
+    cache.get('x')
+    registry.register_cache('quotes', cache)
+    assert registry.render().splitlines() == [
+        '# HELP peticiones_total Peticiones',
+        '# TYPE peticiones_total counter',
+        'peticiones_total{ruta="/a"} 1',
+        'peticiones_total{ruta="/a\\"b"} 2',
+        '# HELP latencia_seconds Latencia',
+        '# TYPE latencia_seconds histogram',
+        'latencia_seconds_bucket{ruta="/a",le="0.1"} 1',
+        'latencia_seconds_bucket{ruta="/a",le="1"} 2',
+        'latencia_seconds_bucket{ruta="/a",le="+Inf"} 2',
+        'latencia_seconds_sum{ruta="/a"} 0.55',
+        'latencia_seconds_count{ruta="/a"} 2',
+        '# HELP cache_requests_total Consultas a las cachés en memoria',
+        '# TYPE cache_requests_total counter',
+        'cache_requests_total{cache="quotes",result="hit"} 0',
+        'cache_requests_total{cache="quotes",result="miss"} 1',
+    ]
+
+def test_track_cuenta_aciertos_y_errores():
+    labels = {'service': 'database', 'operation': 'select', 'target': 'test_metrics'}
+    with track(**labels):
+        pass
+    with pytest.raises(RuntimeError):
+        with track(**labels):
+            raise RuntimeError("caído")
+    assert UPSTREAM_CALLS.value(**labels, status='ok') == 1
+    assert UPSTREAM_CALLS.value(**labels, status='error') == 1
+
+def test_duracion_de_cada_callback():
+    app = dash.Dash(__name__)
+    app.layout = html.Div([dcc.Input(id='entrada'), html.Div(id='salida')])
+
+    @app.callback(Output('salida', 'children'), Input('entrada', 'value'))
+    def eco_metricas(value):
+        if value == 'nada':
+            raise PreventUpdate
+        if value == 'fallo':
+            raise RuntimeError("fallo")
+        return value
+
+    metrics.instrument_dash(app)
+    app.server.config['PROPAGATE_EXCEPTIONS'] = False
+    client = app.server.test_client()
+    client.get('/')
+
+    def call(value):
+        return client.post('/_dash-update-component', json={
+            'output': 'salida.children', 'outputs': {'id': 'salida', 'property': 'children'},
+            'inputs': [{'id': 'entrada', 'property': 'value', 'value': value}],
+            'changedPropIds': ['entrada.value']})
+
+    assert call('hola').status_code == 200
+    assert call('nada').status_code == 204
+    assert call('fallo').status_code == 500
+    count = CALLBACK_DURATION._series[CALLBACK_DURATION._key({'callback': 'eco_metricas'})][2]
+    assert count == 3
+    assert CALLBACK_ERRORS.value(callback='eco_metricas') == 1
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from utils.portfolio import (build_portfolio, group_values, portfolio_totals, profit_loss, ACCIONES_COLUMNS,
+                             FONDOS_COLUMNS, METRIC_COLUMNS, QUOTE_FIELDS)
+
+def quote(price, daily=0.0):
+    return {'price': price, 'daily_change_pct': daily, 'daily_change_abs': 0.0, 'ytd_change': 0.0}
+
+HOLDINGS = [
+    {'ticker': 'AAA', 'sector': 'Tech', 'num_acciones': 10, 'precio_compra': 10.0},
+    {'ticker': 'BBB', 'sector': None, 'num_acciones': 5, 'precio_compra': 20.0},
+    {'ticker': 'CCC', 'sector': 'Tech', 'num_acciones': 2, 'precio_compra': 50.0},
+]
+
+def test_ganancia_escalar_y_vectorizada():
+    profit, pct = profit_loss(10.0, 12.0, 5)
+    assert (float(profit), float(pct)) == (10.0, 20.0)
+    profit, pct = profit_loss(np.array([10.0, 0.0]), np.array([8.0, 3.0]), np.array([2, 4]))
+    assert profit.tolist() == [-4.0, 12.0]
+    # Sin coste no hay porcentaje
+    assert pct.tolist() == [-20.0, 0.0]
+
+def test_metricas_por_posicion():
+    df = build_portfolio(HOLDINGS, [quote(15.0), quote(20.0), quote(None)], ACCIONES_COLUMNS)
+    assert df['invertido'].tolist() == [100.0, 100.0, 100.0]
+    # Sin precio la posición vale 0
+    assert df['valor_actual'].tolist() == [150.0, 100.0, 0.0]
+    assert df['ganancia'].tolist() == [50.0, 0.0, -100.0]
+    assert df['ganancia_pct'].tolist() == [50.0, 0.0, -100.0]
+    assert df['peso'].tolist() == pytest.approx([60.0, 40.0, 0.0])
+    assert np.isnan(df.loc[2, 'precio_actual'])
+
+def test_cartera_vacia_y_sin_valor():
+    df = build_portfolio([], [], FONDOS_COLUMNS)
+    assert df.empty and set(QUOTE_FIELDS + METRIC_COLUMNS) <= set(df.columns)
+    assert portfolio_totals(df) == {'invertido': 0.0, 'valor_actual': 0.0, 'ganancia': 0.0, 'ganancia_pct': 0.0}
+
+    df = build_portfolio([{'ticker': 'AAA', 'cantidad': 1, 'valor_compra': 5.0}], [quote(None)], FONDOS_COLUMNS)
+    assert df['peso'].tolist() == [0.0]
+
+def test_totales_y_agrupacion():
+    df = build_portfolio(HOLDINGS, [quote(15.0), quote(20.0), quote(None)], ACCIONES_COLUMNS)
+    assert portfolio_totals(df) == {'invertido': 300.0, 'valor_actual': 250.0, 'ganancia': -50.0,
+                                    'ganancia_pct': pytest.approx(-50 / 3)}
+    assert group_values(df, 'sector').to_dict() == {'Tech': 150.0, 'Sin Clasificar': 100.0}
+    assert group_values(df, 'tipo', default='Otros').to_dict() == {'Otros': 250.0}
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from utils import providers
+from utils.market_data import MarketData
+from utils.metrics import UPSTREAM_CALLS
+from utils.providers import ReplayProvider, TrackedProvider
+
+def test_la_reproduccion_corta_en_su_fecha(replay):
+    replay.closes('AAA', [10.0, 11.0, 12.0, 13.0], start='2024-06-25')
+    frame = replay.provider.history('aaa', '2024-06-26')
+    assert frame.index.strftime('%Y-%m-%d').tolist() == ['2024-06-26', '2024-06-27', '2024-06-28']
+    assert frame['Close'].tolist() == [11.0, 12.0, 13.0]
+    # 2024-07-01 queda después del "hoy" simulado
+    assert replay.provider.today() == pd.Timestamp('2024-06-28').to_pydatetime()
+    assert replay.provider.history('AAA', '2024-07-01') is None
+    assert replay.provider.history('ZZZ', '2024-01-01') is None
+
+def test_cotizaciones_y_metadatos_por_defecto(replay):
+    replay.closes('AAA', [10.0, 12.5], start='2024-06-27')
+    replay.metadata({'aaa': 'Tech', 'BBB': {'sector': 'Salud', 'name': 'Bbb Inc', 'currency': 'USD'}})
+    assert replay.provider.bulk_quotes(['AAA', 'ZZZ']) == {
+        'AAA': {'price': 12.5, 'daily_change_pct': 25.0, 'daily_change_abs': 2.5},
+        'ZZZ': {'price': None, 'daily_change_pct': 0, 'daily_change_abs': 0}}
+    assert replay.provider.sector('AAA') == 'Tech'
+    assert replay.provider.sector('CCC') == 'N/A'
+    assert replay.provider.metadata('bbb') == {'sector': 'Salud', 'name': 'Bbb Inc', 'currency': 'USD',
+                                               'exchange': None}
+
+def test_grabar_y_reproducir(replay, tmp_path):
+    replay.closes('AAA', [1.0, 2.0, 3.0])
+    directory = str(tmp_path / 'grabado')
+    assert ReplayProvider.record(replay.provider, ['AAA', 'ZZZ'], '2024-01-02', directory) == ['AAA']
+    assert ReplayProvider(directory).history('AAA', '2024-01-01')['Close'].tolist() == [2.0, 3.0]
+
+def test_seleccion_del_proveedor(monkeypatch):
+    monkeypatch.setattr(providers, '_provider', None)
+    monkeypatch.setattr(providers, 'MARKET_DATA_PROVIDER', 'replay')
+    provider = providers.get_provider()
+    assert isinstance(provider, TrackedProvider) and provider.name == 'replay'
+    assert providers.get_provider() is provider
+
+    monkeypatch.setattr(providers, '_provider', None)
+    monkeypatch.setattr(providers, 'MARKET_DATA_PROVIDER', 'bloomberg')
+    with pytest.raises(ValueError, match="MARKET_DATA_PROVIDER desconocido"):
+        providers.get_provider()
+
+def test_las_cotizaciones_salen_del_proveedor_activo(replay):
+    replay.closes('AAA', [100.0] + [110.0] * 120 + [121.0])
+    before = UPSTREAM_CALLS.value(service='market_data', operation='bulk_history', target='bulk', status='ok')
+    quote = MarketData.get_quotes(['aaa'])[0]
+    assert quote['price'] == 121.0
+    assert quote['daily_change_pct'] == pytest.approx(10.0)
+    assert quote['ytd_change'] == pytest.approx(21.0)
+    assert UPSTREAM_CALLS.value(service='market_data', operation='bulk_history', target='bulk',
+                                status='ok') == before + 1
+    # Sustituir el proveedor cambia la fuente de las cotizaciones siguientes
+    other = ReplayProvider(replay.directory, as_of='2024-06-27')
+    providers.set_provider(other)
+    assert providers.get_provider().provider is other
@@ -0,0 +1,48 @@
+import json
+
+from utils import quote_stream
+from utils.quote_stream import QuoteBroadcaster
+
+def parse(chunk):
+    """``(evento, datos)`` de un bloque SSE"""
+    fields = dict(line.split(': ', 1) for line in chunk.strip().splitlines() if not line.startswith(('retry', ':')))
+    return fields['event'], json.loads(fields['data'])
+
+def test_publicar_solo_difunde_lo_que_cambia():
+    broadcaster = QuoteBroadcaster()
+    quote = {'price': 10.0, 'daily_change_pct': 1.0, 'daily_change_abs': 0.1, 'name': 'X'}
+    assert broadcaster.publish({'AAA': quote, 'BBB': dict(quote)}).keys() == {'AAA', 'BBB'}
+    assert broadcaster.publish({'AAA': dict(quote, name='Y')}) == {}
+    assert broadcaster.version == 1
+    assert broadcaster.publish({'AAA': dict(quote, price=11.0)}) == {
+        'AAA': {'price': 11.0, 'daily_change_pct': 1.0, 'daily_change_abs': 0.1}}
+    assert broadcaster.version == 2
+
+def test_el_suscriptor_recibe_saludo_y_deltas():
+    broadcaster = QuoteBroadcaster()
+    broadcaster.publish({'AAA': {'price': 1.0}})
+    stream = broadcaster.stream()
+    hello = next(stream)
+    assert hello.startswith(f"retry: {quote_stream.RECONNECT_DELAY_MS}\n")
+    assert parse(hello) == ('hello', {'version': 1, 'live': True})
+    assert broadcaster.subscribers() == 1
+    broadcaster.publish({'AAA': {'price': 2.0}})
+    event, data = parse(next(stream))
+    assert event == 'quotes'
+    assert data['version'] == 2
+    assert data['quotes']['AAA']['price'] == 2.0
+    stream.close()
+    assert broadcaster.subscribers() == 0
+
+def test_sin_novedades_envia_keep_alive(monkeypatch):
+    monkeypatch.setattr(quote_stream, 'HEARTBEAT_INTERVAL', 0.01)
+    stream = QuoteBroadcaster().stream()
+    next(stream)
+    assert next(stream) == ": keep-alive\n\n"
+    stream.close()
+
+def test_sin_refresco_se_cierra_tras_el_saludo():
+    broadcaster = QuoteBroadcaster()
+    chunks = list(broadcaster.stream(live=False))
+    assert [parse(chunk) for chunk in chunks] == [('hello', {'version': 0, 'live': False})]
+    assert broadcaster.subscribers() == 0
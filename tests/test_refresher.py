@@ -0,0 +1,48 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from utils import refresher as refresher_module
+from utils.market_data import MarketData, quote_cache
+from utils.quote_stream import QuoteBroadcaster
+from utils.refresher import QuoteRefresher
+from utils.ticker_metadata import get_ticker_metadata
+
+@pytest.fixture
+def refresher(db, replay, monkeypatch):
+    """Refresco sobre la base SQLite de los tests, con su propio difusor"""
+    monkeypatch.setattr(refresher_module, 'broadcaster', QuoteBroadcaster())
+    get_ticker_metadata().save('AAA', {'currency': 'EUR'})
+    replay.closes('AAA', [10.0, 11.0], start='2024-06-27')
+    db.add_accion('Aaa', 'AAA', 'Tech', 10.0, 3, '2024-06-26')
+    instance = QuoteRefresher(interval=60, closed_interval=900)
+    instance._db = db
+    yield instance
+    instance.stop()
+
+def test_horario_de_mercado():
+    refresher = QuoteRefresher(open_hour=8, close_hour=22)
+    assert refresher.is_market_open(datetime(2024, 6, 28, 9))
+    assert not refresher.is_market_open(datetime(2024, 6, 28, 22))
+    assert not refresher.is_market_open(datetime(2024, 6, 29, 12))
+
+def test_refresco_publica_en_cache_y_difusor(refresher):
+    assert refresher.refresh() == 1
+    assert refresher.last_count == 1 and refresher.last_refresh is not None
+    assert refresher_module.broadcaster.version == 1
+    assert refresher_module.broadcaster._snapshot['AAA']['price'] == 11.0
+    # TTL de dos ciclos en la caché de cotizaciones
+    _, expires_at = quote_cache._entries[('AAA', 'price')]
+    assert expires_at - time.monotonic() > 2 * refresher.interval - 5
+    assert MarketData._cached_quote('AAA', '2024-06-26')['price'] == 11.0
+
+def test_el_hilo_arranca_una_vez_y_se_detiene(refresher):
+    refresher.start()
+    thread = refresher._thread
+    refresher.start()
+    assert refresher._thread is thread and refresher.is_running()
+    refresher.stop()
+    thread.join(5)
+    assert not refresher.is_running()
+    assert refresher.last_count == 1
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import aio
+from utils.async_database import AsyncDatabase
+from utils.risk import (beta, correlation_matrix, daily_returns, max_drawdown, portfolio_closes, risk_metrics,
+                        MIN_PERIODS, RISK_COLUMNS, TRADING_DAYS)
+from pages import riesgo
+
+def closes_frame(data, start='2024-01-01'):
+    return pd.DataFrame(data, index=pd.bdate_range(start, periods=len(next(iter(data.values())))))
+
+def prices(returns, start=100.0):
+    return list(start * np.cumprod([1.0, *(1 + r for r in returns)]))
+
+def test_rentabilidades_con_huecos_y_maxima_caida():
+    closes = closes_frame({'AAA': [10.0, None, 11.0, 8.8, 12.0], 'BBB': [5.0, 5.0, 4.0, 3.0, 6.0]})
+    returns = daily_returns(closes)
+    # El festivo toma el último cierre: ese día 0 y el siguiente conserva la subida
+    assert returns['AAA'].tolist() == pytest.approx([0.0, 0.1, -0.2, 12.0 / 8.8 - 1])
+    assert max_drawdown(closes).to_dict() == pytest.approx({'AAA': -0.2, 'BBB': -0.4})
+
+def test_beta_frente_al_indice():
+    rng = np.random.default_rng(1)
+    market = rng.normal(0, 0.01, 60)
+    returns = pd.DataFrame({'DOBLE': 2 * market, 'CORTA': 2 * market}, index=pd.bdate_range('2024-01-01', periods=60))
+    returns.iloc[:60 - MIN_PERIODS + 1, 1] = np.nan
+    betas = beta(returns, pd.Series(market, index=returns.index))
+    assert betas['DOBLE'] == pytest.approx(2.0)
+    # Menos de MIN_PERIODS sesiones en común: sin beta
+    assert np.isnan(betas['CORTA'])
+
+def test_volatilidad_y_sharpe_anualizados():
+    daily = [0.01, -0.01] * 15
+    closes = closes_frame({'AAA': prices(daily), 'PLANO': [1.0] * 31})
+    metrics = risk_metrics(closes, risk_free=0.02)
+    assert metrics.columns.tolist() == RISK_COLUMNS
+    returns = pd.Series(daily)
+    volatility = returns.std() * np.sqrt(TRADING_DAYS)
+    assert metrics.loc['AAA', 'volatilidad'] == pytest.approx(volatility)
+    assert metrics.loc['AAA', 'sharpe'] == pytest.approx((returns.mean() * TRADING_DAYS - 0.02) / volatility)
+    # Sin índice no hay beta; sin volatilidad no hay Sharpe
+    assert metrics['beta'].isna().all()
+    assert np.isnan(metrics.loc['PLANO', 'sharpe'])
+    assert risk_metrics(pd.DataFrame()).empty
+
+def test_correlacion_y_valor_de_la_cartera():
+    rng = np.random.default_rng(2)
+    daily = rng.normal(0, 0.01, 30)
+    closes = closes_frame({'AAA': prices(daily), 'BBB': prices(-daily), 'CCC': [None] * 25 + prices(daily[:5])})
+    correlation = correlation_matrix(closes)
+    assert correlation.loc['AAA', 'BBB'] == pytest.approx(-1.0, abs=1e-3)
+    # CCC empezó a cotizar hace pocas sesiones: sin correlación
+    assert np.isnan(correlation.loc['AAA', 'CCC'])
+
+    closes = closes_frame({'AAA': [10.0, 11.0, 12.0], 'BBB': [None, 5.0, 6.0]})
+    # Antes de su primer cierre BBB vale ese primer cierre
+    assert portfolio_closes(closes, {'AAA': 2, 'BBB': 10, 'ZZZ': 1}).tolist() == [70.0, 72.0, 84.0]
+
+def test_informe_de_la_cartera(db, replay, monkeypatch):
+    monkeypatch.setattr(riesgo, 'adb', AsyncDatabase('sqlite'))
+    riesgo.risk_cache.clear()
+    rng = np.random.default_rng(3)
+    market = rng.normal(0, 0.01, 40)
+    start = str(pd.bdate_range(end='2024-06-28', periods=41)[0].date())
+    replay.metadata({'AAA': {'currency': 'EUR'}, 'BBB': {'currency': 'EUR'}, riesgo.RISK_BENCHMARK: {'currency': 'EUR'}})
+    replay.closes(riesgo.RISK_BENCHMARK, prices(market), start=start)
+    replay.closes('AAA', prices(2 * market), start=start)
+    replay.closes('BBB', prices(rng.normal(0, 0.01, 40)), start=start)
+    db.add_accion('Aaa', 'AAA', 'Tech', 100.0, 2, '2024-01-02')
+    db.add_fondo('Aaa', 'AAA', 'Tech', 100.0, 1, '2024-01-02')
+    db.add_accion('Bbb', 'BBB', 'Energía', 100.0, 3, '2024-01-02')
+
+    metrics, correlation = aio.run(riesgo.load_risk_report(aio.Budget()))
+    assert metrics.index.tolist() == ['AAA', 'BBB', 'Cartera']
+    assert metrics.loc['AAA', 'beta'] == pytest.approx(2.0, rel=1e-3)
+    assert correlation.index.tolist() == ['AAA', 'BBB']
+    assert len(riesgo.risk_cache._entries) == 1
+
+    # Sin cambios en la cartera sale de la caché, sin leer cierres
+    replay.closes('AAA', [1.0] * 41, start=start)
+    assert aio.run(riesgo.load_risk_report(aio.Budget()))[0] is metrics
+    riesgo.risk_cache.clear()
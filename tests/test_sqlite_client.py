@@ -0,0 +1,124 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import database
+from utils.sqlite_client import (SQLiteClient, AsyncSQLiteClient, get_async_sqlite_client,
+                                 get_sqlite_client)
+
+def fondo(ticker, cantidad=1.0, fecha='2024-01-01', **extra):
+    return {'nombre': f"Fondo {ticker}", 'ticker': ticker, 'tipo': 'RV', 'valor_compra': 10.0,
+            'cantidad': cantidad, 'fecha_compra': fecha, **extra}
+
+@pytest.fixture
+def client(tmp_path):
+    return SQLiteClient(str(tmp_path / 'test.db'))
+
+def test_insert_devuelve_las_filas_con_id(client):
+    rows = client.table('fondos').insert([fondo('A'), fondo('B')]).execute().data
+    assert [(r['id'], r['ticker']) for r in rows] == [(1, 'A'), (2, 'B')]
+    assert rows[0]['created_at']
+    assert client.table('fondos').insert(fondo('C')).execute().data[0]['id'] == 3
+
+def test_select_con_filtros_orden_y_rango(client):
+    client.table('fondos').insert([fondo(t, c) for t, c in [('A', 3), ('B', 1), ('C', 2), ('D', 5)]]).execute()
+    table = lambda: client.table('fondos')
+    assert [r['ticker'] for r in table().select('ticker').gt('cantidad', 1).order('cantidad', desc=True)
+            .execute().data] == ['D', 'A', 'C']
+    assert [r['ticker'] for r in table().select('*').order('cantidad').range(1, 2).execute().data] == ['C', 'A']
+    assert [r['ticker'] for r in table().select('*').order('id').offset(3).execute().data] == ['D']
+    assert [r['ticker'] for r in table().select('*').order('id').limit(2).offset(1).execute().data] == ['B', 'C']
+    assert [r['ticker'] for r in table().select('*').in_('ticker', ['B', 'D']).execute().data] == ['B', 'D']
+    assert table().select('*').in_('ticker', []).execute().data == []
+    assert [r['ticker'] for r in table().select('*').ilike('nombre', '%fondo c%').execute().data] == ['C']
+    response = table().select('id', count='exact').lte('cantidad', 3).range(0, 0).execute()
+    assert response.count == 3 and len(response.data) == 1
+    assert list(response.data[0]) == ['id']
+
+def test_orden_con_nulos_como_postgres(client):
+    for ticker, sector in [('A', 'b'), ('B', None), ('C', 'a')]:
+        client.table('posiciones').insert({'tabla': 'acciones', 'ticker': ticker, 'sector': sector}).execute()
+    asc = client.table('posiciones').select('*').order('sector').execute().data
+    desc = client.table('posiciones').select('*').order('sector', desc=True).execute().data
+    assert [r['ticker'] for r in asc] == ['C', 'A', 'B']
+    assert [r['ticker'] for r in desc] == ['B', 'A', 'C']
+
+def test_update_y_delete_devuelven_las_filas(client):
+    client.table('fondos').insert([fondo('A'), fondo('B'), fondo('A')]).execute()
+    updated = client.table('fondos').update({'cantidad': 9.0}).eq('ticker', 'A').execute().data
+    assert [(r['id'], r['cantidad']) for r in updated] == [(1, 9.0), (3, 9.0)]
+    assert client.table('fondos').update({'cantidad': 1.0}).eq('id', 99).execute().data == []
+    deleted = client.table('fondos').delete().neq('ticker', 'A').execute().data
+    assert [r['ticker'] for r in deleted] == ['B']
+    assert len(client.table('fondos').select('*').execute().data) == 2
+
+def test_upsert_por_id(client):
+    client.table('fondos').insert(fondo('A')).execute()
+    rows = client.table('fondos').upsert([{'id': 1, **fondo('A', 7.0)}, fondo('B')]).execute().data
+    assert [(r['id'], r['ticker'], r['cantidad']) for r in rows] == [(1, 'A', 7.0), (2, 'B', 1.0)]
+
+def test_upsert_por_clave_natural(client):
+    purchase = {'tabla': 'fondos', 'ticker': 'A', 'tipo': 'compra', 'cantidad': 1.0, 'precio': 10.0,
+                'fecha': '2024-01-01', 'lote_id': 5}
+    first = client.table('movimientos').upsert(purchase, on_conflict='tabla,lote_id').execute().data[0]
+    again = client.table('movimientos').upsert({**purchase, 'cantidad': 2.0},
+                                               on_conflict='tabla, lote_id').execute().data[0]
+    assert again['id'] == first['id'] and again['cantidad'] == 2.0
+    # El mismo lote_id en otra tabla es otro lote
+    other = client.table('movimientos').upsert({**purchase, 'tabla': 'acciones'},
+                                               on_conflict='tabla,lote_id').execute().data[0]
+    assert other['id'] != first['id']
+    # Los movimientos manuales (sin lote) no chocan entre sí
+    manual = {**purchase, 'lote_id': None}
+    client.table('movimientos').insert([manual, manual]).execute()
+    assert len(client.table('movimientos').select('*').execute().data) == 4
+
+def test_las_claves_naturales_son_unicas(client):
+    client.table('posiciones').insert({'tabla': 'fondos', 'ticker': 'A'}).execute()
+    with pytest.raises(sqlite3.IntegrityError):
+        client.table('posiciones').insert({'tabla': 'fondos', 'ticker': 'A'}).execute()
+    client.table('posiciones').insert({'tabla': 'acciones', 'ticker': 'A'}).execute()
+
+def test_tablas_y_columnas_desconocidas(client):
+    with pytest.raises(ValueError):
+        client.table('usuarios')
+    with pytest.raises(ValueError):
+        client.table('fondos').select('password')
+    with pytest.raises(ValueError):
+        client.table('fondos').eq('nombre; DROP TABLE fondos', 1)
+    with pytest.raises(ValueError):
+        client.table('movimientos').upsert([], on_conflict='tabla,nada')
+
+def test_cliente_asincrono(tmp_path):
+    client = AsyncSQLiteClient(str(tmp_path / 'test.db'))
+
+    async def run():
+        await client.table('fondos').insert(fondo('A')).execute()
+        return await client.table('fondos').select('*').execute()
+
+    assert [r['ticker'] for r in asyncio.run(run()).data] == ['A']
+
+def test_un_cliente_por_ruta(tmp_path):
+    path = str(tmp_path / 'compartida.db')
+    assert get_sqlite_client(path) is get_sqlite_client(path)
+    assert get_async_sqlite_client(path) is not get_sqlite_client(path)
+    assert isinstance(get_async_sqlite_client(path), AsyncSQLiteClient)
+    assert get_sqlite_client(str(tmp_path / 'otra.db')) is not get_sqlite_client(path)
+
+def test_seleccion_del_almacenamiento(sqlite_backend, monkeypatch):
+    assert database.get_db_client('sqlite') is sqlite_backend
+    monkeypatch.setattr(database, 'DB_BACKEND', 'sqlite')
+    assert database.Database().client is sqlite_backend
+    with pytest.raises(ValueError, match="DB_BACKEND desconocido"):
+        database.get_db_client('mysql')
+
+def test_escrituras_concurrentes(client):
+    def insert(index):
+        return client.table('fondos').insert(fondo(f"T{index}")).execute().data[0]['id']
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(insert, range(40)))
+    assert sorted(ids) == list(range(1, 41))
+    assert len(client.table('fondos').select('id').execute().data) == 40
@@ -0,0 +1,44 @@
+import httpx
+import pytest
+
+from utils import supabase_client
+
+@pytest.fixture
+def credentials(monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", "https://ejemplo.supabase.co")
+    monkeypatch.setenv("SUPABASE_KEY", "cabecera.carga.firma")
+    monkeypatch.setattr(supabase_client, '_clients', {})
+    monkeypatch.setattr(supabase_client, '_async_clients', {})
+
+@pytest.fixture
+def sessions(monkeypatch):
+    """Sesiones HTTP abiertas durante el test"""
+    opened = []
+    for cls in (httpx.Client, httpx.AsyncClient):
+        init = cls.__init__
+
+        def track(self, *args, _init=init, **kwargs):
+            _init(self, *args, **kwargs)
+            opened.append(self)
+        monkeypatch.setattr(cls, '__init__', track)
+    return opened
+
+def pool(session):
+    return session._transport._pool
+
+def test_cliente_sincrono_compartido_con_pool(credentials, sessions):
+    client = supabase_client.get_supabase_client()
+    assert supabase_client.get_supabase_client() is client
+    session = client.postgrest.session
+    assert pool(session)._max_connections == supabase_client.POOL_LIMITS.max_connections
+    # Ninguna sesión sin pool queda abierta por detrás
+    postgrest_sessions = [s for s in sessions if '/rest/v1' in str(s.base_url)]
+    assert postgrest_sessions == [session]
+
+def test_cliente_asincrono_compartido_con_pool(credentials, sessions):
+    client = supabase_client.get_async_postgrest_client()
+    assert supabase_client.get_async_postgrest_client() is client
+    assert sessions == [client.session]
+    assert pool(client.session)._max_keepalive_connections == supabase_client.POOL_LIMITS.max_keepalive_connections
+    assert str(client.session.base_url) == "https://ejemplo.supabase.co/rest/v1/"
+    assert client.session.headers["apiKey"] == "cabecera.carga.firma"
@@ -0,0 +1,25 @@
+from dash import Patch, no_update
+
+from utils.table_patch import is_patch, patch_rows
+
+ROWS = [{'id': 1, 'precio': 10.0, 'ganancia': 5.0}, {'id': 2, 'precio': 20.0, 'ganancia': -1.0}]
+
+def operations(patch):
+    return [(op['location'], op['params']['value']) for op in patch.to_plotly_json()['operations']]
+
+def test_solo_las_celdas_que_cambian():
+    rows = [{'id': 1, 'precio': 10.0, 'ganancia': 5.0}, {'id': 2, 'precio': 21.0, 'ganancia': 0.0}]
+    patch = patch_rows(ROWS, rows)
+    assert isinstance(patch, Patch) and is_patch(patch)
+    assert operations(patch) == [([1, 'precio'], 21.0), ([1, 'ganancia'], 0.0)]
+
+def test_sin_cambios_no_actualiza():
+    assert patch_rows(ROWS, [dict(row) for row in ROWS]) is no_update
+    assert is_patch(no_update)
+
+def test_otra_estructura_envia_las_filas():
+    for rows in ([ROWS[1], ROWS[0]], ROWS[:1], ROWS + [{'id': 3}]):
+        assert patch_rows(ROWS, rows) is rows
+        assert not is_patch(rows)
+    # Primera carga: el navegador aún no tiene filas
+    assert patch_rows(None, ROWS) is ROWS
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from utils.table_query import parse_filter_query, filter_frame
+
+def test_operadores_y_valores():
+    assert parse_filter_query('{Cantidad} > 10 && {Ticker} s= "AAPL" && {Tipo} ne RF') == [
+        ('Cantidad', 'gt', 10.0), ('Ticker', 'eq', 'AAPL'), ('Tipo', 'neq', 'RF')]
+    assert parse_filter_query('{Ganancia} <= -5.5') == [('Ganancia', 'lte', -5.5)]
+    assert parse_filter_query("{Nombre} eq 'O\\'Neil'") == [('Nombre', 'eq', "O'Neil")]
+
+def test_contains_es_ilike():
+    assert parse_filter_query('{Nombre} icontains vanguard') == [('Nombre', 'ilike', '%vanguard%')]
+
+def test_datestartswith_es_un_rango():
+    assert parse_filter_query('{Fecha Compra} datestartswith 2024') == [
+        ('Fecha Compra', 'gte', '2024-01-01'), ('Fecha Compra', 'lt', '2025-01-01')]
+    assert parse_filter_query('{Fecha Compra} datestartswith 2024-12') == [
+        ('Fecha Compra', 'gte', '2024-12-01'), ('Fecha Compra', 'lt', '2025-01-01')]
+    assert parse_filter_query('{Fecha Compra} datestartswith "2024-02-29"') == [
+        ('Fecha Compra', 'gte', '2024-02-29'), ('Fecha Compra', 'lt', '2024-03-01')]
+    assert parse_filter_query('{Fecha Compra} datestartswith abc') == []
+
+def test_ignora_lo_que_no_entiende():
+    assert parse_filter_query(None) == []
+    assert parse_filter_query('') == []
+    assert parse_filter_query('{Cantidad} between 1 && {Cantidad} >= 2') == [('Cantidad', 'gte', 2.0)]
+
+def test_filter_frame_aplica_solo_filtros_numericos():
+    df = pd.DataFrame({'Ticker': ['A', 'B', 'C', 'D'], 'valor': [1.0, 5.0, None, '7']})
+    filters = [('valor', 'gte', 2.0), ('Ticker', 'eq', 'B'), ('Ticker', 'ilike', '%x%'),
+               ('Ticker', 'in', ['A'])]
+    assert filter_frame(df, filters)['Ticker'].tolist() == ['B', 'D']
+    assert filter_frame(df, [('valor', 'neq', 5.0)])['Ticker'].tolist() == ['A', 'D']
+    assert len(filter_frame(df, [])) == 4
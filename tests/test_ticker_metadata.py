@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from utils import ticker_metadata
+from utils.ticker_metadata import TickerMetadata
+
+@pytest.fixture
+def metadata(replay, tmp_path):
+    cache = TickerMetadata(str(tmp_path / 'metadata.db'))
+    yield cache
+    cache._executor.shutdown(wait=True)
+
+def calls(replay):
+    """Tickers pedidos al proveedor, en orden"""
+    requested = []
+    metadata = replay.provider.metadata
+    replay.provider.metadata = lambda ticker: requested.append(ticker) or metadata(ticker)
+    return requested
+
+def settle(metadata):
+    """Espera a las descargas en segundo plano (las terminadas ya están guardadas)"""
+    for future in list(metadata._pending.values()):
+        future.result(5)
+
+def test_lookup_descarga_y_persiste(replay, metadata, tmp_path):
+    replay.metadata({'AAA': {'sector': 'Tech', 'name': 'Aaa Inc', 'currency': 'USD', 'exchange': 'NMS'}})
+    requested = calls(replay)
+    assert metadata.lookup(' aaa ') == {'sector': 'Tech', 'name': 'Aaa Inc', 'currency': 'USD', 'exchange': 'NMS'}
+    assert metadata.lookup('AAA')['currency'] == 'USD'
+    assert metadata.lookup('') is None
+    assert requested == ['AAA']
+    # Otro proceso lo lee de SQLite sin pedirlo
+    assert TickerMetadata(metadata.path).cached(['aaa'])['AAA']['sector'] == 'Tech'
+    assert requested == ['AAA']
+
+def test_cached_no_espera_y_encarga_lo_que_falta(replay, metadata):
+    replay.metadata({'AAA': {'sector': 'Tech'}})
+    requested = calls(replay)
+    assert metadata.cached(['AAA', None]) == {}
+    settle(metadata)
+    assert metadata.cached(['AAA'])['AAA']['sector'] == 'Tech'
+    assert requested == ['AAA']
+
+def test_lo_caducado_se_sirve_y_se_refresca(replay, metadata):
+    metadata.save('AAA', {'sector': 'Antiguo'})
+    replay.metadata({'AAA': {'sector': 'Nuevo'}})
+    metadata.ttl = 0
+    time.sleep(0.01)
+    assert metadata.cached(['AAA'])['AAA']['sector'] == 'Antiguo'
+    settle(metadata)
+    assert metadata.cached(['AAA'])['AAA']['sector'] == 'Nuevo'
+
+def test_espera_exponencial_tras_un_fallo(replay, metadata, monkeypatch, capsys):
+    monkeypatch.setattr(ticker_metadata, 'METADATA_RETRY', 60)
+    requested = []
+
+    def failing(ticker):
+        requested.append(ticker)
+        raise RuntimeError("sin conexión")
+    replay.provider.metadata = failing
+
+    assert metadata.lookup('AAA') is None
+    assert "Error al obtener los metadatos de AAA (se reintenta en 60 s)" in capsys.readouterr().out
+    assert metadata.lookup('AAA') is None
+    assert metadata.cached(['AAA']) == {}
+    assert requested == ['AAA']
+
+    # Pasada la espera se reintenta y un segundo fallo la duplica
+    metadata._failures['AAA'] = (1, 0)
+    assert metadata.lookup('AAA') is None
+    assert requested == ['AAA', 'AAA']
+    assert metadata._failures['AAA'][0] == 2
+    assert "se reintenta en 120 s" in capsys.readouterr().out
+
+    # Un guardado correcto olvida los fallos
+    metadata.save('AAA', {'sector': 'Tech'})
+    assert 'AAA' not in metadata._failures
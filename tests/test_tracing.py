@@ -0,0 +1,82 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import dash
+import pytest
+from dash import html, dcc, Input, Output
+
+from utils import tracing
+from utils.tracing import start_trace, span, wrap
+
+def by_name(trace):
+    return {s['name']: s for s in trace.spans}
+
+def test_sin_traza_los_spans_no_hacen_nada():
+    with span('suelto') as record:
+        assert record is None
+
+def test_spans_anidados_en_hilos_y_tareas():
+    def worker():
+        with span('hilo.trabajo', n=1):
+            pass
+
+    async def task():
+        with span('tarea'):
+            await asyncio.to_thread(worker)
+
+    with start_trace('callback.prueba') as trace:
+        with span('db.select', target='fondos'):
+            with ThreadPoolExecutor(1) as pool:
+                pool.submit(wrap(worker)).result()
+        asyncio.run(task())
+        with pytest.raises(ValueError):
+            with span('falla'):
+                raise ValueError("mal")
+
+    spans = by_name(trace)
+    root = spans['callback.prueba']
+    assert spans['db.select']['parent'] == root['id']
+    assert spans['db.select']['attrs'] == {'target': 'fondos'}
+    assert spans['tarea']['parent'] == root['id']
+    assert spans['falla']['attrs']['error'] == "ValueError: mal"
+    workers = [s for s in trace.spans if s['name'] == 'hilo.trabajo']
+    assert sorted(s['parent'] for s in workers) == sorted([spans['db.select']['id'], spans['tarea']['id']])
+    assert all(s['end'] >= s['start'] for s in trace.spans)
+    assert trace.duration_ms() > 0
+
+def test_exportacion_chrome(tmp_path):
+    with start_trace('callback.exportar') as trace:
+        with span('market_data.history', ticker='AAA'):
+            pass
+    data = json.loads(open(trace.export(str(tmp_path / 'trazas' / 't.json'))).read())
+    events = [e for e in data['traceEvents'] if e['ph'] == 'X']
+    assert [e['name'] for e in events] == ['callback.exportar', 'market_data.history']
+    assert events[1]['cat'] == 'market_data'
+    assert events[1]['args']['ticker'] == 'AAA'
+    assert events[1]['args']['parent_id'] == events[0]['args']['span_id']
+    lanes = [e for e in data['traceEvents'] if e['ph'] == 'M']
+    assert lanes[0]['args']['name'] == threading.current_thread().name
+    assert data['otherData']['name'] == 'callback.exportar'
+
+def test_una_traza_por_callback(tmp_path):
+    app = dash.Dash(__name__)
+    app.layout = html.Div([dcc.Input(id='entrada'), html.Div(id='salida')])
+
+    @app.callback(Output('salida', 'children'), Input('entrada', 'value'))
+    def eco_trazas(value):
+        with span('trabajo'):
+            return value
+
+    tracing.instrument_dash(app, str(tmp_path))
+    client = app.server.test_client()
+    client.get('/')
+    assert list(tmp_path.iterdir()) == []
+    client.post('/_dash-update-component', json={
+        'output': 'salida.children', 'outputs': {'id': 'salida', 'property': 'children'},
+        'inputs': [{'id': 'entrada', 'property': 'value', 'value': 'x'}], 'changedPropIds': ['entrada.value']})
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1 and files[0].name.endswith('-callback.eco_trazas.json')
+    names = [e['name'] for e in json.loads(files[0].read_text())['traceEvents'] if e['ph'] == 'X']
+    assert names == ['callback.eco_trazas', 'trabajo']
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import threading
+import time
+
+# Tiempo total (s) que un callback puede esperar a Supabase y a Yahoo Finance
+CALLBACK_BUDGET = float(os.environ.get("CALLBACK_TIMEOUT_BUDGET", 8))
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def get_event_loop():
+    """Bucle de eventos del proceso, en un hilo propio (se crea al primer uso)
+
+    Los clientes HTTP asíncronos se abren siempre en este bucle, así sus
+    conexiones se reutilizan entre callbacks.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="aio-loop", daemon=True).start()
+    return _loop
+
+def run(coro, timeout=None):
+    """Ejecuta una corrutina en el bucle compartido y espera su resultado
+
+    Con ``timeout`` (s) se cancela la corrutina si no termina a tiempo y se
+    lanza ``TimeoutError``.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+class Budget:
+    """Plazo común para todas las esperas de un callback"""
+
+    def __init__(self, seconds=None):
+        self.seconds = CALLBACK_BUDGET if seconds is None else seconds
+        self.deadline = time.monotonic() + self.seconds
+
+    def remaining(self):
+        """Segundos que quedan del plazo (nunca negativo)"""
+        return max(0.0, self.deadline - time.monotonic())
+
+    async def gather(self, *aws, default=None):
+        """Espera varias corrutinas a la vez dentro del plazo restante
+
+        Devuelve los resultados en orden; las que fallan o no terminan a
+        tiempo (se cancelan) devuelven ``default``.
+        """
+        tasks = [asyncio.ensure_future(aw) for aw in aws]
+        if not tasks:
+            return []
+        done, pending = await asyncio.wait(tasks, timeout=self.remaining())
+        for task in pending:
+            task.cancel()
+
+        results = []
+        for task in tasks:
+            if task in done and task.exception() is None:
+                results.append(task.result())
+            else:
+                if task in done:
+                    print(f"Error en la carga asíncrona: {task.exception()}")
+                results.append(default)
+        return results
+
+    async def wait(self, aw, default=None):
+        """Espera una sola corrutina dentro del plazo restante"""
+        return (await self.gather(aw, default=default))[0]
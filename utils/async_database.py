@@ -0,0 +1,277 @@
+import asyncio
+from utils.cache import MISSING
+from utils.metrics import track
+from utils.database import (Database, get_async_db_client, holdings_cache, BATCH_SIZE,
+                            _query_rows, _select_request, _count_request,
+                            _fondo_data, _accion_data, _movement_filters, _ledger_synced, LEDGER_TABLES, EPSILON)
+
+# Lecturas de tablas completas en curso: {tabla: tarea}
+_pending_reads = {}
+
+async def _execute(request, table, operation):
+    """Ejecuta una petición asíncrona registrando su latencia y resultado"""
+    with track('database', operation, table):
+        return await request.execute()
+
+class AsyncDatabase:
+    """Variante asíncrona de ``Database`` (misma caché y misma semántica)
+
+    Sus métodos son corrutinas y deben ejecutarse en el bucle de ``utils.aio``.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._client = None
+
+    @property
+    def client(self):
+        """Cliente asíncrono del almacenamiento, creado al primer uso"""
+        if self._client is None:
+            self._client = get_async_db_client(self.backend)
+        return self._client
+
+    # ============== CACHÉ ==============
+
+    async def _get_table(self, table):
+        """Lee una tabla completa pasando por la caché
+
+        Las consultas simultáneas sobre una tabla sin cachear comparten una
+        sola lectura.
+        """
+        rows = holdings_cache.get(table)
+        if rows is MISSING:
+            task = _pending_reads.get(table)
+            if task is None:
+                task = asyncio.ensure_future(self._read_table(table))
+                _pending_reads[table] = task
+                task.add_done_callback(lambda _: _pending_reads.pop(table, None))
+            # Si se cancela quien espera, la lectura sigue para los demás
+            rows = await asyncio.shield(task)
+        return [dict(row) for row in rows]
+
+    async def _read_table(self, table):
+        response = await _execute(self.client.table(table).select('*').order('id'), table, 'select')
+        rows = response.data if response.data else []
+        holdings_cache.set(table, rows)
+        return rows
+
+    # ============== CONSULTAS ==============
+
+    async def query(self, table, columns=None, filters=None, order_by='id', descending=False,
+                    offset=None, limit=None):
+        """Consulta con proyección de columnas, filtros y paginación (ver ``Database.query``)"""
+        if not filters and offset is None and limit is None:
+            return _query_rows(await self._get_table(table), columns, None, order_by, descending)
+        response = await _execute(_select_request(self.client.table(table), columns, filters, order_by,
+                                                  descending, offset, limit), table, 'select')
+        return response.data or []
+
+    async def count(self, table, filters=None):
+        """Número de filas que cumplen los filtros (ver ``Database.count``)"""
+        cached = holdings_cache.get(table)
+        if not filters and cached is not MISSING:
+            return len(cached)
+        return (await _execute(_count_request(self.client.table(table), filters), table, 'count')).count or 0
+
+    async def insert_many(self, table, rows, chunk_size=None, upsert=False, on_conflict=''):
+        """Inserta (o actualiza con ``upsert``) muchas filas en bloques de ``chunk_size`` (ver ``Database.insert_many``)"""
+        if upsert and table in LEDGER_TABLES and on_conflict in ('', 'id'):
+            # Los lotes actualizados se comprueban contra el libro bajo su cerrojo, en un hilo
+            return await asyncio.to_thread(Database(self.backend).insert_many, table, rows, chunk_size,
+                                           upsert, on_conflict)
+        chunk_size = chunk_size or BATCH_SIZE
+        written = []
+        try:
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                request = self.client.table(table)
+                request = request.upsert(chunk, on_conflict=on_conflict) if upsert else request.insert(chunk)
+                response = await _execute(request, table, 'upsert' if upsert else 'insert')
+                written.extend(response.data or [])
+        except Exception as e:
+            print(f"Error en la escritura por lotes en {table}: {e}")
+
+        if written:
+            Database._cache_upsert(table, *written)
+            await self._lots_written(table, written)
+        return written
+
+    async def _lots_written(self, table, rows):
+        """Lleva al libro las compras de los lotes escritos (ver ``Database.sync_lots``)
+
+        La reconciliación usa el cliente síncrono en un hilo aparte.
+        """
+        if table in LEDGER_TABLES and rows:
+            await asyncio.to_thread(Database(self.backend)._lots_written, table, rows)
+
+    async def _insert(self, table, data):
+        response = await _execute(self.client.table(table).insert(data), table, 'insert')
+        if not response.data:
+            return None
+        Database._cache_upsert(table, response.data[0])
+        await self._lots_written(table, response.data)
+        return response.data[0]
+
+    async def _check_lot(self, table, id, data=None):
+        """Comprueba el cambio de un lote contra el libro (ver ``Database.check_lot``) en un hilo"""
+        if table in LEDGER_TABLES:
+            await asyncio.to_thread(Database(self.backend).check_lot, table, id, data)
+
+    async def _update(self, table, id, data):
+        await self._check_lot(table, id, data)
+        response = await _execute(self.client.table(table).update(data).eq('id', id), table, 'update')
+        if not response.data:
+            holdings_cache.delete(table)
+            return False
+        Database._cache_upsert(table, response.data[0])
+        await self._lots_written(table, response.data)
+        return True
+
+    async def _delete(self, table, id):
+        await self._check_lot(table, id)
+        await _execute(self.client.table(table).delete().eq('id', id), table, 'delete')
+        Database._cache_delete(table, id)
+        await self._lots_written(table, [{'id': id}])
+        return True
+
+    # ============== FONDOS ==============
+
+    async def get_fondos(self, columns=None, filters=None, order_by='id', descending=False,
+                         offset=None, limit=None):
+        """Obtiene todos los fondos (o una proyección/página, ver ``query``)"""
+        try:
+            return await self.query('fondos', columns, filters, order_by, descending, offset, limit)
+        except Exception as e:
+            print(f"Error al obtener fondos: {e}")
+            return []
+
+    async def count_fondos(self, filters=None):
+        """Cuenta los fondos"""
+        try:
+            return await self.count('fondos', filters)
+        except Exception as e:
+            print(f"Error al contar fondos: {e}")
+            return 0
+
+    async def add_fondo(self, nombre, ticker, tipo, valor_compra, cantidad, fecha_compra):
+        """Añade un nuevo fondo"""
+        try:
+            return await self._insert('fondos', _fondo_data(nombre, ticker, tipo, valor_compra,
+                                                            cantidad, fecha_compra))
+        except Exception as e:
+            print(f"Error al añadir fondo: {e}")
+            return None
+
+    async def update_fondo(self, id, nombre, ticker, tipo, valor_compra, cantidad, fecha_compra):
+        """Actualiza un fondo existente (``ValueError`` si deja el libro sin cuadrar, ver ``Database.check_lot``)"""
+        try:
+            return await self._update('fondos', id, _fondo_data(nombre, ticker, tipo, valor_compra,
+                                                                cantidad, fecha_compra))
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Error al actualizar fondo: {e}")
+            holdings_cache.delete('fondos')
+            return False
+
+    async def delete_fondo(self, id):
+        """Elimina un fondo (``ValueError`` si deja el libro sin cuadrar, ver ``Database.check_lot``)"""
+        try:
+            return await self._delete('fondos', id)
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Error al eliminar fondo: {e}")
+            holdings_cache.delete('fondos')
+            return False
+
+    # ============== ACCIONES ==============
+
+    async def get_acciones(self, columns=None, filters=None, order_by='id', descending=False,
+                           offset=None, limit=None):
+        """Obtiene todas las acciones (o una proyección/página, ver ``query``)"""
+        try:
+            return await self.query('acciones', columns, filters, order_by, descending, offset, limit)
+        except Exception as e:
+            print(f"Error al obtener acciones: {e}")
+            return []
+
+    async def count_acciones(self, filters=None):
+        """Cuenta las acciones"""
+        try:
+            return await self.count('acciones', filters)
+        except Exception as e:
+            print(f"Error al contar acciones: {e}")
+            return 0
+
+    async def add_accion(self, nombre, ticker, sector, precio_compra, num_acciones, fecha_compra):
+        """Añade una nueva acción"""
+        try:
+            return await self._insert('acciones', _accion_data(nombre, ticker, sector, precio_compra,
+                                                               num_acciones, fecha_compra))
+        except Exception as e:
+            print(f"Error al añadir acción: {e}")
+            return None
+
+    async def update_accion(self, id, nombre, ticker, sector, precio_compra, num_acciones, fecha_compra):
+        """Actualiza una acción existente (``ValueError`` si deja el libro sin cuadrar, ver ``Database.check_lot``)"""
+        try:
+            return await self._update('acciones', id, _accion_data(nombre, ticker, sector, precio_compra,
+                                                                   num_acciones, fecha_compra))
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Error al actualizar acción: {e}")
+            holdings_cache.delete('acciones')
+            return False
+
+    async def delete_accion(self, id):
+        """Elimina una acción (``ValueError`` si deja el libro sin cuadrar, ver ``Database.check_lot``)"""
+        try:
+            return await self._delete('acciones', id)
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Error al eliminar acción: {e}")
+            holdings_cache.delete('acciones')
+            return False
+
+    # ============== LIBRO DE MOVIMIENTOS ==============
+
+    async def _ensure_ledger(self, *tablas):
+        """Reconciliación inicial de los lotes con el libro (ver ``Database._ensure_ledger``) en un hilo
+
+        Devuelve False si el libro de alguna de ``tablas`` no está disponible.
+        """
+        for tabla in tablas:
+            if tabla in _ledger_synced:
+                continue
+            if not await asyncio.to_thread(Database(self.backend)._ensure_ledger, tabla):
+                return False
+        return True
+
+    async def get_movimientos(self, tabla=None, ticker=None):
+        """Movimientos del libro, por fecha (ver ``Database.get_movimientos``)"""
+        tablas = [tabla] if tabla else LEDGER_TABLES
+        rows = None
+        try:
+            if await self._ensure_ledger(*tablas):
+                rows = await self._get_table('movimientos')
+        except Exception as e:
+            print(f"Error al obtener movimientos: {e}")
+        if rows is None:
+            rows = await asyncio.to_thread(Database(self.backend)._movements_from_lots, tablas)
+        return _query_rows(rows, filters=_movement_filters(tabla, ticker), order_by='fecha')
+
+    async def get_posiciones(self, tabla, abiertas=True):
+        """Posiciones materializadas de una tabla (ver ``Database.get_posiciones``)"""
+        rows = None
+        try:
+            if await self._ensure_ledger(tabla):
+                rows = _query_rows(await self._get_table('posiciones'), filters=[('tabla', 'eq', tabla)],
+                                   order_by='ticker')
+        except Exception as e:
+            print(f"Error al obtener posiciones de {tabla}: {e}")
+        if rows is None:
+            rows = await asyncio.to_thread(Database(self.backend)._positions_from_lots, tabla)
+        return [row for row in rows if row['cantidad'] > EPSILON] if abiertas else rows
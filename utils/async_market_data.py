@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta
+import pandas as pd
+from utils.cache import MISSING
+from utils.history_store import get_history_store, get_closes_cache
+from utils.market_data import MarketData, HISTORY_MARGIN_DAYS, MAX_WORKERS
+from utils.providers import get_provider
+from utils.tracing import span
+from utils.fx import convert_quotes, ticker_currencies, fx_pairs, convert_closes
+
+class AsyncMarketData:
+    """Variante asíncrona de las cotizaciones e histórico de ``MarketData``
+
+    Comparte la caché de cotizaciones y el histórico local. Las descargas son
+    en bloque, como en ``MarketData``; los tickers que falten van al
+    ``history_async`` del proveedor activo (con Yahoo, su API de gráficos con
+    ``httpx``), como mucho ``MAX_WORKERS`` peticiones simultáneas.
+    """
+
+    @staticmethod
+    async def get_quotes(tickers, purchase_dates=None, refresh=False, ttl=None):
+        """Precio, cambio diario y YTD de varios tickers (ver ``MarketData.get_quotes``)"""
+        tickers = [str(ticker).upper() for ticker in tickers]
+        if purchase_dates is None:
+            purchase_dates = [None] * len(tickers)
+        if not tickers:
+            return []
+
+        start_of_year = datetime(get_provider().today().year, 1, 1)
+        keys = [
+            (ticker, MarketData._ytd_start(purchase_date, start_of_year).strftime('%Y-%m-%d'))
+            for ticker, purchase_date in zip(tickers, purchase_dates)
+        ]
+
+        quotes = {}
+        for key in ([] if refresh else set(keys)):
+            quote = MarketData._cached_quote(*key)
+            if quote is not None:
+                quotes[key] = quote
+        pending = [key for key in set(keys) if key not in quotes]
+
+        if pending:
+            with span('market_data.get_quotes', tickers=len({t for t, _ in pending}), cached=len(quotes)):
+                closes = await AsyncMarketData.get_history(
+                    sorted({ticker for ticker, _ in pending}),
+                    start_of_year - timedelta(days=HISTORY_MARGIN_DAYS)
+                )
+            for ticker, ytd_start in pending:
+                series = closes[ticker].dropna() if ticker in closes.columns else None
+                quote = MarketData._quote_from_closes(series, ytd_start)
+                MarketData._store_quote(ticker, ytd_start, quote, ttl)
+                quotes[(ticker, ytd_start)] = quote
+
+        # El cambio de divisa puede descargar tipos: fuera del bucle de eventos
+        return await asyncio.to_thread(convert_quotes, tickers, [dict(quotes[key]) for key in keys])
+
+    @staticmethod
+    async def get_history(tickers, start):
+        """Cierres diarios desde ``start`` (índice fecha, una columna por ticker)"""
+        tickers = [str(ticker).upper() for ticker in tickers]
+        await AsyncMarketData.sync_history(tickers, start)
+        with span('history_store.get_closes', tickers=len(tickers)):
+            return await asyncio.to_thread(get_history_store().get_closes, tickers, start)
+
+    @staticmethod
+    async def get_base_history(tickers, start, budget):
+        """Cierres en la divisa base desde ``start`` e indicador de si están al día
+
+        Para series largas de muchos tickers: sincroniza el histórico local
+        dentro de ``budget`` con descargas en bloque (solo las barras nuevas)
+        y lee de la matriz de cierres en memoria. Si no da tiempo se usa lo
+        ya guardado; la sincronización sigue en segundo plano y queda para
+        la siguiente carga.
+        """
+        tickers = [str(ticker).upper() for ticker in tickers]
+        currencies = dict(zip(tickers, await asyncio.to_thread(ticker_currencies, tickers)))
+        pairs = sorted(set(fx_pairs(currencies.values()).values()))
+        synced = await budget.wait(asyncio.to_thread(MarketData.sync_history, tickers + pairs, start),
+                                   default=MISSING) is not MISSING
+        with span('history_store.get_closes', tickers=len(tickers) + len(pairs)):
+            closes = await asyncio.to_thread(get_closes_cache().get_closes, tickers + pairs, start)
+        return convert_closes(closes.reindex(columns=tickers), currencies, closes), synced
+
+    @staticmethod
+    async def sync_history(tickers, start):
+        """Trae al histórico local las barras que faltan (ver ``MarketData.sync_history``)
+
+        Las mismas descargas en bloque (como mucho dos) en un hilo aparte;
+        solo los tickers que falten en el bloque se piden uno a uno con el
+        ``history_async`` del proveedor.
+        """
+        store = get_history_store()
+        start = pd.Timestamp(start).strftime('%Y-%m-%d')
+        coverage = await asyncio.to_thread(store.coverage, tickers)
+        groups, backfill = MarketData._sync_groups(tickers, start, coverage)
+
+        for fetch_from, group in groups:
+            with span('market_data.sync_group', tickers=len(group), since=fetch_from):
+                bars = await asyncio.to_thread(get_provider().bulk_history, group, fetch_from)
+                missing = [ticker for ticker in group if ticker not in bars]
+                if missing:
+                    bars.update(await AsyncMarketData.fetch_history(missing, fetch_from))
+                # La cobertura se amplía desde ``start`` aunque el ticker empiece más tarde
+                await asyncio.to_thread(store.save_many, bars, {
+                    ticker: start if ticker in backfill else fetch_from for ticker in bars
+                })
+
+    @staticmethod
+    async def fetch_history(tickers, start):
+        """Barras de cada ticker con una petición asíncrona por ticker ({ticker: DataFrame})
+
+        Como mucho ``MAX_WORKERS`` a la vez; los que fallan se omiten.
+        """
+        semaphore = asyncio.Semaphore(MAX_WORKERS)
+
+        async def fetch(ticker):
+            async with semaphore:
+                return await get_provider().history_async(ticker, start)
+
+        results = await asyncio.gather(*(fetch(ticker) for ticker in tickers), return_exceptions=True)
+        bars = {}
+        for ticker, result in zip(tickers, results):
+            if isinstance(result, Exception):
+                print(f"Error al descargar el histórico de {ticker}: {result}")
+            elif result is not None and not result.empty:
+                bars[ticker] = result
+        return bars
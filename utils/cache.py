@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Marcador para distinguir "no está en caché" de un valor None cacheado
+MISSING = object()
+
+class TTLCache:
+    """Caché en memoria, segura entre hilos, con caducidad (TTL) y expulsión LRU"""
+
+    def __init__(self, ttl=60, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        """Devuelve el valor cacheado o ``default`` si no existe o ha caducado"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Guarda un valor; ``ttl`` sobrescribe el TTL por defecto (None = sin caducidad)"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Elimina una entrada si existe"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Vacía la caché sin reiniciar los contadores"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Contadores de aciertos, fallos y expulsiones"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else 0
+            }
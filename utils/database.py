@@ -1,114 +1,838 @@
-from utils.supabase_client import get_supabase_client
+from utils.supabase_client import get_supabase_client, get_async_postgrest_client
+from utils.sqlite_client import get_sqlite_client, get_async_sqlite_client
+from utils.cache import TTLCache, MISSING
+from utils.metrics import registry, track
+from utils.ledger import (movement_data, lot_movement, empty_position, applies_after, apply_movement,
+                          build_position, LEDGER_TABLES, EPSILON)
+from utils.portfolio import FONDOS_COLUMNS, ACCIONES_COLUMNS
 from datetime import datetime
+import operator
+import os
+import threading
+import time
+
+# Almacenamiento de las carteras: "supabase" o "sqlite" (local, ver SQLITE_DB_PATH)
+DB_BACKEND = os.environ.get("DB_BACKEND", "supabase")
+
+# Cliente síncrono y asíncrono de cada almacenamiento (misma interfaz de PostgREST)
+DB_BACKENDS = {
+    'supabase': (get_supabase_client, get_async_postgrest_client),
+    'sqlite': (get_sqlite_client, get_async_sqlite_client)
+}
+
+def _backend(backend=None):
+    backend = backend or DB_BACKEND
+    if backend not in DB_BACKENDS:
+        raise ValueError(f"DB_BACKEND desconocido: {backend}. Opciones: {', '.join(DB_BACKENDS)}")
+    return DB_BACKENDS[backend]
+
+def get_db_client(backend=None):
+    """Cliente del almacenamiento configurado (``DB_BACKEND``)"""
+    return _backend(backend)[0]()
+
+def get_async_db_client(backend=None):
+    """Cliente asíncrono del almacenamiento configurado (``DB_BACKEND``)"""
+    return _backend(backend)[1]()
+
+# Caché de lectura de las tablas, compartida por todas las instancias de Database.
+# Las escrituras de la app la actualizan; el TTL (s) recoge cambios hechos fuera
+# de la app. DB_CACHE_TTL=0 desactiva la caducidad.
+holdings_cache = TTLCache(ttl=float(os.environ.get("DB_CACHE_TTL", 300)) or None, max_entries=16)
+registry.register_cache('holdings', holdings_cache)
+
+# Operadores de filtro admitidos en las consultas: (columna, operador, valor)
+FILTER_OPERATORS = {
+    'eq': operator.eq,
+    'neq': operator.ne,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'in': lambda value, options: value in options,
+    'ilike': lambda value, pattern: pattern.strip('%').lower() in str(value or '').lower()
+}
+
+# Filas por petición en escrituras y lecturas por lotes
+BATCH_SIZE = int(os.environ.get("DB_BATCH_SIZE", 500))
+
+def _filter_rows(rows, filters):
+    """Aplica los filtros en memoria (misma semántica que en Supabase)"""
+    for column, op, value in filters or []:
+        compare = FILTER_OPERATORS[op]
+        rows = [row for row in rows
+                if row.get(column) is not None and compare(row.get(column), value)]
+    return rows
+
+def _query_rows(rows, columns=None, filters=None, order_by='id', descending=False,
+                offset=None, limit=None):
+    """Resuelve en memoria una consulta sobre las filas cacheadas de una tabla"""
+    rows = _filter_rows(rows, filters)
+    if order_by:
+        rows = sorted(rows, key=lambda r: (r.get(order_by) is None, r.get(order_by)),
+                      reverse=descending)
+    start = offset or 0
+    rows = rows[start:start + limit] if limit is not None else rows[start:]
+    if columns:
+        rows = [{column: row.get(column) for column in columns} for row in rows]
+    return [dict(row) for row in rows]
+
+def _apply_filters(request, filters):
+    """Traduce los filtros ``(columna, operador, valor)`` a la petición de PostgREST"""
+    for column, op, value in filters or []:
+        request = getattr(request, 'in_' if op == 'in' else op)(column, value)
+    return request
+
+def _select_request(request, columns=None, filters=None, order_by='id', descending=False,
+                    offset=None, limit=None):
+    """Petición de PostgREST (o ``SQLiteQuery``) con proyección, filtros, orden y rango"""
+    request = _apply_filters(request.select(*(columns or ['*'])), filters)
+    if order_by:
+        request = request.order(order_by, desc=descending)
+    if limit is not None:
+        request = request.limit(limit)
+    if offset:
+        request = request.offset(offset)
+    return request
+
+def _count_request(request, filters=None):
+    """Petición que solo devuelve el número de filas que cumplen ``filters`` (en ``count``)"""
+    return _apply_filters(request.select('id', count='exact'), filters).limit(1)
+
+def _execute(request, table, operation):
+    """Ejecuta una petición registrando su latencia y resultado en ``utils.metrics``"""
+    with track('database', operation, table):
+        return request.execute()
+
+# Columnas de cantidad/precio de los lotes y datos descriptivos que se copian a la posición
+LOT_COLUMNS = {'fondos': FONDOS_COLUMNS, 'acciones': ACCIONES_COLUMNS}
+LOT_INFO = {'fondos': ['nombre', 'tipo'], 'acciones': ['nombre', 'sector']}
+
+# Columnas guardadas de una posición (ver ``utils.ledger``)
+POSITION_FIELDS = ['tabla', 'ticker', 'nombre', 'sector', 'tipo', 'cantidad', 'coste_medio',
+                   'coste_total', 'ganancia_realizada', 'dividendos', 'lotes', 'ultima_fecha',
+                   'ultimo_movimiento']
+
+# Tablas de lotes ya reconciliadas con el libro en este proceso
+_ledger_synced = set()
+
+# Las escrituras del libro de cada tabla se serializan dentro del proceso
+_ledger_locks = {tabla: threading.RLock() for tabla in LEDGER_TABLES}
+
+# Tras un fallo del libro (p. ej. sin las tablas en Supabase, ver supabase/migrations)
+# no se reintenta hasta pasados LEDGER_RETRY s; mientras, se calcula a partir de los lotes
+LEDGER_RETRY = float(os.environ.get("LEDGER_RETRY", 3600))
+_ledger_failed = {}  # {tabla: instante del último fallo}
+
+# Claves naturales con las que se escriben compras de lotes y posiciones (ver UNIQUE_KEYS)
+LOT_PURCHASE_KEY = 'tabla,lote_id'
+POSITION_KEY = 'tabla,ticker'
+
+def _position_data(position):
+    """Columnas guardadas de una posición (con el ticker como nombre si no tiene)"""
+    data = {field: position.get(field) for field in POSITION_FIELDS}
+    data['nombre'] = data['nombre'] or data['ticker']
+    return data
+
+def _movement_filters(tabla=None, ticker=None):
+    """Filtros de ``query`` para los movimientos de una tabla y un ticker"""
+    filters = [('tabla', 'eq', tabla)] if tabla else []
+    if ticker:
+        filters.append(('ticker', 'eq', str(ticker).upper()))
+    return filters
+
+def _lot_purchase(tabla, lot):
+    """Compra del libro de un lote (None si el lote no tiene cantidad, precio o fecha válidos)"""
+    try:
+        return lot_movement(tabla, lot, LOT_COLUMNS[tabla])
+    except (TypeError, ValueError):
+        return None
+
+def _check_positions(tabla, tickers, movements):
+    """Lanza ``ValueError`` si la posición de alguno de ``tickers`` no cuadra con ``movements``"""
+    for ticker in sorted(tickers):
+        build_position(tabla, ticker, [m for m in movements if m['ticker'] == ticker])
+
+def _change_lot(tabla, movements, id, lot):
+    """Movimientos de ``tabla`` con el lote ``id`` pasado a ``lot`` (None si se borra)
+
+    Lanza ``ValueError`` si con el cambio alguna venta queda sin cubrir.
+    """
+    old = next((m for m in movements if m.get('lote_id') == id), None)
+    expected = _lot_purchase(tabla, {**lot, 'id': id}) if lot else None
+    movements = [m for m in movements if m is not old]
+    if expected is not None:
+        movements.append({**expected, 'id': old['id']} if old else expected)
+    try:
+        _check_positions(tabla, {m['ticker'] for m in (old, expected) if m}, movements)
+    except ValueError as e:
+        raise ValueError(f"El cambio del lote deja el libro de movimientos sin cuadrar. {e}")
+    return movements
+
+def _fondo_data(nombre, ticker, tipo, valor_compra, cantidad, fecha_compra):
+    """Fila de la tabla fondos a partir de los campos del formulario"""
+    return {
+        'nombre': nombre,
+        'ticker': ticker.upper(),
+        'tipo': tipo,
+        'valor_compra': float(valor_compra),
+        'cantidad': float(cantidad),
+        'fecha_compra': fecha_compra
+    }
+
+def _accion_data(nombre, ticker, sector, precio_compra, num_acciones, fecha_compra):
+    """Fila de la tabla acciones a partir de los campos del formulario"""
+    return {
+        'nombre': nombre,
+        'ticker': ticker.upper(),
+        'sector': sector if sector else 'N/A',
+        'precio_compra': float(precio_compra),
+        'num_acciones': int(num_acciones),
+        'fecha_compra': fecha_compra
+    }
 
 class Database:
-    def __init__(self):
-        self.supabase = get_supabase_client()
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._client = None
+    
+    @property
+    def client(self):
+        """Cliente del almacenamiento, creado al primer uso (importar no exige credenciales)"""
+        if self._client is None:
+            self._client = get_db_client(self.backend)
+        return self._client
+    
+    # ============== CACHÉ ==============
+    
+    def _get_table(self, table):
+        """Lee una tabla completa pasando por la caché"""
+        rows = holdings_cache.get(table)
+        if rows is MISSING:
+            response = _execute(self.client.table(table).select('*').order('id'), table, 'select')
+            rows = response.data if response.data else []
+            holdings_cache.set(table, rows)
+        return [dict(row) for row in rows]
+    
+    @staticmethod
+    def _cache_upsert(table, *rows):
+        """Añade o sustituye filas en la caché (si la tabla está cacheada)"""
+        cached = holdings_cache.get(table)
+        if cached is MISSING:
+            return
+        ids = {row['id'] for row in rows}
+        cached = [r for r in cached if r['id'] not in ids] + list(rows)
+        holdings_cache.set(table, sorted(cached, key=lambda r: r['id']))
+    
+    def _fetch(self, table, filters=None):
+        """Lee las filas que cumplen ``filters`` directamente del almacenamiento
+
+        Para las escrituras que dependen de lo guardado (el libro): otro
+        proceso puede haberlo cambiado después de cachearlo. Lo leído
+        sustituye a esas filas en la caché.
+        """
+        request = _apply_filters(self.client.table(table).select('*'), filters).order('id')
+        rows = _execute(request, table, 'select').data or []
+        cached = holdings_cache.get(table)
+        if cached is not MISSING:
+            stale = {r['id'] for r in _filter_rows(cached, filters)} | {r['id'] for r in rows}
+            holdings_cache.set(table, sorted([r for r in cached if r['id'] not in stale] + rows,
+                                             key=lambda r: r['id']))
+        return [dict(row) for row in rows]
+    
+    @staticmethod
+    def _cache_delete(table, id):
+        """Quita una fila de la caché (si la tabla está cacheada)"""
+        rows = holdings_cache.get(table)
+        if rows is not MISSING:
+            holdings_cache.set(table, [r for r in rows if r['id'] != id])
+    
+    # ============== CONSULTAS ==============
+    
+    def query(self, table, columns=None, filters=None, order_by='id', descending=False,
+              offset=None, limit=None):
+        """Consulta con proyección de columnas, filtros y paginación
+
+        ``columns`` es la lista de columnas a devolver (None = todas),
+        ``filters`` una lista de tuplas ``(columna, operador, valor)`` con los
+        operadores de ``FILTER_OPERATORS`` y ``offset``/``limit`` el rango de
+        filas. La tabla completa se sirve de la caché; con filtros o rango la
+        consulta se resuelve en el almacenamiento y solo viajan las filas y
+        columnas pedidas.
+        """
+        if not filters and offset is None and limit is None:
+            return _query_rows(self._get_table(table), columns, None, order_by, descending)
+        return _execute(_select_request(self.client.table(table), columns, filters, order_by, descending,
+                                        offset, limit), table, 'select').data or []
+    
+    def count(self, table, filters=None):
+        """Número de filas que cumplen los filtros (sin filtros, de la tabla cacheada si lo está)"""
+        cached = holdings_cache.get(table)
+        if not filters and cached is not MISSING:
+            return len(cached)
+        return _execute(_count_request(self.client.table(table), filters), table, 'count').count or 0
+    
+    # ============== LOTES ==============
+    
+    def insert_many(self, table, rows, chunk_size=None, upsert=False, on_conflict=''):
+        """Inserta (o actualiza con ``upsert``) muchas filas en bloques de ``chunk_size``
+
+        ``on_conflict`` son las columnas de la clave única del ``upsert`` (por
+        defecto ``id``). Devuelve las filas escritas. Si un bloque falla se
+        detiene y devuelve las filas escritas hasta entonces. Los lotes que
+        se actualizan pasan antes por ``upsert_lots``: los que descuadran el
+        libro no se escriben.
+        """
+        if upsert and table in LEDGER_TABLES and on_conflict in ('', 'id'):
+            written, errors = self.upsert_lots(table, rows, chunk_size)
+            for error in errors:
+                print(f"Lote de {table} sin escribir: {error}")
+            return written
+        return self._write_many(table, rows, chunk_size, upsert, on_conflict)
+    
+    def _write_many(self, table, rows, chunk_size=None, upsert=False, on_conflict=''):
+        chunk_size = chunk_size or BATCH_SIZE
+        written = []
+        try:
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                request = self.client.table(table)
+                request = request.upsert(chunk, on_conflict=on_conflict) if upsert else request.insert(chunk)
+                response = _execute(request, table, 'upsert' if upsert else 'insert')
+                written.extend(response.data or [])
+        except Exception as e:
+            print(f"Error en la escritura por lotes en {table}: {e}")
+        
+        if written:
+            self._cache_upsert(table, *written)
+            self._lots_written(table, written)
+        return written
+    
+    def upsert_lots(self, table, rows, chunk_size=None):
+        """Inserta o actualiza por ``id`` lotes de fondos o acciones (importación)
+
+        Cada lote con ``id`` se comprueba contra el libro, junto con los
+        anteriores, antes de escribir (ver ``check_lot``). Devuelve las filas
+        escritas y los mensajes de los lotes rechazados.
+        """
+        with _ledger_locks[table]:
+            accepted, errors = self.check_lots(table, rows)
+            written = self._write_many(table, accepted, chunk_size, upsert=True) if accepted else []
+        return written, errors
+    
+    def iter_rows(self, table, columns=None, chunk_size=None):
+        """Recorre una tabla completa por páginas de ``chunk_size`` filas (para exportar)"""
+        chunk_size = chunk_size or BATCH_SIZE
+        offset = 0
+        while True:
+            rows = self.query(table, columns=columns, offset=offset, limit=chunk_size)
+            yield from rows
+            if len(rows) < chunk_size:
+                break
+            offset += chunk_size
+    
+    def _lots_written(self, table, rows):
+        """Lleva al libro las compras de los lotes escritos (sin interrumpir la escritura)"""
+        if table in LEDGER_TABLES and rows:
+            try:
+                if self._ensure_ledger(table):
+                    self.sync_lots(table, [row['id'] for row in rows])
+            except Exception as e:
+                print(f"Error al actualizar el libro de movimientos de {table}: {e}")
+    
+    def invalidate_cache(self, table=None):
+        """Descarta la caché de una tabla o de todas"""
+        if table is None:
+            holdings_cache.clear()
+        else:
+            holdings_cache.delete(table)
     
     # ============== FONDOS ==============
     
-    def get_fondos(self):
-        """Obtiene todos los fondos"""
+    def get_fondos(self, columns=None, filters=None, order_by='id', descending=False,
+                   offset=None, limit=None):
+        """Obtiene todos los fondos (o una proyección/página, ver ``query``)"""
         try:
-            response = self.supabase.table('fondos').select('*').order('id').execute()
-            return response.data if response.data else []
+            return self.query('fondos', columns, filters, order_by, descending, offset, limit)
         except Exception as e:
             print(f"Error al obtener fondos: {e}")
             return []
     
+    def count_fondos(self, filters=None):
+        """Cuenta los fondos"""
+        try:
+            return self.count('fondos', filters)
+        except Exception as e:
+            print(f"Error al contar fondos: {e}")
+            return 0
+    
     def add_fondo(self, nombre, ticker, tipo, valor_compra, cantidad, fecha_compra):
         """Añade un nuevo fondo"""
         try:
-            data = {
-                'nombre': nombre,
-                'ticker': ticker.upper(),
-                'tipo': tipo,
-                'valor_compra': float(valor_compra),
-                'cantidad': float(cantidad),
-                'fecha_compra': fecha_compra
-            }
-            response = self.supabase.table('fondos').insert(data).execute()
-            return response.data[0] if response.data else None
+            data = _fondo_data(nombre, ticker, tipo, valor_compra, cantidad, fecha_compra)
+            response = _execute(self.client.table('fondos').insert(data), 'fondos', 'insert')
+            if not response.data:
+                return None
+            self._cache_upsert('fondos', response.data[0])
+            self._lots_written('fondos', response.data)
+            return response.data[0]
         except Exception as e:
             print(f"Error al añadir fondo: {e}")
             return None
     
     def update_fondo(self, id, nombre, ticker, tipo, valor_compra, cantidad, fecha_compra):
-        """Actualiza un fondo existente"""
-        try:
-            data = {
-                'nombre': nombre,
-                'ticker': ticker.upper(),
-                'tipo': tipo,
-                'valor_compra': float(valor_compra),
-                'cantidad': float(cantidad),
-                'fecha_compra': fecha_compra
-            }
-            response = self.supabase.table('fondos').update(data).eq('id', id).execute()
-            return True if response.data else False
-        except Exception as e:
-            print(f"Error al actualizar fondo: {e}")
-            return False
+        """Actualiza un fondo existente
+
+        Lanza ``ValueError`` sin escribir nada si el cambio deja sin cubrir
+        ventas ya registradas en el libro (ver ``check_lot``).
+        """
+        data = _fondo_data(nombre, ticker, tipo, valor_compra, cantidad, fecha_compra)
+        with _ledger_locks['fondos']:
+            try:
+                self.check_lot('fondos', id, data)
+                response = _execute(self.client.table('fondos').update(data).eq('id', id), 'fondos', 'update')
+                if not response.data:
+                    self.invalidate_cache('fondos')
+                    return False
+                self._cache_upsert('fondos', response.data[0])
+                self._lots_written('fondos', response.data)
+                return True
+            except ValueError:
+                raise
+            except Exception as e:
+                print(f"Error al actualizar fondo: {e}")
+                self.invalidate_cache('fondos')
+                return False
     
     def delete_fondo(self, id):
-        """Elimina un fondo"""
-        try:
-            self.supabase.table('fondos').delete().eq('id', id).execute()
-            return True
-        except Exception as e:
-            print(f"Error al eliminar fondo: {e}")
-            return False
+        """Elimina un fondo
+
+        Lanza ``ValueError`` sin borrar si el fondo cubre ventas ya registradas
+        en el libro (ver ``check_lot``).
+        """
+        with _ledger_locks['fondos']:
+            try:
+                self.check_lot('fondos', id)
+                _execute(self.client.table('fondos').delete().eq('id', id), 'fondos', 'delete')
+                self._cache_delete('fondos', id)
+                self._lots_written('fondos', [{'id': id}])
+                return True
+            except ValueError:
+                raise
+            except Exception as e:
+                print(f"Error al eliminar fondo: {e}")
+                self.invalidate_cache('fondos')
+                return False
     
     # ============== ACCIONES ==============
     
-    def get_acciones(self):
-        """Obtiene todas las acciones"""
+    def get_acciones(self, columns=None, filters=None, order_by='id', descending=False,
+                   offset=None, limit=None):
+        """Obtiene todas las acciones (o una proyección/página, ver ``query``)"""
         try:
-            response = self.supabase.table('acciones').select('*').order('id').execute()
-            return response.data if response.data else []
+            return self.query('acciones', columns, filters, order_by, descending, offset, limit)
         except Exception as e:
             print(f"Error al obtener acciones: {e}")
             return []
     
+    def count_acciones(self, filters=None):
+        """Cuenta las acciones"""
+        try:
+            return self.count('acciones', filters)
+        except Exception as e:
+            print(f"Error al contar acciones: {e}")
+            return 0
+    
     def add_accion(self, nombre, ticker, sector, precio_compra, num_acciones, fecha_compra):
         """Añade una nueva acción"""
         try:
-            data = {
-                'nombre': nombre,
-                'ticker': ticker.upper(),
-                'sector': sector if sector else 'N/A',
-                'precio_compra': float(precio_compra),
-                'num_acciones': int(num_acciones),
-                'fecha_compra': fecha_compra
-            }
-            response = self.supabase.table('acciones').insert(data).execute()
-            return response.data[0] if response.data else None
+            data = _accion_data(nombre, ticker, sector, precio_compra, num_acciones, fecha_compra)
+            response = _execute(self.client.table('acciones').insert(data), 'acciones', 'insert')
+            if not response.data:
+                return None
+            self._cache_upsert('acciones', response.data[0])
+            self._lots_written('acciones', response.data)
+            return response.data[0]
         except Exception as e:
             print(f"Error al añadir acción: {e}")
             return None
     
     def update_accion(self, id, nombre, ticker, sector, precio_compra, num_acciones, fecha_compra):
-        """Actualiza una acción existente"""
+        """Actualiza una acción existente
+
+        Lanza ``ValueError`` sin escribir nada si el cambio deja sin cubrir
+        ventas ya registradas en el libro (ver ``check_lot``).
+        """
+        data = _accion_data(nombre, ticker, sector, precio_compra, num_acciones, fecha_compra)
+        with _ledger_locks['acciones']:
+            try:
+                self.check_lot('acciones', id, data)
+                response = _execute(self.client.table('acciones').update(data).eq('id', id), 'acciones', 'update')
+                if not response.data:
+                    self.invalidate_cache('acciones')
+                    return False
+                self._cache_upsert('acciones', response.data[0])
+                self._lots_written('acciones', response.data)
+                return True
+            except ValueError:
+                raise
+            except Exception as e:
+                print(f"Error al actualizar acción: {e}")
+                self.invalidate_cache('acciones')
+                return False
+    
+    def delete_accion(self, id):
+        """Elimina una acción
+
+        Lanza ``ValueError`` sin borrar si la acción cubre ventas ya registradas
+        en el libro (ver ``check_lot``).
+        """
+        with _ledger_locks['acciones']:
+            try:
+                self.check_lot('acciones', id)
+                _execute(self.client.table('acciones').delete().eq('id', id), 'acciones', 'delete')
+                self._cache_delete('acciones', id)
+                self._lots_written('acciones', [{'id': id}])
+                return True
+            except ValueError:
+                raise
+            except Exception as e:
+                print(f"Error al eliminar acción: {e}")
+                self.invalidate_cache('acciones')
+                return False
+    
+    # ============== LIBRO DE MOVIMIENTOS ==============
+    
+    def get_movimientos(self, tabla=None, ticker=None):
+        """Movimientos del libro, por fecha (opcionalmente de una tabla y un ticker)
+
+        Si el libro no está disponible devuelve las compras de los lotes.
+        """
+        tablas = [tabla] if tabla else LEDGER_TABLES
         try:
-            data = {
-                'nombre': nombre,
-                'ticker': ticker.upper(),
-                'sector': sector if sector else 'N/A',
-                'precio_compra': float(precio_compra),
-                'num_acciones': int(num_acciones),
-                'fecha_compra': fecha_compra
-            }
-            response = self.supabase.table('acciones').update(data).eq('id', id).execute()
-            return True if response.data else False
+            if all([self._ensure_ledger(lot_table) for lot_table in tablas]):
+                return self._movimientos(tabla, ticker)
         except Exception as e:
-            print(f"Error al actualizar acción: {e}")
-            return False
+            print(f"Error al obtener movimientos: {e}")
+        return _query_rows(self._movements_from_lots(tablas), filters=_movement_filters(tabla, ticker),
+                           order_by='fecha')
     
-    def delete_accion(self, id):
-        """Elimina una acción"""
+    def get_posiciones(self, tabla, abiertas=True):
+        """Posiciones materializadas de una tabla, una fila por ticker
+
+        Con ``abiertas`` solo las que aún tienen cantidad. Si el libro no está
+        disponible se calculan en memoria a partir de los lotes.
+        """
+        rows = None
         try:
-            self.supabase.table('acciones').delete().eq('id', id).execute()
-            return True
+            if self._ensure_ledger(tabla):
+                rows = _query_rows(self._get_table('posiciones'), filters=[('tabla', 'eq', tabla)],
+                                   order_by='ticker')
+        except Exception as e:
+            print(f"Error al obtener posiciones de {tabla}: {e}")
+        if rows is None:
+            rows = self._positions_from_lots(tabla)
+        return [row for row in rows if row['cantidad'] > EPSILON] if abiertas else rows
+    
+    def add_movimiento(self, tabla, ticker, tipo, cantidad, precio, fecha):
+        """Registra una compra, venta o dividendo y actualiza su posición
+
+        Si el movimiento va después de todo lo aplicado solo se aplica encima
+        de la posición guardada; si es anterior, se rehace la posición del
+        ticker. Lanza ``ValueError`` si el movimiento no es válido (por
+        ejemplo, vender más de lo que hay) sin escribir nada.
+        """
+        data = movement_data(tabla, ticker, tipo, cantidad, precio, fecha)
+        with _ledger_locks[tabla]:
+            try:
+                # Sin los lotes en el libro la posición guardada no cubre sus ventas
+                if not self._ensure_ledger(tabla):
+                    return None
+                return self._add_movimiento(data)
+            except ValueError:
+                raise
+            except Exception as e:
+                print(f"Error al añadir movimiento: {e}")
+                self.invalidate_cache('movimientos')
+                self.invalidate_cache('posiciones')
+                return None
+    
+    def _add_movimiento(self, data):
+        tabla = data['tabla']
+        position = self._posicion(tabla, data['ticker']) or empty_position(tabla, data['ticker'])
+        if applies_after(position, data):
+            position = apply_movement(position, data)
+        else:
+            movements = self._fetch('movimientos', _movement_filters(tabla, data['ticker'])) + [data]
+            position = build_position(tabla, data['ticker'], movements, base=position)
+        
+        response = _execute(self.client.table('movimientos').insert(data), 'movimientos', 'insert')
+        if not response.data:
+            return None
+        row = response.data[0]
+        self._cache_upsert('movimientos', row)
+        position['ultimo_movimiento'] = max(position['ultimo_movimiento'] or 0, row['id'])
+        self._save_posicion(position)
+        return row
+    
+    def delete_movimiento(self, id):
+        """Elimina un movimiento y rehace su posición
+
+        Las compras de los lotes se borran desde sus tablas. Lanza
+        ``ValueError`` si sin él alguna venta queda sin cubrir. Devuelve
+        False si ``id`` no es el de un movimiento guardado (p. ej. los que
+        se calculan desde los lotes sin libro no tienen).
+        """
+        if not isinstance(id, int) or isinstance(id, bool):
+            return False
+        try:
+            movement = next(iter(self._fetch('movimientos', [('id', 'eq', id)])), None)
         except Exception as e:
-            print(f"Error al eliminar acción: {e}")
+            print(f"Error al eliminar movimiento: {e}")
+            return False
+        if movement is None:
             return False
+        if movement.get('lote_id') is not None:
+            raise ValueError(f"La compra pertenece a un lote de {movement['tabla']}: bórrala desde allí")
+        tabla, ticker = movement['tabla'], movement['ticker']
+        with _ledger_locks[tabla]:
+            try:
+                if not self._ensure_ledger(tabla):
+                    return False
+                # Se comprueba antes de borrar que el resto de movimientos sigue siendo válido
+                build_position(tabla, ticker, [m for m in self._fetch('movimientos', _movement_filters(tabla, ticker))
+                                               if m['id'] != id])
+                _execute(self.client.table('movimientos').delete().eq('id', id), 'movimientos', 'delete')
+                self._cache_delete('movimientos', id)
+                self._rebuild_posiciones(tabla, [ticker], [])
+                return True
+            except ValueError:
+                raise
+            except Exception as e:
+                print(f"Error al eliminar movimiento: {e}")
+                self.invalidate_cache('movimientos')
+                self.invalidate_cache('posiciones')
+                return False
+    
+    def _ensure_ledger(self, tabla):
+        """En la primera lectura del proceso lleva al libro los lotes que aún no estén
+
+        Las lecturas simultáneas esperan a una sola reconciliación. Devuelve
+        False si el libro no está disponible: tras un fallo se avisa una vez
+        y no se reintenta hasta pasados ``LEDGER_RETRY`` segundos.
+        """
+        if tabla in _ledger_synced:
+            return True
+        with _ledger_locks[tabla]:
+            if tabla in _ledger_synced:
+                return True
+            failed = _ledger_failed.get(tabla)
+            if failed is not None and time.monotonic() - failed < LEDGER_RETRY:
+                return False
+            try:
+                self.sync_lots(tabla)
+            except Exception as e:
+                _ledger_failed[tabla] = time.monotonic()
+                print(f"Libro de movimientos de {tabla} no disponible (se reintenta en {LEDGER_RETRY:g} s): {e}")
+                return False
+            # Se marca al terminar: quien lo ve marcado sin el cerrojo lee el libro ya completo
+            _ledger_synced.add(tabla)
+            _ledger_failed.pop(tabla, None)
+            return True
+    
+    def sync_lots(self, tabla, ids=None):
+        """Lleva al libro la compra de cada lote de ``tabla`` y rehace las posiciones afectadas
+
+        Crea, actualiza o borra el movimiento de compra de los lotes ``ids``
+        (todos con None) según su fila actual. Las compras nuevas se escriben
+        por ``lote_id``, así que repetir la reconciliación no las duplica.
+        Solo se rehacen los tickers que cambian (todos con None).
+        """
+        with _ledger_locks[tabla]:
+            self._sync_lots(tabla, ids)
+    
+    def _sync_lots(self, tabla, ids):
+        lots = {lot['id']: lot for lot in self._get_table(tabla)}
+        movements = self._fetch('movimientos', _movement_filters(tabla))
+        bought = {m['lote_id']: m for m in movements if m.get('lote_id') is not None}
+        full = ids is None
+        ids = set(lots) | set(bought) if full else set(ids)
+        
+        deleted, updated, new, affected = [], [], [], set()
+        for id in ids:
+            lot, movement = lots.get(id), bought.get(id)
+            expected = _lot_purchase(tabla, lot) if lot else None
+            if movement is not None and expected is None:
+                deleted.append(movement)
+                affected.add(movement['ticker'])
+            elif movement is None and expected is not None:
+                new.append(expected)
+                affected.add(expected['ticker'])
+            elif expected is not None and any(movement[k] != v for k, v in expected.items()):
+                updated.append({**movement, **expected})
+                affected |= {movement['ticker'], expected['ticker']}
+        
+        # Se comprueba el libro resultante antes de escribir nada
+        replaced = {m['id'] for m in deleted + updated}
+        _check_positions(tabla, affected, [m for m in movements if m['id'] not in replaced] + updated + new)
+        
+        for movement in deleted:
+            _execute(self.client.table('movimientos').delete().eq('id', movement['id']),
+                     'movimientos', 'delete')
+            self._cache_delete('movimientos', movement['id'])
+        for movement in updated:
+            data = {k: movement[k] for k in movement if k not in ('id', 'created_at')}
+            response = _execute(self.client.table('movimientos').update(data).eq('id', movement['id']),
+                                'movimientos', 'update')
+            self._cache_upsert('movimientos', *response.data)
+        if new:
+            self.insert_many('movimientos', new, upsert=True, on_conflict=LOT_PURCHASE_KEY)
+        
+        repair = set()
+        if full:
+            # La reconciliación completa repara también las posiciones sobrantes o desfasadas
+            repair = {m['ticker'] for m in movements}
+            repair |= {p['ticker'] for p in self._fetch('posiciones', [('tabla', 'eq', tabla)])}
+        self._rebuild_posiciones(tabla, affected, lots.values(), repair=repair - affected)
+    
+    def check_lot(self, tabla, id, lot=None):
+        """Comprueba que el libro sigue cuadrando si el lote ``id`` pasa a ser ``lot``
+
+        ``lot`` son los datos nuevos del lote (None si se borra). Lanza
+        ``ValueError`` si alguna venta posterior queda sin cubrir, por
+        ejemplo al borrar o reducir un lote del que ya se ha vendido. Sin
+        libro disponible no hay nada que comprobar.
+        """
+        try:
+            if not self._ensure_ledger(tabla):
+                return
+            movements = self._fetch('movimientos', _movement_filters(tabla))
+        except Exception as e:
+            print(f"Error al leer el libro de movimientos de {tabla}: {e}")
+            return
+        _change_lot(tabla, movements, id, lot)
+    
+    def check_lots(self, tabla, lots):
+        """Separa los lotes que se pueden escribir de los que descuadran el libro
+
+        Los lotes con ``id`` se comprueban en orden, cada uno con los cambios
+        de los aceptados antes (ver ``check_lot``). Devuelve los lotes
+        aceptados y un mensaje por cada rechazado.
+        """
+        try:
+            if not self._ensure_ledger(tabla):
+                return list(lots), []
+            movements = self._fetch('movimientos', _movement_filters(tabla))
+        except Exception as e:
+            print(f"Error al leer el libro de movimientos de {tabla}: {e}")
+            return list(lots), []
+        accepted, errors = [], []
+        for lot in lots:
+            if lot.get('id') is not None:
+                try:
+                    movements = _change_lot(tabla, movements, lot['id'], lot)
+                except ValueError as e:
+                    errors.append(f"Lote {lot['id']}: {e}")
+                    continue
+            accepted.append(lot)
+        return accepted, errors
+    
+    def rebuild_posiciones(self, tabla):
+        """Rehace desde el libro todas las posiciones de una tabla (reparación)"""
+        self.sync_lots(tabla)
+    
+    def _rebuild_posiciones(self, tabla, tickers, lots, repair=()):
+        """Rehace las posiciones de ``tickers`` con todos sus movimientos
+
+        Los datos descriptivos salen del último lote de cada ticker. Las
+        posiciones que se quedan sin movimientos se borran; las que cambian
+        se escriben juntas en una petición, por ``(tabla, ticker)``. Lanza
+        ``ValueError`` sin escribir nada si alguna de ``tickers`` no cuadra;
+        las de ``repair`` que no cuadran solo se avisan y se dejan como están.
+        """
+        tickers = set(tickers)
+        everything = sorted(tickers | set(repair))
+        if not everything:
+            return
+        filters = [('tabla', 'eq', tabla), ('ticker', 'in', everything)]
+        movements, latest = {}, {}
+        for movement in self._fetch('movimientos', filters):
+            movements.setdefault(movement['ticker'], []).append(movement)
+        for lot in lots:
+            ticker = str(lot['ticker']).upper()
+            if ticker not in latest or lot['id'] > latest[ticker]['id']:
+                latest[ticker] = lot
+        saved = {p['ticker']: p for p in self._fetch('posiciones', filters)}
+        
+        changed, removed = [], []
+        for ticker in everything:
+            base = saved.get(ticker)
+            if ticker not in movements:
+                if base is not None:
+                    removed.append(base)
+                continue
+            try:
+                position = build_position(tabla, ticker, movements[ticker], base=base)
+            except ValueError as e:
+                if ticker in tickers:
+                    raise
+                print(f"Posición de {ticker} sin rehacer: {e}")
+                continue
+            if ticker in latest:
+                position.update({column: latest[ticker].get(column) for column in LOT_INFO[tabla]})
+            data = _position_data(position)
+            if base is None or any(base.get(k) != v for k, v in data.items()):
+                changed.append(data)
+        for base in removed:
+            _execute(self.client.table('posiciones').delete().eq('id', base['id']), 'posiciones', 'delete')
+            self._cache_delete('posiciones', base['id'])
+        if changed:
+            self.insert_many('posiciones', changed, upsert=True, on_conflict=POSITION_KEY)
+    
+    def _movimientos(self, tabla=None, ticker=None):
+        """Movimientos guardados en el libro, sin reconciliar antes los lotes"""
+        return _query_rows(self._get_table('movimientos'), filters=_movement_filters(tabla, ticker),
+                           order_by='fecha')
+    
+    def _posicion(self, tabla, ticker):
+        """Posición guardada de un ticker, leída del almacenamiento (None si no hay)"""
+        rows = self._fetch('posiciones', [('tabla', 'eq', tabla), ('ticker', 'eq', ticker)])
+        return rows[0] if rows else None
+    
+    def _save_posicion(self, position):
+        """Inserta o actualiza una posición (por ``(tabla, ticker)``)"""
+        request = self.client.table('posiciones').upsert(_position_data(position), on_conflict=POSITION_KEY)
+        response = _execute(request, 'posiciones', 'upsert')
+        if response.data:
+            self._cache_upsert('posiciones', response.data[0])
+        return response.data[0] if response.data else None
+    
+    def _positions_from_lots(self, tabla):
+        """Posiciones calculadas en memoria a partir de los lotes (sin libro)"""
+        try:
+            lots = self._get_table(tabla)
+        except Exception as e:
+            print(f"Error al obtener {tabla}: {e}")
+            return []
+        grouped = {}
+        for lot in lots:
+            grouped.setdefault(str(lot['ticker']).upper(), []).append(lot)
+        positions = []
+        for ticker, rows in sorted(grouped.items()):
+            movements = [m for m in (_lot_purchase(tabla, lot) for lot in rows) if m]
+            position = build_position(tabla, ticker, movements)
+            latest = max(rows, key=lambda lot: lot['id'])
+            position.update({column: latest.get(column) for column in LOT_INFO[tabla]})
+            positions.append(position)
+        return positions
+    
+    def _movements_from_lots(self, tablas):
+        """Compras de los lotes de ``tablas`` como movimientos (sin libro)"""
+        movements = []
+        for tabla in tablas:
+            try:
+                lots = self._get_table(tabla)
+            except Exception as e:
+                print(f"Error al obtener {tabla}: {e}")
+                continue
+            movements.extend(m for m in (_lot_purchase(tabla, lot) for lot in lots) if m)
+        return movements
@@ -0,0 +1,143 @@
+import os
+from datetime import timedelta
+import pandas as pd
+from utils.cache import TTLCache, MISSING
+from utils.metrics import registry
+from utils.providers import get_provider
+from utils.ticker_metadata import get_ticker_metadata
+from utils.tracing import span
+
+# Divisa en la que se valoran todas las posiciones (los precios de compra se
+# guardan en esta divisa)
+BASE_CURRENCY = os.environ.get("BASE_CURRENCY", "EUR").upper()
+
+CURRENCY_SYMBOLS = {'EUR': '€', 'USD': '$', 'GBP': '£', 'JPY': '¥'}
+
+# Divisas que Yahoo cotiza en su subunidad (peniques, centavos...): divisa y divisor
+MINOR_UNITS = {'GBp': ('GBP', 100), 'GBX': ('GBP', 100), 'ZAc': ('ZAR', 100), 'ILA': ('ILS', 100)}
+
+# Divisa por sufijo del ticker mientras no se conocen sus metadatos
+SUFFIX_CURRENCIES = {
+    'MC': 'EUR', 'PA': 'EUR', 'DE': 'EUR', 'F': 'EUR', 'AS': 'EUR', 'MI': 'EUR', 'BR': 'EUR',
+    'LS': 'EUR', 'VI': 'EUR', 'IR': 'EUR', 'HE': 'EUR', 'L': 'GBp', 'SW': 'CHF', 'TO': 'CAD',
+    'T': 'JPY', 'HK': 'HKD', 'AX': 'AUD', 'ST': 'SEK', 'CO': 'DKK', 'OL': 'NOK'
+}
+
+# Tipos de cambio por par (divisa, base); FX_CACHE_TTL en segundos
+fx_cache = TTLCache(ttl=float(os.environ.get("FX_CACHE_TTL", 900)), max_entries=200)
+registry.register_cache('fx', fx_cache)
+
+def currency_symbol(currency=BASE_CURRENCY):
+    """Símbolo para mostrar importes en ``currency`` (el código si no hay símbolo)"""
+    return CURRENCY_SYMBOLS.get(currency, f"{currency} ")
+
+def ticker_currencies(tickers):
+    """Divisa de cotización de cada ticker (None si aún no se conoce)
+
+    Sale de la caché de metadatos sin esperar a la red; mientras falta se
+    deduce del sufijo del ticker (``SAN.MC`` -> EUR).
+    """
+    tickers = [str(ticker).upper() for ticker in tickers]
+    metadata = get_ticker_metadata().cached(tickers)
+    currencies = []
+    for ticker in tickers:
+        currency = (metadata.get(ticker) or {}).get('currency')
+        if not currency and '.' in ticker:
+            currency = SUFFIX_CURRENCIES.get(ticker.rsplit('.', 1)[1])
+        currencies.append(currency)
+    return currencies
+
+def fx_pairs(currencies, base=BASE_CURRENCY):
+    """Par de Yahoo con el tipo a ``base`` de cada divisa: {divisa: 'USDEUR=X'}"""
+    pairs = {}
+    for currency in set(filter(None, currencies)):
+        major = MINOR_UNITS.get(currency, (currency, 1))[0]
+        if major != base:
+            pairs[currency] = f"{major}{base}=X"
+    return pairs
+
+def get_rates(currencies, base=BASE_CURRENCY):
+    """Tipos de cambio a ``base``: {divisa: unidades de base por unidad de divisa}
+
+    Las subunidades (GBp...) se resuelven con el tipo de su divisa. Los pares
+    que no están en caché se piden todos en una única descarga en bloque; los
+    que no se obtienen se omiten del resultado.
+    """
+    majors = {MINOR_UNITS.get(currency, (currency, 1))[0] for currency in currencies if currency}
+    rates = {base: 1.0}
+    missing = []
+    for currency in majors - {base}:
+        rate = fx_cache.get((currency, base))
+        if rate is MISSING:
+            missing.append(currency)
+        else:
+            rates[currency] = rate
+
+    if missing:
+        pairs = {f"{currency}{base}=X": currency for currency in sorted(missing)}
+        start = get_provider().today() - timedelta(days=10)
+        with span('fx.get_rates', pairs=len(pairs)):
+            bars = get_provider().bulk_history(list(pairs), start)
+        for pair, currency in pairs.items():
+            closes = bars[pair]['Close'].dropna() if pair in bars else pd.Series(dtype=float)
+            if closes.empty:
+                print(f"Sin tipo de cambio {currency}/{base}: los importes en {currency} no se convierten")
+                continue
+            rates[currency] = float(closes.iloc[-1])
+            fx_cache.set((currency, base), rates[currency])
+
+    result = {}
+    for currency in currencies:
+        major, divisor = MINOR_UNITS.get(currency, (currency, 1))
+        if currency and major in rates:
+            result[currency] = rates[major] / divisor
+    return result
+
+def convert_quotes(tickers, quotes, base=BASE_CURRENCY):
+    """Pasa a ``base`` el precio y el cambio diario absoluto de cada cotización
+
+    Una sola pasada vectorizada con un tipo por fila; los porcentajes no
+    cambian. Cada cotización añade ``currency`` (su divisa original). Las de
+    divisa desconocida o sin tipo de cambio se dejan como están.
+    """
+    if not quotes:
+        return quotes
+    currencies = pd.Series(ticker_currencies(tickers), dtype=object)
+    rates = get_rates(set(currencies.dropna()), base)
+    factor = currencies.map(rates).astype(float).fillna(1.0)
+
+    frame = pd.DataFrame(quotes)
+    frame['currency'] = currencies
+    if (factor != 1.0).any():
+        for column in ('price', 'daily_change_abs'):
+            frame[column] = pd.to_numeric(frame[column], errors='coerce') * factor
+    # Sin precio sigue siendo None (no NaN) para el resto de la app
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict('records')
+
+def convert_closes(closes, currencies, pair_closes, base=BASE_CURRENCY):
+    """Pasa a ``base`` una tabla de cierres con el tipo de cambio de cada día
+
+    ``currencies`` es {ticker: divisa} y ``pair_closes`` los cierres de los
+    pares de ``fx_pairs``. Se multiplica una columna entera por divisa (no
+    hay bucles por día); los días sin tipo toman el último conocido. Las
+    columnas de divisa desconocida o sin tipo se dejan como están.
+    """
+    closes = closes.copy()
+    pairs = fx_pairs(currencies.values(), base)
+    by_currency = {}
+    for ticker, currency in currencies.items():
+        if ticker in closes.columns and currency:
+            by_currency.setdefault(currency, []).append(ticker)
+    for currency, tickers in by_currency.items():
+        divisor = MINOR_UNITS.get(currency, (currency, 1))[1]
+        pair = pairs.get(currency)
+        if pair is None:
+            rate = 1.0
+        elif pair in pair_closes.columns and pair_closes[pair].notna().any():
+            rate = pair_closes[pair].reindex(closes.index).ffill().bfill()
+        else:
+            print(f"Sin histórico de {pair}: los cierres en {currency} no se convierten")
+            continue
+        closes[tickers] = closes[tickers].mul(rate / divisor, axis=0)
+    return closes
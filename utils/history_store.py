@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+import pandas as pd
+from utils.providers import MARKET_DATA_PROVIDER
+
+# En Vercel solo /tmp es escribible; en local se guarda junto al proyecto
+DEFAULT_DATA_DIR = (
+    tempfile.gettempdir() if os.environ.get("VERCEL")
+    else os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+)
+# Cada proveedor de datos tiene su propio histórico
+HISTORY_DB_PATH = os.environ.get("HISTORY_DB_PATH") or os.path.join(
+    DEFAULT_DATA_DIR,
+    "history.db" if MARKET_DATA_PROVIDER == "yfinance" else f"history-{MARKET_DATA_PROVIDER}.db"
+)
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+class HistoryStore:
+    """Almacén local en SQLite de barras diarias (OHLCV) por ticker"""
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bars (
+                    ticker TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    open REAL, high REAL, low REAL, close REAL, volume REAL,
+                    PRIMARY KEY (ticker, date)
+                )
+            """)
+            # Rango ya sincronizado de cada ticker (start = inicio pedido, no la primera barra)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS coverage (
+                    ticker TEXT PRIMARY KEY,
+                    start_date TEXT NOT NULL,
+                    last_date TEXT NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def coverage(self, tickers):
+        """Rango sincronizado por ticker: {ticker: (inicio, última barra)}"""
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        placeholders = ",".join("?" * len(tickers))
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT ticker, start_date, last_date FROM coverage WHERE ticker IN ({placeholders})",
+                tickers
+            ).fetchall()
+        return {ticker: (start, last) for ticker, start, last in rows}
+
+    def save_bars(self, ticker, bars, start):
+        """Inserta o sustituye las barras de un ticker y amplía su cobertura"""
+        self.save_many({ticker: bars}, {ticker: start})
+
+    def save_many(self, bars, starts):
+        """``save_bars`` de varios tickers ({ticker: DataFrame}) en una sola transacción"""
+        if not bars:
+            return
+        rows, last_dates = [], {}
+        frames = {ticker: frame for ticker, frame in bars.items() if not frame.empty}
+        if frames:
+            data = pd.concat(frames, names=['ticker', 'date'])
+            data = data.reindex(columns=BAR_COLUMNS).dropna(subset=['Close'])
+            tickers = data.index.get_level_values('ticker')
+            dates = pd.DatetimeIndex(data.index.get_level_values('date')).strftime('%Y-%m-%d')
+            values = data.astype(object).where(data.notna(), None).to_numpy().tolist()
+            rows = [(ticker, date, *row) for ticker, date, row in zip(tickers, dates, values)]
+            last_dates = pd.Series(dates, index=tickers).groupby(level=0).max().to_dict()
+
+        coverage = []
+        for ticker in bars:
+            start = pd.Timestamp(starts[ticker]).strftime('%Y-%m-%d')
+            coverage.append((ticker, start, last_dates.get(ticker, start)))
+
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO bars (ticker, date, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.executemany("""
+                INSERT INTO coverage (ticker, start_date, last_date) VALUES (?, ?, ?)
+                ON CONFLICT(ticker) DO UPDATE SET
+                    start_date = MIN(start_date, excluded.start_date),
+                    last_date = MAX(last_date, excluded.last_date)
+            """, coverage)
+
+    def get_closes(self, tickers, start=None):
+        """Cierres diarios como DataFrame (índice fecha, una columna por ticker)"""
+        tickers = list(tickers)
+        if not tickers:
+            return pd.DataFrame()
+        placeholders = ",".join("?" * len(tickers))
+        query = f"SELECT ticker, date, close FROM bars WHERE ticker IN ({placeholders})"
+        params = list(tickers)
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+
+        with closing(self._connect()) as conn:
+            data = pd.read_sql_query(query, conn, params=params, parse_dates=['date'])
+        if data.empty:
+            return pd.DataFrame(columns=tickers)
+        return data.pivot(index='date', columns='ticker', values='close').sort_index()
+
+class ClosesCache:
+    """Matriz de cierres en memoria sobre el ``HistoryStore``
+
+    La primera lectura de cada ticker trae de SQLite todo su histórico desde
+    ``start``; las siguientes solo releen las barras desde la última que
+    tiene en memoria (incluida, porque la del día en curso aún puede
+    cambiar). Para series largas de muchos tickers evita releer millones de
+    filas. Los tickers cuyo histórico aún no cubre ``start`` se releen
+    completos hasta que la sincronización lo complete.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.frame = pd.DataFrame(index=pd.DatetimeIndex([], name='date'))
+        self.starts = {}
+        self._lock = threading.Lock()
+
+    def get_closes(self, tickers, start):
+        """Cierres desde ``start`` (igual que ``HistoryStore.get_closes``)"""
+        tickers = list(tickers)
+        start = pd.Timestamp(start)
+        with self._lock:
+            frame = self.frame
+            reload = [t for t in tickers if t not in self.starts or self.starts[t] > start]
+            known = [t for t in tickers if t not in reload]
+            if known and not frame.empty:
+                # Desde la última barra en memoria del ticker más atrasado
+                since = frame[known].notna().cumsum().idxmax().min()
+                recent = self.store.get_closes(known, since)
+                if not recent.empty:
+                    frame = frame.reindex(frame.index.union(recent.index))
+                    frame.update(recent)
+            if reload:
+                full = self.store.get_closes(reload, start)
+                full.index = pd.DatetimeIndex(full.index, name='date')
+                frame = pd.concat([frame.drop(columns=reload, errors='ignore'), full], axis=1).sort_index()
+                coverage = self.store.coverage(reload)
+                self.starts.update({
+                    ticker: start for ticker in reload
+                    if ticker in coverage and pd.Timestamp(coverage[ticker][0]) <= start
+                })
+            self.frame = frame
+        closes = frame.reindex(columns=tickers)
+        return closes[closes.index >= start].dropna(how='all')
+
+_store = None
+_closes_cache = None
+
+def get_history_store():
+    """Almacén compartido por el proceso (se crea al primer uso)"""
+    global _store
+    if _store is None:
+        _store = HistoryStore()
+    return _store
+
+def get_closes_cache():
+    """Matriz de cierres en memoria compartida por el proceso (se crea al primer uso)"""
+    global _closes_cache
+    store = get_history_store()
+    if _closes_cache is None or _closes_cache.store is not store:
+        _closes_cache = ClosesCache(store)
+    return _closes_cache
@@ -0,0 +1,135 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+
+# Campos de cada tabla: (columna, conversión, obligatorio)
+HOLDING_FIELDS = {
+    'fondos': [
+        ('nombre', str, True),
+        ('ticker', str, True),
+        ('tipo', str, True),
+        ('valor_compra', float, True),
+        ('cantidad', float, True),
+        ('fecha_compra', str, True)
+    ],
+    'acciones': [
+        ('nombre', str, True),
+        ('ticker', str, True),
+        ('sector', str, False),
+        ('precio_compra', float, True),
+        ('num_acciones', int, True),
+        ('fecha_compra', str, True)
+    ]
+}
+
+FONDO_TIPOS = ['RF', 'RV']
+
+def export_columns(table):
+    """Columnas de exportación: id (para reimportar con upsert) y los campos de la tabla"""
+    return ['id'] + [name for name, _, _ in HOLDING_FIELDS[table]]
+
+def parse_upload(contents, filename):
+    """Lee el contenido de un ``dcc.Upload`` (CSV o JSON) como lista de diccionarios"""
+    _, data = contents.split(',', 1)
+    text = base64.b64decode(data).decode('utf-8-sig')
+
+    if filename.lower().endswith('.json'):
+        records = json.loads(text)
+        if isinstance(records, dict):
+            records = [records]
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise ValueError("El JSON debe ser una lista de objetos")
+        return records
+
+    if filename.lower().endswith('.csv'):
+        # Admite CSV con coma o punto y coma (Excel en español)
+        dialect = csv.Sniffer().sniff(text.splitlines()[0] if text else ',', delimiters=',;')
+        return list(csv.DictReader(io.StringIO(text), dialect=dialect))
+
+    raise ValueError("Formato no soportado: usa un archivo .csv o .json")
+
+def _convert(value, kind):
+    if kind is str:
+        return str(value).strip()
+    if isinstance(value, str):
+        value = value.strip().replace(',', '.')
+    number = float(value)
+    if kind is int:
+        if not number.is_integer():
+            raise ValueError
+        return int(number)
+    return number
+
+def validate_rows(table, records):
+    """Valida y normaliza filas importadas
+
+    Devuelve ``(filas, errores)``: las filas válidas listas para insertar y
+    un mensaje por cada fila descartada (numeradas desde 1).
+    """
+    rows, errors = [], []
+    for index, record in enumerate(records, start=1):
+        record = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+        row, problems = {}, []
+
+        for name, kind, required in HOLDING_FIELDS[table]:
+            value = record.get(name)
+            if value is None or str(value).strip() == '':
+                if required:
+                    problems.append(f"falta '{name}'")
+                continue
+            try:
+                row[name] = _convert(value, kind)
+            except (TypeError, ValueError):
+                problems.append(f"'{name}' no es válido ({value})")
+
+        if 'ticker' in row:
+            row['ticker'] = row['ticker'].upper()
+        if table == 'acciones':
+            row['sector'] = row.get('sector') or 'N/A'
+        if table == 'fondos' and row.get('tipo') is not None:
+            row['tipo'] = row['tipo'].upper()
+            if row['tipo'] not in FONDO_TIPOS:
+                problems.append(f"'tipo' debe ser {' o '.join(FONDO_TIPOS)}")
+        for name in ('valor_compra', 'cantidad', 'precio_compra', 'num_acciones'):
+            if name in row and row[name] <= 0:
+                problems.append(f"'{name}' debe ser mayor que 0")
+        if 'fecha_compra' in row:
+            try:
+                row['fecha_compra'] = datetime.strptime(row['fecha_compra'][:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError:
+                problems.append("'fecha_compra' debe tener formato AAAA-MM-DD")
+
+        # Con id se actualiza la posición existente en lugar de crear otra
+        if record.get('id') not in (None, ''):
+            try:
+                row['id'] = _convert(record['id'], int)
+            except (TypeError, ValueError):
+                problems.append(f"'id' no es válido ({record['id']})")
+
+        if problems:
+            errors.append(f"Fila {index}: {', '.join(problems)}")
+        else:
+            rows.append(row)
+    return rows, errors
+
+def stream_csv(rows, columns):
+    """Genera un CSV línea a línea a partir de un iterable de filas"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+def stream_json(rows, columns):
+    """Genera una lista JSON fila a fila a partir de un iterable de filas"""
+    yield '['
+    for index, row in enumerate(rows):
+        yield (',' if index else '') + json.dumps({column: row.get(column) for column in columns},
+                                                  ensure_ascii=False)
+    yield ']'
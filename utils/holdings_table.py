@@ -0,0 +1,57 @@
+import json
+import math
+from utils.async_market_data import AsyncMarketData
+from utils.market_data import MarketData
+from utils.database import _filter_rows
+from utils.portfolio import build_portfolio, POSICIONES_COLUMNS
+from utils.table_query import filter_frame
+
+# Columnas calculadas de las tablas de fondos y acciones: se ordenan y filtran
+# por la métrica de la cartera valorada
+METRIC_SORT_COLUMNS = {
+    'Valor Actual': 'precio_actual',
+    'Cambio Diario': 'daily_change_pct',
+    'Cambio Diario (€)': 'daily_change_abs',
+    'Cambio YTD': 'ytd_change',
+    'Ganancia/Pérdida': 'ganancia',
+    'Ganancia/Pérdida (%)': 'ganancia_pct'
+}
+
+def _position_row(position):
+    """Fila de la tabla de una posición: su ticker como id y la fecha de su lote abierto más antiguo"""
+    lots = json.loads(position.get('lotes') or '[]')
+    return {**position, 'id': position['ticker'],
+            'fecha_compra': lots[0][0] if lots else position.get('ultima_fecha')}
+
+async def load_positions_page(adb, tabla, columns, page_current, sort_column, descending, page_size,
+                              filters, budget):
+    """Carga la cartera valorada de ``tabla`` y la página visible dentro de ``budget``
+
+    Las filas son las posiciones abiertas del libro (``get_posiciones``),
+    netas de ventas, una por ticker. ``columns`` traduce los ids de columna
+    de la tabla a campos de la posición y ``filters`` son los filtros de la
+    tabla por id de columna (ver ``parse_filter_query``). Devuelve
+    ``(total, cartera_total, cartera)`` o None si el almacenamiento no
+    responde a tiempo. Si las cotizaciones no llegan, los precios quedan
+    vacíos.
+    """
+    posiciones = await budget.wait(adb.get_posiciones(tabla))
+    if posiciones is None:
+        return None
+    rows = _filter_rows([_position_row(p) for p in posiciones],
+                        [(columns[column], op, value) for column, op, value in filters if column in columns])
+
+    quotes = await budget.wait(AsyncMarketData.get_quotes([row['ticker'] for row in rows],
+                                                          [row['fecha_compra'] for row in rows]))
+    if quotes is None:
+        quotes = [MarketData._quote_from_closes(None, None)] * len(rows)
+    cartera_total = filter_frame(build_portfolio(rows, quotes, POSICIONES_COLUMNS),
+                                 [(METRIC_SORT_COLUMNS[column], op, value) for column, op, value in filters
+                                  if column in METRIC_SORT_COLUMNS])
+
+    total = len(cartera_total)
+    sort_key = METRIC_SORT_COLUMNS.get(sort_column) or columns.get(sort_column, 'ticker')
+    offset = min(page_current or 0, max(math.ceil(total / page_size), 1) - 1) * page_size
+    cartera = (cartera_total.sort_values(sort_key, ascending=not descending, na_position='last', kind='stable')
+               .iloc[offset:offset + page_size]) if total else cartera_total
+    return total, cartera_total, cartera
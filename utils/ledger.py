@@ -0,0 +1,151 @@
+import json
+from datetime import datetime
+
+# Tipos de movimiento del libro: en un dividendo ``cantidad`` son los títulos
+# con derecho y ``precio`` el importe por título
+MOVEMENT_TYPES = ('compra', 'venta', 'dividendo')
+
+# Tablas de posiciones (lotes) cuyas compras se registran en el libro
+LEDGER_TABLES = ('fondos', 'acciones')
+
+# Margen para comparar cantidades fraccionarias (participaciones de fondos)
+EPSILON = 1e-9
+
+def movement_data(tabla, ticker, tipo, cantidad, precio, fecha, lote_id=None):
+    """Fila de la tabla movimientos a partir de sus campos"""
+    if tabla not in LEDGER_TABLES:
+        raise ValueError(f"Tabla desconocida: {tabla}")
+    if tipo not in MOVEMENT_TYPES:
+        raise ValueError(f"Tipo de movimiento desconocido: {tipo}")
+    cantidad = float(cantidad)
+    if cantidad <= 0:
+        raise ValueError("La cantidad debe ser positiva")
+    return {
+        'tabla': tabla,
+        'ticker': str(ticker).strip().upper(),
+        'tipo': tipo,
+        'cantidad': cantidad,
+        'precio': float(precio),
+        'fecha': datetime.strptime(str(fecha)[:10], '%Y-%m-%d').strftime('%Y-%m-%d'),
+        'lote_id': lote_id
+    }
+
+def empty_position(tabla, ticker):
+    """Posición sin movimientos"""
+    return {
+        'tabla': tabla,
+        'ticker': ticker,
+        'cantidad': 0.0,
+        'coste_medio': 0.0,
+        'coste_total': 0.0,
+        'ganancia_realizada': 0.0,
+        'dividendos': 0.0,
+        'lotes': '[]',
+        'ultima_fecha': None,
+        'ultimo_movimiento': None
+    }
+
+def movement_order(movement):
+    """Orden de aplicación: por fecha y, el mismo día, por orden de alta"""
+    id = movement.get('id')
+    return (movement['fecha'], id is None, id or 0)
+
+def applies_after(position, movement):
+    """Indica si ``movement`` va después de todo lo aplicado a ``position``
+
+    Si es así basta con aplicarlo encima (``apply_movement``); si no, hay que
+    rehacer la posición con todos sus movimientos (``build_position``).
+    """
+    last = position.get('ultima_fecha')
+    return last is None or movement_order(movement) >= (last, False, position.get('ultimo_movimiento') or 0)
+
+def apply_movement(position, movement):
+    """Nueva posición tras aplicar un movimiento con lotes FIFO
+
+    Las compras abren un lote; las ventas consumen primero los lotes más
+    antiguos y suman a ``ganancia_realizada`` la diferencia con su coste;
+    los dividendos solo suman a ``dividendos``. Lanza ``ValueError`` si se
+    vende más de lo que hay.
+    """
+    position = dict(position)
+    lots = json.loads(position['lotes'] or '[]')
+    cantidad, precio = float(movement['cantidad']), float(movement['precio'])
+
+    if movement['tipo'] == 'compra':
+        lots.append([movement['fecha'], cantidad, precio])
+    elif movement['tipo'] == 'venta':
+        if cantidad > sum(lot[1] for lot in lots) + EPSILON:
+            raise ValueError(f"No se pueden vender {cantidad:g} de {position['ticker']}: "
+                             f"solo hay {sum(lot[1] for lot in lots):g}")
+        remaining, cost = cantidad, 0.0
+        while remaining > EPSILON and lots:
+            sold = min(remaining, lots[0][1])
+            cost += sold * lots[0][2]
+            lots[0][1] -= sold
+            remaining -= sold
+            if lots[0][1] <= EPSILON:
+                lots.pop(0)
+        position['ganancia_realizada'] += cantidad * precio - cost
+    else:
+        position['dividendos'] += cantidad * precio
+
+    position['cantidad'] = sum(lot[1] for lot in lots)
+    position['coste_total'] = sum(lot[1] * lot[2] for lot in lots)
+    position['coste_medio'] = position['coste_total'] / position['cantidad'] if position['cantidad'] > EPSILON else 0.0
+    position['lotes'] = json.dumps(lots)
+    position['ultima_fecha'] = max(filter(None, [position['ultima_fecha'], movement['fecha']]))
+    if movement.get('id') is not None:
+        position['ultimo_movimiento'] = max(position['ultimo_movimiento'] or 0, movement['id'])
+    return position
+
+def build_position(tabla, ticker, movements, base=None):
+    """Posición completa a partir de todos los movimientos de un ticker
+
+    ``base`` es la fila guardada (conserva su ``id`` y su nombre).
+    """
+    position = {**(base or {}), **empty_position(tabla, ticker)}
+    for movement in sorted(movements, key=movement_order):
+        position = apply_movement(position, movement)
+    return position
+
+def build_positions(movements):
+    """Todas las posiciones de una lista de movimientos: {(tabla, ticker): posición}"""
+    grouped = {}
+    for movement in movements:
+        grouped.setdefault((movement['tabla'], movement['ticker']), []).append(movement)
+    return {key: build_position(*key, rows) for key, rows in grouped.items()}
+
+def cost_flows(movements):
+    """Entradas y salidas de cantidad y coste de cada compra y venta, por fecha
+
+    Una fila por movimiento con ``ticker``, ``fecha_compra``, ``cantidad``
+    (negativa en las ventas) y ``precio``, el coste unitario FIFO de lo que
+    entra o sale; así cantidad × precio es el cambio de capital invertido.
+    Los dividendos no cambian ni cantidad ni coste y se omiten.
+    """
+    grouped = {}
+    for movement in movements:
+        if movement['tipo'] != 'dividendo':
+            grouped.setdefault((movement['tabla'], movement['ticker']), []).append(movement)
+
+    flows = []
+    for (tabla, ticker), rows in grouped.items():
+        position = empty_position(tabla, ticker)
+        try:
+            for movement in sorted(rows, key=movement_order):
+                previous, position = position, apply_movement(position, movement)
+                quantity = position['cantidad'] - previous['cantidad']
+                flows.append({
+                    'ticker': ticker,
+                    'fecha_compra': movement['fecha'],
+                    'cantidad': quantity,
+                    'precio': (position['coste_total'] - previous['coste_total']) / quantity if quantity else 0.0
+                })
+        except ValueError as e:
+            print(f"Movimientos de {ticker} incoherentes: {e}")
+    return flows
+
+def lot_movement(tabla, lot, columns):
+    """Movimiento de compra equivalente a una fila de ``fondos``/``acciones``"""
+    return movement_data(tabla, lot['ticker'], 'compra', lot[columns['quantity']],
+                         lot[columns['purchase_price']], lot['fecha_compra'], lote_id=lot.get('id'))
@@ -0,0 +1,280 @@
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+import math
+import os
+import pytz
+from utils.cache import TTLCache, MISSING
+from utils.history_store import get_history_store
+from utils.metrics import registry
+from utils.tracing import span, wrap
+from utils.ticker_metadata import get_ticker_metadata, LOOKUP_TIMEOUT
+from utils.fx import convert_quotes, currency_symbol
+from utils.portfolio import profit_loss
+from utils.providers import get_provider, MAX_WORKERS, FETCH_TIMEOUT
+
+# Margen de días naturales antes del 1 de enero para disponer siempre del
+# cierre anterior al calcular el cambio diario en la primera sesión del año
+HISTORY_MARGIN_DAYS = 10
+
+# Caché de cotizaciones compartida por todas las páginas del proceso.
+# Claves: (ticker, 'price'), (ticker, 'daily_change') y (ticker, 'ytd', inicio)
+quote_cache = TTLCache(
+    ttl=float(os.environ.get("QUOTE_CACHE_TTL", 60)),
+    max_entries=int(os.environ.get("QUOTE_CACHE_MAX_ENTRIES", 2000))
+)
+registry.register_cache('quotes', quote_cache)
+
+class MarketData:
+    
+    @staticmethod
+    def get_current_price(ticker):
+        """Obtiene precio actual"""
+        return MarketData.get_quotes([ticker])[0]['price']
+    
+    @staticmethod
+    def get_daily_change(ticker):
+        """Obtiene cambio diario en % y valor absoluto"""
+        quote = MarketData.get_quotes([ticker])[0]
+        return quote['daily_change_pct'], quote['daily_change_abs']
+    
+    @staticmethod
+    def get_ytd_change(ticker, purchase_date):
+        """Obtiene cambio Year-to-Date"""
+        return MarketData.get_quotes([ticker], [purchase_date])[0]['ytd_change']
+    
+    @staticmethod
+    def get_quotes(tickers, purchase_dates=None, concurrent=False, refresh=False, ttl=None):
+        """Obtiene precio, cambio diario y YTD de varios tickers a la vez
+
+        Devuelve una lista de dicts en el mismo orden que ``tickers`` con las
+        claves ``price``, ``daily_change_pct``, ``daily_change_abs`` y
+        ``ytd_change``. Si se pasan ``purchase_dates`` (misma longitud), el YTD
+        de cada fila parte de su fecha de compra cuando es de este año, igual
+        que ``get_ytd_change``.
+
+        Los cálculos se hacen sobre el histórico local (ver ``get_history``).
+        Precio y cambio absoluto se devuelven en la divisa base
+        (``utils.fx``), con la divisa original en ``currency``.
+        ``refresh=True`` ignora la caché y vuelve a publicar los datos con el
+        TTL indicado (lo usa el refresco en segundo plano).
+        """
+        tickers = [str(ticker).upper() for ticker in tickers]
+        if purchase_dates is None:
+            purchase_dates = [None] * len(tickers)
+        if not tickers:
+            return []
+        
+        start_of_year = datetime(get_provider().today().year, 1, 1)
+        keys = [
+            (ticker, MarketData._ytd_start(purchase_date, start_of_year).strftime('%Y-%m-%d'))
+            for ticker, purchase_date in zip(tickers, purchase_dates)
+        ]
+        
+        # Solo se descargan los tickers que no están (completos) en la caché
+        quotes = {}
+        for key in ([] if refresh else set(keys)):
+            quote = MarketData._cached_quote(*key)
+            if quote is not None:
+                quotes[key] = quote
+        pending = [key for key in set(keys) if key not in quotes]
+        
+        if pending:
+            pending_tickers = sorted({ticker for ticker, _ in pending})
+            with span('market_data.get_quotes', tickers=len(pending_tickers), cached=len(quotes)):
+                closes = MarketData.get_history(
+                    pending_tickers, start_of_year - timedelta(days=HISTORY_MARGIN_DAYS), concurrent
+                )
+            
+            for ticker, ytd_start in pending:
+                series = closes[ticker].dropna() if ticker in closes.columns else None
+                quote = MarketData._quote_from_closes(series, ytd_start)
+                MarketData._store_quote(ticker, ytd_start, quote, ttl)
+                quotes[(ticker, ytd_start)] = quote
+        
+        return convert_quotes(tickers, [dict(quotes[key]) for key in keys])
+    
+    @staticmethod
+    def _cached_quote(ticker, ytd_start):
+        """Recompone una cotización desde la caché, o None si falta algún campo"""
+        price = quote_cache.get((ticker, 'price'))
+        daily_change = quote_cache.get((ticker, 'daily_change'))
+        ytd_change = quote_cache.get((ticker, 'ytd', ytd_start))
+        if any(value is MISSING for value in (price, daily_change, ytd_change)):
+            return None
+        return {
+            'price': price,
+            'daily_change_pct': daily_change[0],
+            'daily_change_abs': daily_change[1],
+            'ytd_change': ytd_change
+        }
+    
+    @staticmethod
+    def _store_quote(ticker, ytd_start, quote, ttl=None):
+        """Guarda en la caché los campos de una cotización"""
+        quote_cache.set((ticker, 'price'), quote['price'], ttl)
+        quote_cache.set((ticker, 'daily_change'),
+                        (quote['daily_change_pct'], quote['daily_change_abs']), ttl)
+        quote_cache.set((ticker, 'ytd', ytd_start), quote['ytd_change'], ttl)
+    
+    @staticmethod
+    def cache_stats():
+        """Aciertos/fallos de la caché de cotizaciones"""
+        return quote_cache.stats()
+    
+    @staticmethod
+    def get_history(tickers, start, concurrent=False):
+        """Cierres diarios desde ``start`` (índice fecha, una columna por ticker)
+
+        Sincroniza antes el histórico local, que solo descarga las barras
+        posteriores a la última guardada de cada ticker.
+        """
+        tickers = [str(ticker).upper() for ticker in tickers]
+        MarketData.sync_history(tickers, start, concurrent)
+        with span('history_store.get_closes', tickers=len(tickers)):
+            return get_history_store().get_closes(tickers, start)
+    
+    @staticmethod
+    def sync_history(tickers, start, concurrent=False):
+        """Trae al histórico local las barras que faltan desde ``start``
+
+        Los tickers ya cubiertos desde ``start`` se actualizan desde su última
+        barra (incluida, porque la del día en curso aún puede cambiar); el
+        resto se descarga completo desde ``start``. Como mucho son dos
+        descargas en bloque. Los tickers que falten en la descarga en bloque
+        se piden uno a uno en paralelo; con ``concurrent=True`` se omite la
+        descarga en bloque. Los datos salen del proveedor activo
+        (``utils.providers``).
+        """
+        store = get_history_store()
+        start = pd.Timestamp(start).strftime('%Y-%m-%d')
+        groups, backfill = MarketData._sync_groups(tickers, start, store.coverage(tickers))
+        
+        for fetch_from, group in groups:
+            with span('market_data.sync_group', tickers=len(group), since=fetch_from):
+                bars = {} if concurrent else get_provider().bulk_history(group, fetch_from)
+                missing = [ticker for ticker in group if ticker not in bars]
+                if missing:
+                    bars.update(MarketData.fetch_history_concurrent(missing, fetch_from))
+                with span('history_store.save_bars', tickers=len(bars)):
+                    # La cobertura se amplía desde ``start`` aunque el ticker empiece más tarde
+                    store.save_many(bars, {ticker: start if ticker in backfill else fetch_from
+                                           for ticker in bars})
+    
+    @staticmethod
+    def _sync_groups(tickers, start, coverage):
+        """Descargas en bloque de ``sync_history``: ([(desde, tickers)], tickers a rellenar desde ``start``)"""
+        incremental = [t for t in tickers if t in coverage and coverage[t][0] <= start]
+        groups = []
+        if incremental:
+            groups.append((min(coverage[t][1] for t in incremental), incremental))
+        backfill = [t for t in tickers if t not in incremental]
+        if backfill:
+            groups.append((start, backfill))
+        return groups, backfill
+    
+    @staticmethod
+    def fetch_history_concurrent(tickers, start, max_workers=None, timeout=None):
+        """Descarga las barras de cada ticker en paralelo con un pool acotado
+
+        Cada ticker hace una única petición ``history()`` con su propio
+        ``timeout``; los que fallan o no responden a tiempo se omiten del
+        resultado ({ticker: DataFrame OHLCV}).
+        """
+        if not tickers:
+            return {}
+        max_workers = max_workers or MAX_WORKERS
+        timeout = timeout or FETCH_TIMEOUT
+        
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(tickers)))
+        provider = get_provider()
+        futures = {
+            ticker: executor.submit(wrap(provider.history), ticker, start, timeout)
+            for ticker in tickers
+        }
+        # Espera máxima: un timeout por cada "tanda" de peticiones del pool
+        rounds = math.ceil(len(tickers) / max_workers)
+        done, _ = wait(futures.values(), timeout=timeout * rounds)
+        executor.shutdown(wait=False, cancel_futures=True)
+        
+        bars = {}
+        for ticker, future in futures.items():
+            if future in done and future.exception() is None:
+                frame = future.result()
+                if frame is not None and not frame.empty:
+                    bars[ticker] = frame
+        return bars
+    
+    @staticmethod
+    def _ytd_start(purchase_date, start_of_year):
+        """Fecha de inicio del YTD: la de compra si es de este año"""
+        if purchase_date:
+            try:
+                purchase_dt = datetime.strptime(purchase_date, '%Y-%m-%d')
+                if purchase_dt.year == start_of_year.year:
+                    return purchase_dt
+            except (TypeError, ValueError):
+                pass
+        return start_of_year
+    
+    @staticmethod
+    def _quote_from_closes(closes, ytd_start):
+        """Calcula precio, cambio diario y YTD a partir de una serie de cierres"""
+        quote = {
+            'price': None,
+            'daily_change_pct': 0,
+            'daily_change_abs': 0,
+            'ytd_change': 0
+        }
+        if closes is None or closes.empty:
+            return quote
+        
+        current = float(closes.iloc[-1])
+        quote['price'] = current
+        
+        if len(closes) >= 2:
+            previous = float(closes.iloc[-2])
+            quote['daily_change_abs'] = current - previous
+            quote['daily_change_pct'] = ((current - previous) / previous) * 100
+        
+        ytd = closes[closes.index >= pd.Timestamp(ytd_start)]
+        if len(ytd) >= 2:
+            first_price = float(ytd.iloc[0])
+            quote['ytd_change'] = ((current - first_price) / first_price) * 100
+        
+        return quote
+    
+    @staticmethod
+    def get_sector(ticker):
+        """Obtiene el sector de una acción (de la caché persistente de metadatos)"""
+        metadata = MarketData.get_metadata(ticker)
+        return (metadata or {}).get('sector') or 'N/A'
+    
+    @staticmethod
+    def get_metadata(ticker, timeout=None):
+        """Sector, nombre, divisa y mercado de un ticker (ver ``utils.ticker_metadata``)"""
+        return get_ticker_metadata().lookup(ticker, LOOKUP_TIMEOUT if timeout is None else timeout)
+    
+    @staticmethod
+    def calculate_profit_loss(purchase_price, current_price, quantity):
+        """Calcula ganancias/pérdidas"""
+        if current_price is None:
+            return 0, 0
+        
+        profit_loss_abs, profit_loss_pct = profit_loss(purchase_price, current_price, quantity)
+        return float(profit_loss_abs), float(profit_loss_pct)
+    
+    @staticmethod
+    def format_currency(value):
+        """Formatea valores monetarios"""
+        if value is None:
+            return "N/A"
+        return f"{currency_symbol()}{value:,.2f}"
+    
+    @staticmethod
+    def format_percentage(value):
+        """Formatea porcentajes"""
+        if value is None:
+            return "N/A"
+        sign = "+" if value >= 0 else ""
+        return f"{sign}{value:.2f}%"
@@ -0,0 +1,182 @@
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request
+from utils.tracing import span
+
+# Límites (s) de los histogramas de latencia
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in [*zip(names, values), *extra]]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """Familia de series con las mismas etiquetas (formato de texto de Prometheus)"""
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+class Counter(Metric):
+    """Contador creciente por combinación de etiquetas"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_labels(self.labels, key)} {value}"]
+
+class Histogram(Metric):
+    """Histograma acumulado (buckets, suma y número de observaciones)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._series.get(key, ([0] * len(self.buckets), 0.0, 0))
+            counts = [c + (value <= bound) for c, bound in zip(counts, self.buckets)]
+            self._series[key] = (counts, total + value, count + 1)
+
+    def _render_series(self, key, value):
+        counts, total, count = value
+        lines = [
+            f"{self.name}_bucket{_labels(self.labels, key, [('le', bound)])} {c}"
+            for bound, c in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total}")
+        lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+class Registry:
+    """Métricas del proceso y cachés cuyos aciertos/fallos se publican"""
+
+    def __init__(self):
+        self.metrics = []
+        self.caches = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self.metrics.append(metric)
+
+    def register_cache(self, name, cache):
+        """Publica los contadores de un ``TTLCache`` como ``cache_requests_total``"""
+        with self._lock:
+            self.caches[name] = cache
+
+    def render(self):
+        """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)"""
+        lines = []
+        for metric in list(self.metrics):
+            lines.extend(metric.render())
+        if self.caches:
+            lines += ["# HELP cache_requests_total Consultas a las cachés en memoria",
+                      "# TYPE cache_requests_total counter"]
+            for name, cache in sorted(self.caches.items()):
+                lines.append(f'cache_requests_total{{cache="{name}",result="hit"}} {cache.hits}')
+                lines.append(f'cache_requests_total{{cache="{name}",result="miss"}} {cache.misses}')
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+CALLBACK_DURATION = Histogram(
+    'dash_callback_duration_seconds', "Duración de los callbacks de Dash en el servidor", ['callback']
+)
+CALLBACK_ERRORS = Counter(
+    'dash_callback_errors_total', "Callbacks de Dash que terminaron con error", ['callback']
+)
+UPSTREAM_CALLS = Counter(
+    'upstream_calls_total', "Llamadas a la base de datos y al proveedor de mercado",
+    ['service', 'operation', 'target', 'status']
+)
+UPSTREAM_DURATION = Histogram(
+    'upstream_call_duration_seconds', "Latencia de las llamadas a la base de datos y al proveedor de mercado",
+    ['service', 'operation', 'target']
+)
+
+@contextmanager
+def track(service, operation, target=''):
+    """Cuenta y cronometra una llamada externa (``target``: tabla o ticker)
+
+    También abre un span de ``utils.tracing`` si hay una traza activa. Los
+    errores se cuentan con ``status="error"`` y se vuelven a lanzar.
+    """
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        with span(f"{service}.{operation}", target=target):
+            yield
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        UPSTREAM_DURATION.observe(time.perf_counter() - start, service=service,
+                                  operation=operation, target=target)
+        UPSTREAM_CALLS.inc(service=service, operation=operation, target=target, status=status)
+
+def instrument_dash(app):
+    """Cronometra en el servidor cada callback de ``app`` (por nombre de función)"""
+    server = app.server
+
+    @server.before_request
+    def _start_timer():
+        if request.path.endswith('/_dash-update-component'):
+            g.callback_start = time.perf_counter()
+
+    def _observe(error):
+        start = g.pop('callback_start', None)
+        if start is None:
+            return
+        body = request.get_json(silent=True) or {}
+        output = body.get('output', '')
+        function = app.callback_map.get(output, {}).get('callback')
+        name = getattr(function, '__name__', None) or output
+        CALLBACK_DURATION.observe(time.perf_counter() - start, callback=name)
+        if error:
+            CALLBACK_ERRORS.inc(callback=name)
+
+    @server.after_request
+    def _record_callback(response):
+        # PreventUpdate responde 204; solo los 5xx son errores
+        _observe(response.status_code >= 500)
+        return response
+
+    @server.teardown_request
+    def _record_failed_callback(exc):
+        # Excepciones no capturadas: Flask no llega a ejecutar after_request
+        _observe(True)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Columnas de cantidad y precio de compra de cada tabla
+FONDOS_COLUMNS = {'quantity': 'cantidad', 'purchase_price': 'valor_compra'}
+ACCIONES_COLUMNS = {'quantity': 'num_acciones', 'purchase_price': 'precio_compra'}
+# Posiciones materializadas del libro de movimientos (``utils.ledger``)
+POSICIONES_COLUMNS = {'quantity': 'cantidad', 'purchase_price': 'coste_medio'}
+# Flujos de compras y ventas del libro (``utils.ledger.cost_flows``)
+FLUJOS_COLUMNS = {'quantity': 'cantidad', 'purchase_price': 'precio'}
+
+QUOTE_FIELDS = ['price', 'daily_change_pct', 'daily_change_abs', 'ytd_change']
+METRIC_COLUMNS = ['precio_actual', 'invertido', 'valor_actual', 'ganancia', 'ganancia_pct', 'peso']
+
+def profit_loss(purchase_price, current_price, quantity):
+    """Ganancia/pérdida absoluta y en % (escalares o arrays de NumPy)"""
+    quantity = np.asarray(quantity, dtype=float)
+    invested = np.asarray(purchase_price, dtype=float) * quantity
+    profit = np.asarray(current_price, dtype=float) * quantity - invested
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_pct = np.where(invested > 0, profit / invested * 100, 0.0)
+    return profit, profit_pct
+
+def build_portfolio(holdings, quotes, columns):
+    """Une posiciones y cotizaciones en un DataFrame con todas las métricas
+
+    ``holdings`` son las filas de la base de datos, ``quotes`` la lista
+    alineada que devuelve ``MarketData.get_quotes`` y ``columns`` el mapa de
+    columnas de la tabla (``FONDOS_COLUMNS`` o ``ACCIONES_COLUMNS``). Las
+    posiciones sin precio valen 0, como en las tablas.
+    """
+    df = pd.DataFrame(holdings)
+    if df.empty:
+        return pd.DataFrame(columns=list(df.columns) + QUOTE_FIELDS + METRIC_COLUMNS)
+
+    quotes = pd.DataFrame(list(quotes), index=df.index, columns=QUOTE_FIELDS)
+    df = df.join(quotes)
+
+    quantity = df[columns['quantity']].astype(float)
+    price = pd.to_numeric(df['price'], errors='coerce')
+
+    df['precio_actual'] = price
+    df['invertido'] = df[columns['purchase_price']].astype(float) * quantity
+    df['valor_actual'] = (price * quantity).fillna(0)
+    df['ganancia'] = df['valor_actual'] - df['invertido']
+    df['ganancia_pct'] = np.where(
+        df['invertido'] > 0, df['ganancia'] / df['invertido'].where(df['invertido'] > 0) * 100, 0.0
+    )
+    total = df['valor_actual'].sum()
+    df['peso'] = df['valor_actual'] / total * 100 if total else 0.0
+    return df
+
+def portfolio_totals(df):
+    """Totales de la cartera: invertido, valor actual y ganancia (absoluta y %)"""
+    invertido = float(df['invertido'].sum()) if not df.empty else 0.0
+    valor_actual = float(df['valor_actual'].sum()) if not df.empty else 0.0
+    ganancia = valor_actual - invertido
+    return {
+        'invertido': invertido,
+        'valor_actual': valor_actual,
+        'ganancia': ganancia,
+        'ganancia_pct': (ganancia / invertido * 100) if invertido > 0 else 0.0
+    }
+
+def group_values(df, column, default='Sin Clasificar'):
+    """Valor actual agregado por una columna (sector, tipo...) en orden de aparición"""
+    keys = df[column].fillna(default) if column in df else pd.Series(default, index=df.index)
+    return df['valor_actual'].groupby(keys, sort=False).sum()
+
+def value_history(holdings, closes, columns):
+    """Valor de mercado e invertido de una tabla de posiciones día a día
+
+    ``closes`` son los cierres diarios (índice fecha, una columna por ticker,
+    ya en la divisa base). Cada posición cuenta desde su fecha de compra (la
+    primera sesión a partir de ella); los días sin cierre toman el último
+    conocido y antes del primero no suman valor. Las cantidades se acumulan
+    en una matriz fecha × ticker y el valor es su producto con los cierres,
+    sin bucles por día. Devuelve un DataFrame con ``valor`` e ``invertido``.
+    """
+    df = pd.DataFrame(holdings)
+    if df.empty or closes.empty:
+        return pd.DataFrame(columns=['valor', 'invertido'], dtype=float)
+
+    tickers = df['ticker'].astype(str).str.upper()
+    universe = pd.Index(sorted(tickers.unique()))
+    prices = closes.reindex(columns=universe).sort_index().ffill()
+    index = prices.index
+
+    # Sesión de entrada de cada posición (sin fecha: desde el principio)
+    purchased = pd.to_datetime(df['fecha_compra'], errors='coerce').fillna(index[0])
+    rows = index.searchsorted(purchased.to_numpy())
+    cols = universe.get_indexer(tickers)
+    active = rows < len(index)
+
+    quantity = df[columns['quantity']].astype(float).to_numpy()
+    invested = df[columns['purchase_price']].astype(float).to_numpy() * quantity
+
+    positions = np.zeros((len(index), len(universe)))
+    np.add.at(positions, (rows[active], cols[active]), quantity[active])
+    capital = np.zeros(len(index))
+    np.add.at(capital, rows[active], invested[active])
+
+    value = np.nansum(positions.cumsum(axis=0) * prices.to_numpy(dtype=float), axis=1)
+    return pd.DataFrame({'valor': value, 'invertido': capital.cumsum()}, index=index)
@@ -0,0 +1,329 @@
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+import httpx
+import pandas as pd
+import yfinance as yf
+from utils.metrics import UPSTREAM_CALLS, track
+
+# Proveedor de cotizaciones: "yfinance" (Yahoo Finance) o "replay" (ficheros grabados)
+MARKET_DATA_PROVIDER = os.environ.get("MARKET_DATA_PROVIDER", "yfinance")
+
+# Directorio de la reproducción: un <TICKER>.csv por ticker (Date,Open,High,Low,Close,Volume)
+# y opcionalmente sectors.json ({ticker: sector o metadatos}). REPLAY_AS_OF fija el "hoy" simulado.
+REPLAY_DATA_DIR = os.environ.get("REPLAY_DATA_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "replay"
+)
+REPLAY_AS_OF = os.environ.get("REPLAY_AS_OF")
+
+# Peticiones simultáneas y timeout (s) de cada petición por ticker
+MAX_WORKERS = int(os.environ.get("MARKET_DATA_MAX_WORKERS", 8))
+FETCH_TIMEOUT = float(os.environ.get("MARKET_DATA_TIMEOUT", 10))
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+class MarketDataProvider:
+    """Interfaz de los proveedores de datos de mercado
+
+    Las barras son DataFrames OHLCV diarios con índice de fechas sin zona
+    horaria. Solo ``history`` y ``sector`` son obligatorios; el resto tiene
+    una implementación por defecto a partir de ellos.
+    """
+
+    name = None
+
+    def history(self, ticker, start, timeout=None):
+        """Barras diarias de un ticker desde ``start`` (None si no hay datos)"""
+        raise NotImplementedError
+
+    def bulk_history(self, tickers, start):
+        """Barras de varios tickers: {ticker: DataFrame}; omite los que fallan"""
+        bars = {}
+        for ticker in tickers:
+            try:
+                frame = self.history(ticker, start)
+            except Exception as e:
+                print(f"Error al obtener el histórico de {ticker}: {e}")
+                continue
+            if frame is not None and not frame.empty:
+                bars[ticker] = frame
+        return bars
+
+    async def history_async(self, ticker, start):
+        """Variante asíncrona de ``history`` (por defecto, en un hilo aparte)"""
+        return await asyncio.to_thread(self.history, ticker, start)
+
+    def quote(self, ticker):
+        """Último cierre y cambio diario de un ticker"""
+        return self.bulk_quotes([ticker])[ticker]
+
+    def bulk_quotes(self, tickers):
+        """Último cierre y cambio diario de varios tickers: {ticker: cotización}"""
+        start = self.today() - timedelta(days=10)
+        bars = self.bulk_history(tickers, start)
+        quotes = {}
+        for ticker in tickers:
+            closes = bars[ticker]['Close'].dropna() if ticker in bars else pd.Series(dtype=float)
+            price = float(closes.iloc[-1]) if len(closes) else None
+            previous = float(closes.iloc[-2]) if len(closes) >= 2 else None
+            quotes[ticker] = {
+                'price': price,
+                'daily_change_pct': (price - previous) / previous * 100 if previous else 0,
+                'daily_change_abs': price - previous if previous else 0
+            }
+        return quotes
+
+    def sector(self, ticker):
+        """Sector de una acción ('N/A' si no se conoce)"""
+        raise NotImplementedError
+
+    def metadata(self, ticker):
+        """Sector, nombre, divisa y mercado de un ticker (None en lo que no se conozca)"""
+        sector = self.sector(ticker)
+        return {'sector': None if sector == 'N/A' else sector, 'name': None,
+                'currency': None, 'exchange': None}
+
+    def today(self):
+        """Fecha de referencia del proveedor"""
+        return datetime.now()
+
+class YFinanceProvider(MarketDataProvider):
+    """Yahoo Finance mediante ``yfinance`` (y su API de gráficos para el modo asíncrono)"""
+
+    name = 'yfinance'
+
+    CHART_URL = "https://query2.finance.yahoo.com/v8/finance/chart/{ticker}"
+    HTTP_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                                  "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"}
+
+    def __init__(self, timeout=FETCH_TIMEOUT, max_connections=MAX_WORKERS):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    def history(self, ticker, start, timeout=None):
+        data = yf.Ticker(ticker).history(start=start, timeout=timeout or self.timeout)
+        if data is None or data.empty:
+            return None
+        data = data.dropna(subset=['Close'])
+        data.index = data.index.tz_localize(None)
+        return data
+
+    def bulk_history(self, tickers, start):
+        """Descarga en bloque: una sola petición para todos los tickers"""
+        try:
+            data = yf.download(tickers, start=start, auto_adjust=True,
+                               progress=False, threads=True)
+        except Exception as e:
+            print(f"Error en la descarga de cotizaciones: {e}")
+            return {}
+
+        if data is None or data.empty:
+            return {}
+
+        # Con varios tickers las columnas son (campo, ticker); con uno, planas
+        if isinstance(data.columns, pd.MultiIndex):
+            frames = {
+                str(ticker).upper(): data.xs(ticker, axis=1, level=1)
+                for ticker in data.columns.get_level_values(1).unique()
+            }
+        else:
+            frames = {tickers[0]: data}
+
+        frames = {ticker: frame.dropna(subset=['Close']) for ticker, frame in frames.items()}
+        return {ticker: frame for ticker, frame in frames.items() if not frame.empty}
+
+    def _http_client(self):
+        """Cliente HTTP asíncrono compartido (debe usarse en el bucle de ``utils.aio``)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self.HTTP_HEADERS,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+        return self._client
+
+    async def history_async(self, ticker, start):
+        """Barras ajustadas desde la API de gráficos de Yahoo (la misma que usa yfinance)"""
+        params = {
+            'period1': int(pd.Timestamp(start).timestamp()),
+            'period2': int(datetime.now().timestamp()) + 86400,
+            'interval': '1d',
+            'events': 'div,splits',
+            'includeAdjustedClose': 'true'
+        }
+        response = await self._http_client().get(self.CHART_URL.format(ticker=ticker), params=params)
+        response.raise_for_status()
+        result = (response.json().get('chart') or {}).get('result') or []
+        if not result or not result[0].get('timestamp'):
+            return None
+
+        chart = result[0]
+        quote = chart['indicators']['quote'][0]
+        # Fecha de la sesión en la hora local del mercado, sin zona horaria
+        offset = chart.get('meta', {}).get('gmtoffset', 0)
+        index = pd.to_datetime([ts + offset for ts in chart['timestamp']], unit='s').normalize()
+        frame = pd.DataFrame({
+            'Open': quote.get('open'),
+            'High': quote.get('high'),
+            'Low': quote.get('low'),
+            'Close': quote.get('close'),
+            'Volume': quote.get('volume')
+        }, index=index, dtype=float)
+
+        # Ajuste por dividendos y splits, como ``auto_adjust=True`` en yfinance
+        adjclose = chart['indicators'].get('adjclose')
+        if adjclose:
+            ratio = pd.Series(adjclose[0]['adjclose'], index=index, dtype=float) / frame['Close']
+            for column in ('Open', 'High', 'Low', 'Close'):
+                frame[column] = frame[column] * ratio
+
+        frame = frame[~frame.index.duplicated(keep='last')].dropna(subset=['Close'])
+        return frame if not frame.empty else None
+
+    def sector(self, ticker):
+        try:
+            return yf.Ticker(ticker).info.get('sector', 'N/A')
+        except Exception as e:
+            print(f"Error al obtener el sector de {ticker}: {e}")
+            return 'N/A'
+
+    def metadata(self, ticker):
+        """Una sola consulta a ``.info`` (lenta: usar a través de ``utils.ticker_metadata``)"""
+        info = yf.Ticker(ticker).info or {}
+        return {
+            'sector': info.get('sector'),
+            'name': info.get('longName') or info.get('shortName'),
+            'currency': info.get('currency'),
+            'exchange': info.get('fullExchangeName') or info.get('exchange')
+        }
+
+class ReplayProvider(MarketDataProvider):
+    """Reproduce barras grabadas en disco, sin red y de forma determinista
+
+    Cada ticker se lee de ``<directorio>/<TICKER>.csv``; con ``as_of`` solo se
+    sirven las barras hasta esa fecha, que pasa a ser el "hoy" del proveedor.
+    """
+
+    name = 'replay'
+
+    def __init__(self, directory=REPLAY_DATA_DIR, as_of=REPLAY_AS_OF):
+        self.directory = directory
+        self.as_of = pd.Timestamp(as_of) if as_of else None
+        self._frames = {}
+        self._sectors = None
+        self._lock = threading.Lock()
+
+    def _load(self, ticker):
+        with self._lock:
+            if ticker not in self._frames:
+                path = os.path.join(self.directory, f"{ticker}.csv")
+                frame = None
+                if os.path.exists(path):
+                    frame = pd.read_csv(path, index_col=0, parse_dates=True)
+                    frame.index = pd.DatetimeIndex(frame.index).tz_localize(None).normalize()
+                    frame = frame.reindex(columns=BAR_COLUMNS).dropna(subset=['Close']).sort_index()
+                    if self.as_of is not None:
+                        frame = frame[frame.index <= self.as_of]
+                self._frames[ticker] = frame
+            return self._frames[ticker]
+
+    def history(self, ticker, start, timeout=None):
+        frame = self._load(str(ticker).upper())
+        if frame is None:
+            return None
+        frame = frame[frame.index >= pd.Timestamp(start)]
+        return frame.copy() if not frame.empty else None
+
+    def _metadata(self, ticker):
+        if self._sectors is None:
+            path = os.path.join(self.directory, "sectors.json")
+            self._sectors = {}
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    # Cada valor es el sector o un objeto {sector, name, currency, exchange}
+                    self._sectors = {k.upper(): v if isinstance(v, dict) else {'sector': v}
+                                     for k, v in json.load(f).items()}
+        return self._sectors.get(str(ticker).upper(), {})
+
+    def sector(self, ticker):
+        return self._metadata(ticker).get('sector') or 'N/A'
+
+    def metadata(self, ticker):
+        data = self._metadata(ticker)
+        return {field: data.get(field) for field in ('sector', 'name', 'currency', 'exchange')}
+
+    def today(self):
+        return self.as_of.to_pydatetime() if self.as_of is not None else datetime.now()
+
+    @staticmethod
+    def record(source, tickers, start, directory=REPLAY_DATA_DIR):
+        """Graba en ``directory`` las barras de ``source`` para reproducirlas después"""
+        os.makedirs(directory, exist_ok=True)
+        bars = source.bulk_history(list(tickers), start)
+        for ticker, frame in bars.items():
+            frame.reindex(columns=BAR_COLUMNS).to_csv(os.path.join(directory, f"{ticker}.csv"),
+                                                      index_label='Date')
+        return sorted(bars)
+
+class TrackedProvider:
+    """Envuelve un proveedor y registra cada llamada en ``utils.metrics`` (por ticker)"""
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    def history(self, ticker, start, timeout=None):
+        with track('market_data', 'history', ticker):
+            return self.provider.history(ticker, start, timeout)
+
+    def bulk_history(self, tickers, start):
+        with track('market_data', 'bulk_history', 'bulk'):
+            bars = self.provider.bulk_history(tickers, start)
+        # Los tickers que faltan en la descarga en bloque se piden después uno a uno
+        for ticker in tickers:
+            if ticker not in bars:
+                UPSTREAM_CALLS.inc(service='market_data', operation='bulk_history',
+                                   target=ticker, status='missing')
+        return bars
+
+    async def history_async(self, ticker, start):
+        with track('market_data', 'history_async', ticker):
+            return await self.provider.history_async(ticker, start)
+
+    def sector(self, ticker):
+        with track('market_data', 'sector', ticker):
+            return self.provider.sector(ticker)
+
+    def metadata(self, ticker):
+        with track('market_data', 'metadata', ticker):
+            return self.provider.metadata(ticker)
+
+PROVIDERS = {
+    'yfinance': YFinanceProvider,
+    'replay': ReplayProvider
+}
+
+_provider = None
+
+def get_provider():
+    """Proveedor activo del proceso (``MARKET_DATA_PROVIDER``, se crea al primer uso)"""
+    global _provider
+    if _provider is None:
+        if MARKET_DATA_PROVIDER not in PROVIDERS:
+            raise ValueError(
+                f"MARKET_DATA_PROVIDER desconocido: {MARKET_DATA_PROVIDER}. "
+                f"Opciones: {', '.join(PROVIDERS)}"
+            )
+        _provider = TrackedProvider(PROVIDERS[MARKET_DATA_PROVIDER]())
+    return _provider
+
+def set_provider(provider):
+    """Sustituye el proveedor activo (pruebas de carga, benchmarks)"""
+    global _provider
+    _provider = TrackedProvider(provider)
@@ -0,0 +1,92 @@
+import json
+import os
+import queue
+import threading
+import time
+
+# Segundos entre comentarios keep-alive y duración máxima de cada conexión
+# (el navegador reconecta solo, así no se quedan hilos ocupados indefinidamente)
+HEARTBEAT_INTERVAL = float(os.environ.get("QUOTE_STREAM_HEARTBEAT", 15))
+MAX_STREAM_DURATION = float(os.environ.get("QUOTE_STREAM_MAX_DURATION", 300))
+RECONNECT_DELAY_MS = 3000
+
+# Campos de cada cotización que se difunden a los clientes
+STREAM_FIELDS = ['price', 'daily_change_pct', 'daily_change_abs']
+
+class QuoteBroadcaster:
+    """Difunde por Server-Sent Events los cambios de cotización a todos los clientes
+
+    El refresco en segundo plano publica las cotizaciones; solo los tickers
+    cuyo valor cambia forman el delta, que se envía una vez a cada suscriptor
+    junto con un número de versión creciente.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._snapshot = {}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, quotes):
+        """Publica ``{ticker: cotización}`` y difunde lo que ha cambiado
+
+        Devuelve el delta enviado (vacío si no cambió nada).
+        """
+        with self._lock:
+            delta = {}
+            for ticker, quote in quotes.items():
+                values = {field: quote.get(field) for field in STREAM_FIELDS}
+                if self._snapshot.get(ticker) != values:
+                    self._snapshot[ticker] = values
+                    delta[ticker] = values
+            if not delta:
+                return {}
+            self.version += 1
+            event = self._format('quotes', {'version': self.version, 'quotes': delta})
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Cliente demasiado lento: se descarta el evento, la versión siguiente lo recupera
+                pass
+        return delta
+
+    def subscribers(self):
+        """Número de clientes conectados"""
+        with self._lock:
+            return len(self._subscribers)
+
+    def stream(self, live=True):
+        """Generador de eventos SSE para una conexión (versión actual y luego deltas)
+
+        ``live`` indica en el saludo si hay un refresco publicando; si no, no
+        llegará nada más: se cierra tras el saludo y el navegador mantiene su
+        refresco periódico (la ruta /stream/quotes ya responde 204 en ese caso).
+        """
+        if not live:
+            yield f"retry: {RECONNECT_DELAY_MS}\n" + self._format('hello', {'version': self.version, 'live': False})
+            return
+        subscriber = queue.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            hello = self._format('hello', {'version': self.version, 'live': True})
+        try:
+            yield f"retry: {RECONNECT_DELAY_MS}\n" + hello
+            deadline = time.monotonic() + MAX_STREAM_DURATION
+            while time.monotonic() < deadline:
+                try:
+                    yield subscriber.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    @staticmethod
+    def _format(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+# Canal compartido por el refresco y la ruta /stream/quotes
+broadcaster = QuoteBroadcaster()
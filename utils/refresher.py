@@ -0,0 +1,104 @@
+import os
+import threading
+from datetime import datetime
+import pytz
+from utils.market_data import MarketData
+from utils.quote_stream import broadcaster
+from utils.ticker_metadata import get_ticker_metadata
+
+class QuoteRefresher:
+    """Refresca en segundo plano las cotizaciones de todas las posiciones
+
+    Publica los datos en la caché compartida de ``MarketData`` para que los
+    callbacks de las páginas los lean sin esperar a Yahoo Finance, y difunde
+    los cambios a los navegadores conectados (``utils.quote_stream``).
+    """
+
+    def __init__(self, interval=60, closed_interval=900, timezone="Europe/Madrid",
+                 open_hour=8, close_hour=22):
+        self.interval = interval
+        self.closed_interval = closed_interval
+        self.timezone = pytz.timezone(timezone)
+        self.open_hour = open_hour
+        self.close_hour = close_hour
+        self.last_refresh = None
+        self.last_count = 0
+        self._db = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def is_market_open(self, now=None):
+        """Indica si estamos en horario de mercado (días laborables)"""
+        now = now or datetime.now(self.timezone)
+        return now.weekday() < 5 and self.open_hour <= now.hour < self.close_hour
+
+    def current_interval(self):
+        """Segundos hasta el próximo refresco según el horario de mercado"""
+        return self.interval if self.is_market_open() else self.closed_interval
+
+    def start(self):
+        """Arranca el hilo de refresco (idempotente)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="quote-refresher", daemon=True)
+        self._thread.start()
+
+    def is_running(self):
+        """Indica si el hilo de refresco está en marcha"""
+        return bool(self._thread and self._thread.is_alive()) and not self._stopped.is_set()
+    
+    def stop(self):
+        """Detiene el hilo de refresco"""
+        self._stopped.set()
+        self._wakeup.set()
+
+    def trigger(self):
+        """Adelanta el siguiente refresco del hilo sin esperar al intervalo"""
+        self._wakeup.set()
+
+    def refresh(self):
+        """Descarga ahora las cotizaciones de todas las posiciones y las publica"""
+        with self._lock:
+            tickers, purchase_dates = self._collect_holdings()
+            if tickers:
+                # El TTL cubre dos ciclos para que la caché nunca quede vacía entre refrescos
+                quotes = MarketData.get_quotes(tickers, purchase_dates, refresh=True,
+                                               ttl=2 * self.current_interval())
+                broadcaster.publish(dict(zip(tickers, quotes)))
+                # Sector, nombre y divisa: solo se descargan los que faltan o caducaron
+                get_ticker_metadata().prefetch(tickers)
+            self.last_refresh = datetime.now(self.timezone)
+            self.last_count = len(tickers)
+            return self.last_count
+
+    def _collect_holdings(self):
+        """Tickers y fechas de compra de fondos y acciones"""
+        if self._db is None:
+            # Importación diferida: el cliente de Supabase solo se crea al refrescar
+            from utils.database import Database
+            self._db = Database()
+
+        holdings = self._db.get_fondos() + self._db.get_acciones()
+        return ([holding['ticker'] for holding in holdings],
+                [holding['fecha_compra'] for holding in holdings])
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error en el refresco de cotizaciones: {e}")
+            self._wakeup.wait(self.current_interval())
+            self._wakeup.clear()
+
+# Instancia compartida por la app y las páginas
+refresher = QuoteRefresher(
+    interval=int(os.environ.get("QUOTE_REFRESH_INTERVAL", 60)),
+    closed_interval=int(os.environ.get("QUOTE_REFRESH_CLOSED_INTERVAL", 900)),
+    timezone=os.environ.get("MARKET_TIMEZONE", "Europe/Madrid"),
+    open_hour=int(os.environ.get("MARKET_OPEN_HOUR", 8)),
+    close_hour=int(os.environ.get("MARKET_CLOSE_HOUR", 22))
+)
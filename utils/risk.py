@@ -0,0 +1,78 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Índice de referencia para la beta, tipo libre de riesgo anual (en tanto por uno)
+# y ventana de cálculo en días naturales
+RISK_BENCHMARK = os.environ.get("RISK_BENCHMARK", "^GSPC").upper()
+RISK_FREE_RATE = float(os.environ.get("RISK_FREE_RATE", 0))
+RISK_LOOKBACK_DAYS = int(os.environ.get("RISK_LOOKBACK_DAYS", 365))
+
+TRADING_DAYS = 252
+# Sesiones mínimas en común para dar una correlación o una beta
+MIN_PERIODS = 20
+
+RISK_COLUMNS = ['volatilidad', 'max_drawdown', 'sharpe', 'beta']
+
+def daily_returns(closes):
+    """Rentabilidades diarias simples (índice fecha, una columna por ticker)
+
+    Los huecos de un ticker (festivos de su mercado) toman el último cierre,
+    así la rentabilidad de ese día es 0 y no se pierde la del siguiente.
+    """
+    closes = closes.sort_index().ffill()
+    return closes.pct_change(fill_method=None).iloc[1:]
+
+def max_drawdown(closes):
+    """Máxima caída desde un máximo previo de cada columna (negativa, en tanto por uno)"""
+    closes = closes.sort_index().ffill()
+    return (closes / closes.cummax() - 1).min()
+
+def beta(returns, benchmark):
+    """Beta de cada columna de ``returns`` frente a la serie ``benchmark``
+
+    Covarianza entre varianza del índice sobre las sesiones que tienen los
+    dos, en una pasada sobre la matriz (el índice se repite por columna).
+    """
+    benchmark = benchmark.reindex(returns.index)
+    valid = returns.notna() & benchmark.notna().to_numpy()[:, None]
+    x = returns.where(valid)
+    y = valid.mul(benchmark, axis=0).where(valid)
+    covariance = ((x - x.mean()) * (y - y.mean())).sum()
+    variance = ((y - y.mean()) ** 2).sum()
+    return (covariance / variance.replace(0, np.nan)).where(valid.sum() >= MIN_PERIODS)
+
+def risk_metrics(closes, benchmark=None, risk_free=RISK_FREE_RATE):
+    """Volatilidad anualizada, máxima caída, Sharpe y beta por columna de ``closes``
+
+    ``benchmark`` son los cierres del índice de referencia (sin él la beta
+    queda vacía). Devuelve un DataFrame con una fila por ticker y las
+    columnas de ``RISK_COLUMNS``.
+    """
+    if closes.empty:
+        return pd.DataFrame(columns=RISK_COLUMNS, dtype=float)
+    returns = daily_returns(closes)
+    volatility = returns.std() * np.sqrt(TRADING_DAYS)
+    excess = returns.mean() * TRADING_DAYS - risk_free
+    metrics = pd.DataFrame({
+        'volatilidad': volatility,
+        'max_drawdown': max_drawdown(closes),
+        'sharpe': excess / volatility.replace(0, np.nan),
+        'beta': (beta(returns, daily_returns(benchmark.to_frame()).iloc[:, 0])
+                 if benchmark is not None and benchmark.notna().any() else np.nan)
+    })
+    return metrics.reindex(columns=RISK_COLUMNS)
+
+def correlation_matrix(closes):
+    """Correlación por pares de las rentabilidades diarias (una sola operación sobre la matriz)"""
+    return daily_returns(closes).corr(min_periods=MIN_PERIODS)
+
+def portfolio_closes(closes, quantities):
+    """Valor diario de una cartera de cantidades fijas ({ticker: cantidad})
+
+    Antes del primer cierre de un ticker se usa ese primer cierre, para que
+    su entrada no parezca una subida de la cartera.
+    """
+    quantities = pd.Series(quantities, dtype=float).reindex(closes.columns).fillna(0)
+    prices = closes.sort_index().ffill().bfill()
+    return prices.mul(quantities, axis=1).sum(axis=1, min_count=1).rename('Cartera')
@@ -0,0 +1,334 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from contextlib import closing, nullcontext
+from utils.history_store import DEFAULT_DATA_DIR
+
+# Base de datos local que sustituye a Supabase con DB_BACKEND=sqlite
+SQLITE_DB_PATH = os.environ.get("SQLITE_DB_PATH") or os.path.join(DEFAULT_DATA_DIR, "moneymoney.db")
+
+# Mismo esquema que las tablas de Supabase
+SCHEMA = {
+    'fondos': {
+        'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'nombre': 'TEXT NOT NULL',
+        'ticker': 'TEXT NOT NULL',
+        'tipo': 'TEXT NOT NULL',
+        'valor_compra': 'REAL NOT NULL',
+        'cantidad': 'REAL NOT NULL',
+        'fecha_compra': 'TEXT NOT NULL',
+        'created_at': "TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now'))"
+    },
+    'acciones': {
+        'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'nombre': 'TEXT NOT NULL',
+        'ticker': 'TEXT NOT NULL',
+        'sector': "TEXT DEFAULT 'N/A'",
+        'precio_compra': 'REAL NOT NULL',
+        'num_acciones': 'INTEGER NOT NULL',
+        'fecha_compra': 'TEXT NOT NULL',
+        'created_at': "TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now'))"
+    },
+    # Libro de movimientos (compra/venta/dividendo); las compras de los lotes de
+    # fondos y acciones llevan su ``lote_id``
+    'movimientos': {
+        'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'tabla': 'TEXT NOT NULL',
+        'ticker': 'TEXT NOT NULL',
+        'tipo': 'TEXT NOT NULL',
+        'cantidad': 'REAL NOT NULL',
+        'precio': 'REAL NOT NULL',
+        'fecha': 'TEXT NOT NULL',
+        'lote_id': 'INTEGER',
+        'created_at': "TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now'))"
+    },
+    # Posición materializada por (tabla, ticker), con sus lotes FIFO abiertos en JSON
+    'posiciones': {
+        'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'tabla': 'TEXT NOT NULL',
+        'ticker': 'TEXT NOT NULL',
+        'nombre': 'TEXT',
+        'sector': 'TEXT',
+        'tipo': 'TEXT',
+        'cantidad': 'REAL NOT NULL DEFAULT 0',
+        'coste_medio': 'REAL NOT NULL DEFAULT 0',
+        'coste_total': 'REAL NOT NULL DEFAULT 0',
+        'ganancia_realizada': 'REAL NOT NULL DEFAULT 0',
+        'dividendos': 'REAL NOT NULL DEFAULT 0',
+        'lotes': "TEXT NOT NULL DEFAULT '[]'",
+        'ultima_fecha': 'TEXT',
+        'ultimo_movimiento': 'INTEGER',
+        'created_at': "TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now'))"
+    }
+}
+
+# Claves naturales del libro (índices únicos); los nulos no chocan entre sí
+UNIQUE_KEYS = {
+    'movimientos': ('tabla', 'lote_id'),
+    'posiciones': ('tabla', 'ticker')
+}
+
+SQL_OPERATORS = {
+    'eq': '=',
+    'neq': '!=',
+    'gt': '>',
+    'gte': '>=',
+    'lt': '<',
+    'lte': '<=',
+    'ilike': 'LIKE'
+}
+
+class APIResponse:
+    """Respuesta con la misma forma que la de PostgREST (``data`` y ``count``)"""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+class SQLiteQuery:
+    """Petición sobre una tabla con la interfaz de PostgREST que usa ``Database``
+
+    Admite ``select``/``insert``/``upsert``/``update``/``delete``, los filtros
+    de ``FILTER_OPERATORS``, ``order``, ``range``, ``limit`` y ``offset``.
+    """
+
+    def __init__(self, client, table):
+        if table not in SCHEMA:
+            raise ValueError(f"Tabla desconocida: {table}")
+        self.client = client
+        self.table = table
+        self.action = 'select'
+        self.columns = ['*']
+        self.payload = None
+        self.count_rows = False
+        self.where = []
+        self.params = []
+        self.ordering = []
+        self.limit_rows = None
+        self.offset_rows = None
+        self.on_conflict = ['id']
+
+    def _column(self, column):
+        if column not in SCHEMA[self.table]:
+            raise ValueError(f"Columna desconocida en {self.table}: {column}")
+        return column
+
+    # ============== ACCIONES ==============
+
+    def select(self, *columns, count=None):
+        self.columns = [c if c == '*' else self._column(c) for c in columns or ['*']]
+        self.count_rows = count is not None
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = 'insert', rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict=''):
+        self.action, self.payload = 'upsert', rows if isinstance(rows, list) else [rows]
+        if on_conflict:
+            self.on_conflict = [self._column(c.strip()) for c in on_conflict.split(',')]
+        return self
+
+    def update(self, data):
+        self.action, self.payload = 'update', data
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    # ============== FILTROS Y RANGO ==============
+
+    def _filter(self, column, op, value):
+        self.where.append(f"{self._column(column)} {SQL_OPERATORS[op]} ?")
+        self.params.append(value)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def ilike(self, column, pattern):
+        return self._filter(column, 'ilike', pattern)
+
+    def in_(self, column, values):
+        values = list(values)
+        if not values:
+            self.where.append("0")
+        else:
+            self.where.append(f"{self._column(column)} IN ({','.join('?' * len(values))})")
+            self.params.extend(values)
+        return self
+
+    def order(self, column, desc=False):
+        # Como en PostgreSQL: nulos al final en ascendente y al principio en descendente
+        direction = 'DESC' if desc else 'ASC'
+        column = self._column(column)
+        self.ordering.append(f"({column} IS NULL) {direction}, {column} {direction}")
+        return self
+
+    def range(self, start, end):
+        self.offset_rows, self.limit_rows = start, end - start + 1
+        return self
+
+    def limit(self, size):
+        self.limit_rows = size
+        return self
+
+    def offset(self, offset):
+        self.offset_rows = offset
+        return self
+
+    # ============== EJECUCIÓN ==============
+
+    def _where_sql(self):
+        return f" WHERE {' AND '.join(self.where)}" if self.where else ""
+
+    def _run(self):
+        lock = nullcontext() if self.action == 'select' else self.client.lock
+        with lock, closing(self.client.connect()) as conn, conn:
+            return getattr(self, f"_run_{self.action}")(conn)
+
+    def _run_select(self, conn):
+        sql = f"SELECT {', '.join(self.columns)} FROM {self.table}{self._where_sql()}"
+        if self.ordering:
+            sql += f" ORDER BY {', '.join(self.ordering)}"
+        if self.limit_rows is not None or self.offset_rows:
+            sql += " LIMIT ? OFFSET ?"
+        params = list(self.params)
+        if self.limit_rows is not None or self.offset_rows:
+            params += [self.limit_rows if self.limit_rows is not None else -1, self.offset_rows or 0]
+        data = [dict(row) for row in conn.execute(sql, params)]
+
+        count = None
+        if self.count_rows:
+            count = conn.execute(f"SELECT COUNT(*) FROM {self.table}{self._where_sql()}",
+                                 self.params).fetchone()[0]
+        return APIResponse(data, count)
+
+    def _write(self, conn, row, upsert):
+        columns = [self._column(column) for column in row]
+        sql = (f"INSERT INTO {self.table} ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' * len(columns))})")
+        keys = self.on_conflict
+        updates = [column for column in columns if column != 'id' and column not in keys]
+        if upsert and all(key in columns for key in keys):
+            action = f"UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in updates)}" if updates else "NOTHING"
+            sql += f" ON CONFLICT({', '.join(keys)}) DO {action}"
+        else:
+            keys = ['id']
+        cursor = conn.execute(sql, [row[column] for column in columns])
+        # Con conflicto la fila es la que ya existía: se busca por su clave
+        if all(row.get(key) is not None for key in keys):
+            where, params = ' AND '.join(f"{key} = ?" for key in keys), [row[key] for key in keys]
+        else:
+            where, params = "id = ?", [cursor.lastrowid]
+        return dict(conn.execute(f"SELECT * FROM {self.table} WHERE {where}", params).fetchone())
+
+    def _run_insert(self, conn):
+        return APIResponse([self._write(conn, row, upsert=False) for row in self.payload])
+
+    def _run_upsert(self, conn):
+        return APIResponse([self._write(conn, row, upsert=True) for row in self.payload])
+
+    def _run_update(self, conn):
+        columns = [self._column(column) for column in self.payload]
+        ids = [row[0] for row in conn.execute(f"SELECT id FROM {self.table}{self._where_sql()}",
+                                              self.params)]
+        if not ids:
+            return APIResponse([])
+        placeholders = ','.join('?' * len(ids))
+        conn.execute(f"UPDATE {self.table} SET {', '.join(f'{c} = ?' for c in columns)} "
+                     f"WHERE id IN ({placeholders})",
+                     [self.payload[column] for column in columns] + ids)
+        rows = conn.execute(f"SELECT * FROM {self.table} WHERE id IN ({placeholders}) ORDER BY id", ids)
+        return APIResponse([dict(row) for row in rows])
+
+    def _run_delete(self, conn):
+        rows = [dict(row) for row in conn.execute(f"SELECT * FROM {self.table}{self._where_sql()}",
+                                                  self.params)]
+        conn.execute(f"DELETE FROM {self.table}{self._where_sql()}", self.params)
+        return APIResponse(rows)
+
+    def execute(self):
+        return self._run()
+
+class AsyncSQLiteQuery(SQLiteQuery):
+    """Variante de ``SQLiteQuery`` cuyo ``execute`` es una corrutina (en un hilo aparte)"""
+
+    async def execute(self):
+        return await asyncio.to_thread(self._run)
+
+class SQLiteClient:
+    """Sustituto local de Supabase sobre SQLite, con las mismas tablas
+
+    Expone ``table(nombre)`` como el cliente de Supabase, así ``Database`` y
+    ``AsyncDatabase`` funcionan igual con cualquiera de los dos.
+    """
+
+    query_class = SQLiteQuery
+
+    def __init__(self, path=SQLITE_DB_PATH):
+        self.path = path
+        # Las escrituras se serializan dentro del proceso; SQLite ya bloquea entre procesos
+        self.lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self.connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for table, columns in SCHEMA.items():
+                definition = ', '.join(f"{name} {kind}" for name, kind in columns.items())
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+            for table, keys in UNIQUE_KEYS.items():
+                conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_{'_'.join(keys)}_key "
+                             f"ON {table} ({', '.join(keys)})")
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def table(self, table):
+        return self.query_class(self, table)
+
+class AsyncSQLiteClient(SQLiteClient):
+    """Cliente SQLite para ``AsyncDatabase``"""
+
+    query_class = AsyncSQLiteQuery
+
+# Registro de clientes del proceso, uno por ruta
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _get_client(cls, path):
+    with _clients_lock:
+        client = _clients.get((cls, path))
+        if client is None:
+            client = cls(path)
+            _clients[(cls, path)] = client
+    return client
+
+def get_sqlite_client(path=SQLITE_DB_PATH) -> SQLiteClient:
+    """Devuelve el cliente SQLite compartido por el proceso"""
+    return _get_client(SQLiteClient, path)
+
+def get_async_sqlite_client(path=SQLITE_DB_PATH) -> AsyncSQLiteClient:
+    """Devuelve el cliente SQLite asíncrono compartido por el proceso"""
+    return _get_client(AsyncSQLiteClient, path)
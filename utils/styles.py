@@ -1,3 +1,6 @@
+from dash.dash_table.Format import Format, Group, Scheme, Sign, Symbol
+from utils.fx import currency_symbol
+
 # Colores principales
 PRIMARY_COLOR = "#00d4ff"
 SECONDARY_COLOR = "#6c63ff"
@@ -77,6 +80,35 @@ TABLE_CELL_STYLE = {
     "borderBottom": "1px solid rgba(255,255,255,0.05)"
 }
 
+# Formatos numéricos de tabla (los datos viajan como números y se formatean en el navegador)
+# Los importes van en la divisa base (BASE_CURRENCY)
+CURRENCY_SYMBOL = currency_symbol()
+MONEY_FORMAT = Format(precision=2, scheme=Scheme.fixed, group=Group.yes,
+                      symbol=Symbol.yes, symbol_prefix=CURRENCY_SYMBOL, nully='N/A')
+SIGNED_MONEY_FORMAT = Format(precision=2, scheme=Scheme.fixed, group=Group.yes, sign=Sign.positive,
+                             symbol=Symbol.yes, symbol_prefix=CURRENCY_SYMBOL, nully='N/A')
+SIGNED_PERCENT_FORMAT = Format(precision=2, scheme=Scheme.fixed, sign=Sign.positive,
+                               symbol=Symbol.yes, symbol_suffix='%', nully='N/A')
+PERCENT_FORMAT = Format(precision=2, scheme=Scheme.fixed, symbol=Symbol.yes, symbol_suffix='%', nully='N/A')
+NUMBER_FORMAT = Format(precision=2, scheme=Scheme.fixed, group=Group.yes)
+
+# Color de la fila según el signo de la ganancia
+PROFIT_LOSS_STYLE = [
+    {
+        'if': {'filter_query': '{Ganancia/Pérdida} >= 0'},
+        'color': SUCCESS_COLOR
+    },
+    {
+        'if': {'filter_query': '{Ganancia/Pérdida} < 0'},
+        'color': DANGER_COLOR
+    }
+]
+
+TABLE_FILTER_STYLE = {
+    "backgroundColor": CARD_BG_LIGHTER,
+    "color": "#fff"
+}
+
 # Estilos de inputs
 INPUT_STYLE = {
     "backgroundColor": CARD_BG_LIGHTER,
@@ -1,16 +1,81 @@
-from supabase import create_client, Client
+from supabase import Client
+from supabase.lib.client_options import ClientOptions
+from postgrest import SyncPostgrestClient, AsyncPostgrestClient
+from postgrest.utils import SyncClient, AsyncClient
+import httpx
 import os
+import threading
 
-def get_supabase_client() -> Client:
-    """Crea y retorna cliente de Supabase"""
+# Pool HTTP de PostgREST: conexiones keep-alive reutilizadas entre peticiones
+POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.environ.get("SUPABASE_POOL_MAX_CONNECTIONS", 10)),
+    max_keepalive_connections=int(os.environ.get("SUPABASE_POOL_KEEPALIVE", 10)),
+    keepalive_expiry=float(os.environ.get("SUPABASE_KEEPALIVE_EXPIRY", 60))
+)
+
+# Registro de clientes del proceso, uno por (url, key)
+_clients = {}
+_async_clients = {}
+_clients_lock = threading.Lock()
+
+class PooledSyncPostgrestClient(SyncPostgrestClient):
+    """Cliente de PostgREST cuya sesión HTTP usa el pool keep-alive"""
+
+    def create_session(self, base_url, headers, timeout):
+        return SyncClient(base_url=base_url, headers=headers, timeout=timeout, limits=POOL_LIMITS)
+
+class PooledAsyncPostgrestClient(AsyncPostgrestClient):
+    """Versión asíncrona de ``PooledSyncPostgrestClient``"""
+
+    def create_session(self, base_url, headers, timeout):
+        return AsyncClient(base_url=base_url, headers=headers, timeout=timeout, limits=POOL_LIMITS)
+
+class PooledClient(Client):
+    """Cliente de Supabase cuya sesión de PostgREST usa el pool keep-alive"""
+
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=None, **kwargs):
+        return PooledSyncPostgrestClient(rest_url, headers=headers, schema=schema,
+                                         **({'timeout': timeout} if timeout is not None else {}))
+
+def _credentials():
     # En Vercel, las variables vienen directo del entorno
     url = os.environ.get("SUPABASE_URL") or os.getenv("SUPABASE_URL")
     key = os.environ.get("SUPABASE_KEY") or os.getenv("SUPABASE_KEY")
-    
+
     if not url or not key:
         raise ValueError(
             "❌ SUPABASE_URL y SUPABASE_KEY deben estar configuradas. "
             f"URL encontrada: {bool(url)}, KEY encontrada: {bool(key)}"
         )
-    
-    return create_client(url, key)
+    return url, key
+
+def get_supabase_client() -> Client:
+    """Devuelve el cliente de Supabase compartido por el proceso"""
+    url, key = _credentials()
+
+    with _clients_lock:
+        client = _clients.get((url, key))
+        if client is None:
+            client = PooledClient.create(url, key, ClientOptions())
+            _clients[(url, key)] = client
+    return client
+
+def get_async_postgrest_client() -> AsyncPostgrestClient:
+    """Cliente asíncrono de PostgREST compartido, con el mismo pool keep-alive
+
+    Debe usarse siempre desde el bucle de eventos de ``utils.aio``: la sesión
+    HTTP asíncrona queda ligada al bucle en el que se abre.
+    """
+    url, key = _credentials()
+
+    with _clients_lock:
+        client = _async_clients.get((url, key))
+        if client is None:
+            options = ClientOptions()
+            options.headers.update({"apiKey": key, "Authorization": f"Bearer {key}"})
+            client = PooledAsyncPostgrestClient(f"{url}/rest/v1", headers=options.headers,
+                                                schema=options.schema,
+                                                timeout=options.postgrest_client_timeout)
+            _async_clients[(url, key)] = client
+    return client
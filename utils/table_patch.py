@@ -0,0 +1,26 @@
+from dash import Patch, no_update
+
+def patch_rows(current, rows, key='id'):
+    """Diferencia entre las filas que tiene el navegador y las nuevas
+
+    Si las filas son las mismas y en el mismo orden (según ``key``) devuelve
+    un ``Patch`` con solo las celdas que cambian, o ``no_update`` si no cambia
+    nada. Si cambia la estructura (otra página, otro orden, filas nuevas)
+    devuelve ``rows`` completas.
+    """
+    if not current or len(current) != len(rows) or \
+            [row.get(key) for row in current] != [row.get(key) for row in rows]:
+        return rows
+
+    patch = Patch()
+    changed = False
+    for index, (old, new) in enumerate(zip(current, rows)):
+        for column, value in new.items():
+            if old.get(column) != value:
+                patch[index][column] = value
+                changed = True
+    return patch if changed else no_update
+
+def is_patch(value):
+    """Indica si ``patch_rows`` ha devuelto una actualización parcial (o ninguna)"""
+    return isinstance(value, Patch) or value is no_update
@@ -0,0 +1,73 @@
+import re
+import pandas as pd
+from utils.database import FILTER_OPERATORS
+
+# Operadores del filtro nativo de DataTable -> operadores de ``Database.query``
+TABLE_OPERATORS = {
+    '=': 'eq', 'eq': 'eq',
+    '!=': 'neq', 'ne': 'neq',
+    '>': 'gt', 'gt': 'gt',
+    '>=': 'gte', 'ge': 'gte',
+    '<': 'lt', 'lt': 'lt',
+    '<=': 'lte', 'le': 'lte',
+    'contains': 'ilike',
+    'datestartswith': 'datestartswith'
+}
+
+FILTER_PART = re.compile(
+    r"^\{(?P<column>[^}]+)\}\s+[si]?(?P<op>>=|<=|!=|=|<|>|eq|ne|gt|ge|lt|le|contains|datestartswith)\s+(?P<value>.+)$"
+)
+
+def _parse_value(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'`":
+        return value[1:-1].replace('\\' + value[0], value[0])
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def _date_prefix_range(prefix):
+    """Rango [inicio, fin) de fechas que empiezan por ``prefix`` (AAAA, AAAA-MM o AAAA-MM-DD)"""
+    if isinstance(prefix, float):
+        prefix = str(int(prefix))
+    parts = str(prefix).strip().split('-')
+    try:
+        start = pd.Timestamp(year=int(parts[0]), month=int(parts[1]) if len(parts) > 1 else 1,
+                             day=int(parts[2]) if len(parts) > 2 else 1)
+    except (ValueError, IndexError):
+        return None
+    offset = [pd.DateOffset(years=1), pd.DateOffset(months=1), pd.DateOffset(days=1)][min(len(parts), 3) - 1]
+    return start.strftime('%Y-%m-%d'), (start + offset).strftime('%Y-%m-%d')
+
+def parse_filter_query(filter_query):
+    """Traduce el ``filter_query`` de DataTable a filtros ``(columna, operador, valor)``
+
+    Las columnas son los ids de la tabla; las condiciones que no se entienden
+    se ignoran.
+    """
+    filters = []
+    for part in (filter_query or '').split(' && '):
+        match = FILTER_PART.match(part.strip())
+        if not match:
+            continue
+        column, op = match.group('column'), TABLE_OPERATORS[match.group('op')]
+        value = _parse_value(match.group('value'))
+        if op == 'ilike':
+            filters.append((column, op, f"%{value}%"))
+        elif op == 'datestartswith':
+            bounds = _date_prefix_range(value)
+            if bounds:
+                filters.extend([(column, 'gte', bounds[0]), (column, 'lt', bounds[1])])
+        else:
+            filters.append((column, op, value))
+    return filters
+
+def filter_frame(df, filters):
+    """Aplica filtros numéricos ``(columna, operador, valor)`` a un DataFrame"""
+    for column, op, value in filters:
+        if op in ('in', 'ilike') or not isinstance(value, float):
+            continue
+        values = pd.to_numeric(df[column], errors='coerce')
+        df = df[values.notna() & FILTER_OPERATORS[op](values, value)]
+    return df
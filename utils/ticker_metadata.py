@@ -0,0 +1,159 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from utils.history_store import HISTORY_DB_PATH
+from utils.providers import get_provider
+
+# Los metadatos casi nunca cambian: se refrescan en segundo plano pasado el TTL
+METADATA_TTL = float(os.environ.get("TICKER_METADATA_TTL_DAYS", 30)) * 86400
+# Espera máxima (s) de ``lookup`` cuando un ticker aún no está en caché
+LOOKUP_TIMEOUT = float(os.environ.get("TICKER_METADATA_LOOKUP_TIMEOUT", 2))
+
+# Tras una descarga fallida no se reintenta hasta pasados RETRY s, que se
+# duplican con cada fallo seguido hasta MAX_RETRY s
+METADATA_RETRY = float(os.environ.get("TICKER_METADATA_RETRY", 60))
+METADATA_MAX_RETRY = float(os.environ.get("TICKER_METADATA_MAX_RETRY", 6 * 3600))
+
+METADATA_FIELDS = ['sector', 'name', 'currency', 'exchange']
+
+class TickerMetadata:
+    """Caché persistente (SQLite) de sector, nombre, divisa y mercado por ticker
+
+    Las lecturas nunca esperan a la red: devuelven lo guardado (aunque esté
+    caducado) y encargan a un pool en segundo plano la descarga de lo que
+    falta o ha caducado. Solo ``lookup`` espera, como mucho ``timeout``.
+    Los tickers cuya descarga falla no se vuelven a pedir hasta que pasa su
+    espera (exponencial, solo en memoria).
+    """
+
+    def __init__(self, path=HISTORY_DB_PATH, ttl=METADATA_TTL, max_workers=2):
+        self.path = path
+        self.ttl = ttl
+        self._entries = None
+        self._pending = {}
+        # Descargas fallidas: {ticker: (fallos seguidos, no reintentar antes de)}
+        self._failures = {}
+        # Reentrante: el callback de un futuro ya terminado se ejecuta dentro de ``_schedule``
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="ticker-metadata")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ticker_metadata (
+                    ticker TEXT PRIMARY KEY,
+                    sector TEXT, name TEXT, currency TEXT, exchange TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _load(self):
+        """Carga la tabla en memoria la primera vez (son pocas filas)"""
+        if self._entries is None:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(
+                    f"SELECT ticker, {', '.join(METADATA_FIELDS)}, updated_at FROM ticker_metadata"
+                ).fetchall()
+            self._entries = {
+                row[0]: (dict(zip(METADATA_FIELDS, row[1:-1])), row[-1]) for row in rows
+            }
+        return self._entries
+
+    def cached(self, tickers):
+        """Metadatos guardados: {ticker: dict}; programa la descarga de los que faltan o caducaron"""
+        tickers = {str(ticker).upper() for ticker in tickers if ticker}
+        now = time.time()
+        with self._lock:
+            entries = self._load()
+            found = {ticker: dict(entries[ticker][0]) for ticker in tickers if ticker in entries}
+            stale = [ticker for ticker in tickers
+                     if (ticker not in entries or now - entries[ticker][1] > self.ttl)
+                     and not self._backing_off(ticker, now)]
+        for ticker in stale:
+            self._schedule(ticker)
+        return found
+
+    def prefetch(self, tickers):
+        """Encarga en segundo plano los metadatos que falten (no espera)"""
+        self.cached(tickers)
+
+    def lookup(self, ticker, timeout=LOOKUP_TIMEOUT):
+        """Metadatos de un ticker, esperando como mucho ``timeout`` si no están guardados"""
+        ticker = str(ticker or '').strip().upper()
+        if not ticker:
+            return None
+        found = self.cached([ticker])
+        if ticker in found:
+            return found[ticker]
+        with self._lock:
+            if self._backing_off(ticker, time.time()):
+                return None
+        try:
+            return self._schedule(ticker).result(timeout)
+        except Exception:
+            # Timeout o error de descarga (ya registrado por ``_done``)
+            return None
+
+    def _schedule(self, ticker):
+        """Descarga única por ticker aunque se pida varias veces a la vez"""
+        with self._lock:
+            future = self._pending.get(ticker)
+            if future is None:
+                future = self._executor.submit(self._fetch, ticker)
+                self._pending[ticker] = future
+                future.add_done_callback(lambda f: self._done(ticker, f))
+        return future
+
+    def _backing_off(self, ticker, now):
+        """Indica si un ticker que falló aún debe esperar para reintentarse (con el lock)"""
+        failure = self._failures.get(ticker)
+        return failure is not None and now < failure[1]
+
+    def _done(self, ticker, future):
+        with self._lock:
+            self._pending.pop(ticker, None)
+            if future.cancelled() or future.exception() is None:
+                return
+            failures = self._failures.get(ticker, (0, 0))[0] + 1
+            delay = min(METADATA_RETRY * 2 ** (failures - 1), METADATA_MAX_RETRY)
+            self._failures[ticker] = (failures, time.time() + delay)
+        print(f"Error al obtener los metadatos de {ticker} (se reintenta en {delay:.0f} s): "
+              f"{future.exception()}")
+
+    def _fetch(self, ticker):
+        data = get_provider().metadata(ticker) or {}
+        record = {field: data.get(field) for field in METADATA_FIELDS}
+        self.save(ticker, record)
+        return dict(record)
+
+    def save(self, ticker, record):
+        """Guarda (o sustituye) los metadatos de un ticker"""
+        updated_at = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO ticker_metadata (ticker, {', '.join(METADATA_FIELDS)}, updated_at) "
+                f"VALUES (?, {', '.join('?' * len(METADATA_FIELDS))}, ?)",
+                (ticker, *[record.get(field) for field in METADATA_FIELDS], updated_at)
+            )
+        with self._lock:
+            self._load()[ticker] = (dict(record), updated_at)
+            self._failures.pop(ticker, None)
+
+_metadata = None
+_metadata_lock = threading.Lock()
+
+def get_ticker_metadata():
+    """Caché de metadatos compartida por el proceso (se crea al primer uso)"""
+    global _metadata
+    with _metadata_lock:
+        if _metadata is None:
+            _metadata = TickerMetadata()
+    return _metadata
@@ -0,0 +1,171 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from flask import g, request
+
+# Directorio donde se guardan las trazas (vacío = trazas desactivadas) y duración
+# mínima (ms) de una petición para guardarla
+TRACE_DIR = os.environ.get("TRACE_DIR", "")
+TRACE_MIN_DURATION_MS = float(os.environ.get("TRACE_MIN_DURATION_MS", 0))
+
+# Traza activa y span padre del contexto actual (se heredan en tareas asyncio y
+# ``asyncio.to_thread``; en otros hilos hay que usar ``wrap``)
+_trace = contextvars.ContextVar("trace", default=None)
+_parent = contextvars.ContextVar("parent_span", default=None)
+
+class Trace:
+    """Spans de una petición, exportables al formato Chrome trace (chrome://tracing, Perfetto)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now()
+        self.origin = time.perf_counter_ns()
+        self.spans = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _add(self, span):
+        with self._lock:
+            self._next_id += 1
+            span['id'] = self._next_id
+            self.spans.append(span)
+        return span
+
+    def duration_ms(self):
+        """Duración del span raíz (0 si aún no ha terminado)"""
+        root = self.spans[0] if self.spans else None
+        return (root['end'] - root['start']) / 1e6 if root and root['end'] else 0.0
+
+    def to_chrome(self):
+        """Eventos "X" (completos) con un carril por hilo y por tarea asyncio"""
+        pid = os.getpid()
+        lanes = {}
+        events = []
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            if s['end'] is None:
+                continue
+            tid = lanes.setdefault(s['lane'], len(lanes) + 1)
+            events.append({
+                'name': s['name'],
+                'cat': s['name'].split('.')[0],
+                'ph': 'X',
+                'ts': (s['start'] - self.origin) / 1000,
+                'dur': (s['end'] - s['start']) / 1000,
+                'pid': pid,
+                'tid': tid,
+                'args': {**s['attrs'], 'span_id': s['id'], 'parent_id': s['parent']}
+            })
+        events += [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': lane}}
+            for lane, tid in lanes.items()
+        ]
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'name': self.name, 'started_at': self.started_at.isoformat()}
+        }
+
+    def export(self, path):
+        """Guarda la traza en ``path`` (JSON de Chrome trace)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome(), f, ensure_ascii=False)
+        return path
+
+def _lane():
+    """Carril del span: el hilo actual y, dentro del bucle, la tarea asyncio"""
+    lane = threading.current_thread().name
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return f"{lane} / {task.get_name()}" if task is not None else lane
+
+@contextmanager
+def start_trace(name):
+    """Activa una traza nueva para el bloque (los spans de dentro se recogen en ella)"""
+    trace = Trace(name)
+    trace_token = _trace.set(trace)
+    parent_token = _parent.set(None)
+    try:
+        with span(name):
+            yield trace
+    finally:
+        _parent.reset(parent_token)
+        _trace.reset(trace_token)
+
+def span(name, **attrs):
+    """Span alrededor de un bloque; sin traza activa no hace nada"""
+    trace = _trace.get()
+    if trace is None:
+        return nullcontext()
+    return _span(trace, name, attrs)
+
+@contextmanager
+def _span(trace, name, attrs):
+    record = trace._add({
+        'name': name,
+        'attrs': {key: value if isinstance(value, (int, float, bool)) else str(value)
+                  for key, value in attrs.items()},
+        'parent': _parent.get(),
+        'lane': _lane(),
+        'start': time.perf_counter_ns(),
+        'end': None
+    })
+    token = _parent.set(record['id'])
+    try:
+        yield record
+    except BaseException as e:
+        record['attrs']['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record['end'] = time.perf_counter_ns()
+        _parent.reset(token)
+
+def wrap(fn):
+    """``fn`` ligada al contexto actual, para que sus spans sigan en la traza en otro hilo
+
+    Cada llamada a ``wrap`` copia el contexto: úsese una vez por tarea enviada
+    al pool (``executor.submit(wrap(fn), ...)``).
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+def instrument_dash(app, directory=None):
+    """Traza cada petición de callback de ``app`` y la guarda en ``TRACE_DIR``"""
+    directory = directory or TRACE_DIR
+    if not directory:
+        return
+    server = app.server
+
+    @server.before_request
+    def _start_trace():
+        if not request.path.endswith('/_dash-update-component'):
+            return
+        body = request.get_json(silent=True) or {}
+        function = app.callback_map.get(body.get('output', ''), {}).get('callback')
+        name = getattr(function, '__name__', None) or body.get('output', 'callback')
+        g.trace_context = start_trace(f"callback.{name}")
+        g.trace = g.trace_context.__enter__()
+
+    @server.teardown_request
+    def _finish_trace(exc):
+        context = g.pop('trace_context', None)
+        if context is None:
+            return
+        trace = g.pop('trace')
+        context.__exit__(None, None, None)
+        if trace.duration_ms() >= TRACE_MIN_DURATION_MS:
+            filename = re.sub(r'[^\w.-]+', '_', f"{trace.started_at:%Y%m%d-%H%M%S-%f}-{trace.name}")
+            trace.export(os.path.join(directory, f"{filename}.json"))